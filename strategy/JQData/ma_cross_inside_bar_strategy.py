@@ -15,6 +15,7 @@
 from jqdatasdk import *
 from datetime import date
 import os
+import sys
 import argparse
 from typing import List, Tuple, Optional, Dict, Any
 
@@ -23,6 +24,9 @@ import pandas as pd
 from dateutil.relativedelta import relativedelta
 from jqdatasdk import auth, logout, get_price
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from kline_engine import CASCADE, effective_bars  # noqa: E402
+
 
 def parse_date(value: str) -> date:
     """解析 YYYY-MM-DD 格式日期，错误则提示帮助信息。"""
@@ -32,27 +36,6 @@ def parse_date(value: str) -> date:
         raise argparse.ArgumentTypeError("日期格式需为 YYYY-MM-DD") from exc
 
 
-def _add_effective_bar(effective: List[int], highs, lows, idx: int) -> Tuple[bool, int]:
-    """
-    根据内包/外包关系更新有效 K 线列表。
-
-    返回 (是否纳入有效, 更新前的上一根有效 K 线下标或 None)。
-    """
-    while effective:
-        last = effective[-1]
-        # 当日被上一有效 K 线完全包含 -> 忽略当日
-        if highs[idx] <= highs[last] and lows[idx] >= lows[last]:
-            return False, last
-        # 当日完全包住上一有效 K 线 -> 移除上一有效 K 线，继续比较更早的
-        if highs[idx] >= highs[last] and lows[idx] <= lows[last]:
-            effective.pop()
-            continue
-        break
-    prev = effective[-1] if effective else None
-    effective.append(idx)
-    return True, prev
-
-
 def run_backtest(
     symbol: str = "000001.XSHE",
     username: str = "18813098345",
@@ -119,7 +102,9 @@ def run_backtest(
         df["atr"] = tr.rolling(atr_lookback).mean()
 
         highs, lows, closes = df["high"].values, df["low"].values, df["close"].values
-        effective: List[int] = []
+        # 内包/外包处理：当日被上一有效 K 线包含则忽略当日，当日包住上一有效 K 线则连续移除
+        effective = effective_bars(highs, lows, CASCADE)
+        included_flags, prev_effective = effective["included"], effective["prev"]
 
         cash = 1.0  # 初始资金
         shares = 0.0
@@ -148,13 +133,13 @@ def run_backtest(
                     peak_close = closes[i]
                     entry_idx = i
 
-            included, prev_eff = _add_effective_bar(effective, highs, lows, i)
+            included, prev_eff = included_flags[i], prev_effective[i]
 
             # 持仓中的止损检查
             if shares > 0:
                 # 破前有效低点（可关闭）
                 stop_break = False
-                if not disable_break_stop and included and prev_eff is not None:
+                if not disable_break_stop and included and prev_eff >= 0:
                     stop_break = lows[i] < lows[prev_eff]
                 
                 # 移动止损（简化版或ATR版）
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+kline_engine 基准测试
+将三种原有包含处理实现（JQData 连续出栈、up 逐根重扫、quant_stock_selector 单次出栈）
+与共用引擎的批量内核、增量内核逐一对比结果并计时
+
+运行: python3 benchmark_kline_engine.py
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from kline_engine import CASCADE, RESCAN, SINGLE, ContainmentKernel, effective_bars
+
+
+def legacy_cascade(highs, lows):
+    """JQData 原 _add_effective_bar：返回最终有效K线、每根K线是否纳入及纳入时的前一根有效K线"""
+    effective = []
+    included = []
+    prev = []
+    for idx in range(len(highs)):
+        keep = True
+        while effective:
+            last = effective[-1]
+            if highs[idx] <= highs[last] and lows[idx] >= lows[last]:
+                keep = False
+                break
+            if highs[idx] >= highs[last] and lows[idx] <= lows[last]:
+                effective.pop()
+                continue
+            break
+        included.append(keep)
+        prev.append(effective[-1] if keep and effective else -1)
+        if keep:
+            effective.append(idx)
+    return effective, included, prev
+
+
+def legacy_rescan_steps(highs, lows):
+    """
+    up 原 KlineProcessor：每加入一根K线从头重新扫描，直到没有包含关系
+
+    逐根生成加入该K线后被忽略的K线索引集合（同一个集合对象，之后会继续变化）
+    """
+    ignored = set()
+    for n in range(1, len(highs) + 1):
+        processed = True
+        while processed:
+            processed = False
+            for i in range(1, n):
+                if i in ignored:
+                    continue
+                prev_index = next((j for j in range(i - 1, -1, -1) if j not in ignored), -1)
+                if prev_index == -1:
+                    continue
+                if highs[i] <= highs[prev_index] and lows[i] >= lows[prev_index]:
+                    ignored.add(i)
+                elif highs[i] >= highs[prev_index] and lows[i] <= lows[prev_index]:
+                    ignored.add(prev_index)
+                else:
+                    continue
+                processed = True
+                break
+        yield ignored
+
+
+def legacy_rescan(highs, lows):
+    """up 原 KlineProcessor 加入全部K线后的有效K线"""
+    ignored = set()
+    for ignored in legacy_rescan_steps(highs, lows):
+        pass
+    return [i for i in range(len(highs)) if i not in ignored]
+
+
+def legacy_single(df):
+    """quant_stock_selector 原 filter_kline：逐行 df.loc 比较，包住前一日时只移除一次"""
+    valid_indices = [0]
+    for i in range(1, len(df)):
+        prev_idx = valid_indices[-1]
+        prev_high = df.loc[prev_idx, 'high']
+        prev_low = df.loc[prev_idx, 'low']
+        curr_high = df.loc[i, 'high']
+        curr_low = df.loc[i, 'low']
+        if curr_high <= prev_high and curr_low >= prev_low:
+            continue
+        elif curr_high >= prev_high and curr_low <= prev_low:
+            valid_indices.pop()
+            valid_indices.append(i)
+        else:
+            valid_indices.append(i)
+    return valid_indices
+
+
+def incremental(highs, lows, mode):
+    """增量内核逐根加入，返回最终有效K线"""
+    kernel = ContainmentKernel(mode)
+    for i in range(len(highs)):
+        kernel.push(highs, lows, i)
+    return kernel.indices.tolist()
+
+
+def generate_bars(n, seed, tick=0.05):
+    """
+    生成随机K线，价格按tick取整以制造大量高低点相等的情况（up/test_kline_processor.py 共用）
+
+    Returns:
+        (high, low, close) 三个数组
+    """
+    rng = np.random.default_rng(seed)
+    close = 50 + np.cumsum(rng.normal(0, 1, n))
+    spread = np.abs(rng.normal(0, 1, (n, 2)))
+    high = np.round((close + spread[:, 0]) / tick) * tick
+    low = np.round((close - spread[:, 1]) / tick) * tick
+    return high, low, close
+
+
+def check_equivalence(n=300, seeds=range(10)):
+    """三种模式的批量内核、增量内核必须与各自的原实现完全一致"""
+    for seed in seeds:
+        for tick in (0.05, 0.5, 1.0):
+            highs, lows, _ = generate_bars(n, seed, tick)
+
+            effective, included, prev = legacy_cascade(highs, lows)
+            result = effective_bars(highs, lows, CASCADE)
+            assert np.flatnonzero(result['valid']).tolist() == effective
+            assert result['included'].tolist() == included
+            assert result['prev'].tolist() == prev
+            assert incremental(highs, lows, CASCADE) == effective
+
+            rescan = legacy_rescan(highs, lows)
+            assert np.flatnonzero(effective_bars(highs, lows, RESCAN)['valid']).tolist() == rescan
+            assert incremental(highs, lows, RESCAN) == rescan
+
+            single = legacy_single(pd.DataFrame({'high': highs, 'low': lows}))
+            assert np.flatnonzero(effective_bars(highs, lows, SINGLE)['valid']).tolist() == single
+            assert incremental(highs, lows, SINGLE) == single
+    print(f"✓ 三种模式结果与原实现一致（{len(seeds)} 组随机数据 × 3 种价格精度，每组 {n} 根K线）")
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def benchmark(n=2000):
+    """对比原实现与共用引擎处理n根K线的耗时"""
+    highs, lows, _ = generate_bars(n, seed=0)
+    df = pd.DataFrame({'high': highs, 'low': lows})
+    legacy = (
+        (CASCADE, 'JQData 连续出栈', legacy_cascade, (highs, lows)),
+        (RESCAN, 'up 逐根重扫', legacy_rescan, (highs, lows)),
+        (SINGLE, 'selector df.loc', legacy_single, (df,)),
+    )
+    print(f"\n{n} 根K线耗时（秒）:")
+    print(f"  {'模式':<8}{'原实现':<18}{'原耗时':>10}{'批量内核':>10}{'增量内核':>10}")
+    for mode, name, func, args in legacy:
+        print(f"  {mode:<8}{name:<18}{timed(func, *args):>10.4f}"
+              f"{timed(effective_bars, highs, lows, mode):>10.4f}"
+              f"{timed(incremental, highs, lows, mode):>10.4f}")
+
+
+if __name__ == '__main__':
+    check_equivalence()
+    benchmark()
@@ -0,0 +1,94 @@
+"""
+启动耗时基准测试 - 在全新的解释器中测量各模块的导入时间
+并检查数据源（akshare、tushare、yfinance）没有在导入时被加载
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_SOURCES = ['akshare', 'tushare', 'yfinance']
+
+MODULES = ['trend_judge', 'market_data', 'main']
+
+SNIPPET = """
+import sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+loaded = [m for m in {sources!r} if m in sys.modules]
+print(elapsed, ','.join(loaded))
+"""
+
+
+def measure_import(module: str, runs: int = 5):
+    """
+    在全新解释器中导入模块，返回(各次耗时列表, 导入时被加载的数据源)
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    code = SNIPPET.format(module=module, sources=HEAVY_SOURCES)
+    timings = []
+    loaded = ''
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout
+        elapsed, _, loaded = output.strip().partition(' ')
+        timings.append(float(elapsed))
+    return timings, loaded
+
+
+def show_importtime(module: str, top: int = 10):
+    """打印 -X importtime 中累计耗时最高的模块"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        cumulative_us = parts[1].strip()
+        if not cumulative_us.isdigit():
+            continue
+        rows.append((int(cumulative_us), parts[2].strip()))
+    rows.sort(reverse=True)
+    print(f"  {module} 导入耗时最高的模块:")
+    for cumulative_us, name in rows[:top]:
+        print(f"    {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--runs', type=int, default=5, help='每个模块测量次数（取中位数）')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='任一模块导入中位数超过该值则以非0状态退出')
+    parser.add_argument('--importtime', action='store_true',
+                        help='额外打印 -X importtime 中耗时最高的模块')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("启动耗时基准测试")
+    print("=" * 60)
+
+    failed = False
+    for module in MODULES:
+        timings, loaded = measure_import(module, runs=args.runs)
+        median = statistics.median(timings)
+        print(f"{module:<12} 中位数 {median * 1000:8.1f} ms  "
+              f"(最快 {min(timings) * 1000:.1f} ms, 最慢 {max(timings) * 1000:.1f} ms)")
+        if loaded:
+            print(f"  ⚠️  导入时加载了数据源: {loaded}")
+            failed = True
+        if args.max_seconds is not None and median > args.max_seconds:
+            print(f"  ⚠️  超过阈值 {args.max_seconds:.2f} 秒")
+            failed = True
+        if args.importtime:
+            show_importtime(module)
+
+    print("=" * 60)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
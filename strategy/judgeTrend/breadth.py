@@ -0,0 +1,271 @@
+"""
+市场宽度模块 - 基于指数全部成分股计算市场宽度指标
+（站上均线比例、涨跌家数线、新高减新低），作为趋势判断的补充信号
+
+本地K线库目录结构：
+    <store_dir>/<universe>/<symbol>.csv
+其中universe为 csi300、csi500、csi1000、hsi 等，CSV至少包含 date、close 两列
+"""
+import glob
+import io
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# 各市场用于计算宽度的成分股范围
+MARKET_UNIVERSES = {
+    'A': ['csi300', 'csi500', 'csi1000'],
+    'H': ['hsi'],
+}
+
+
+def load_bar_store(store_dir: str, universes: Iterable[str], days: int = 250) -> pd.DataFrame:
+    """
+    从本地K线库读取成分股收盘价
+
+    Args:
+        store_dir: K线库根目录
+        universes: 成分股范围，如 ['csi300', 'csi500', 'csi1000']
+        days: 只保留最近多少个交易日
+
+    Returns:
+        宽表收盘价（日期 × 股票），同一股票出现在多个范围中只保留一次
+    """
+    series = {}
+    for universe in universes:
+        for path in sorted(glob.glob(os.path.join(store_dir, universe, '*.csv'))):
+            symbol = os.path.splitext(os.path.basename(path))[0]
+            if symbol in series:
+                continue
+            bars = pd.read_csv(path, usecols=['date', 'close'], parse_dates=['date'])
+            series[symbol] = bars.set_index('date')['close']
+
+    if not series:
+        return pd.DataFrame()
+
+    close = pd.DataFrame(series).sort_index()
+    return close.iloc[-days:]
+
+
+def _read_tail(path: str, after: pd.Timestamp, tail_bytes: int) -> pd.Series:
+    """读取单个CSV中日期晚于after的收盘价（只读文件末尾，末尾不够时再整个读取）"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start = max(f.tell(), size - tail_bytes)
+        f.seek(start)
+        block = f.read()
+    if start > len(header):
+        block = block.split(b'\n', 1)[1] if b'\n' in block else b''  # 丢弃被截断的第一行
+    bars = pd.read_csv(io.BytesIO(header + block), usecols=['date', 'close'], parse_dates=['date'])
+    if start > len(header) and (bars.empty or bars['date'].iloc[0] > after):
+        # 末尾的数据不够覆盖after之后的全部K线
+        bars = pd.read_csv(path, usecols=['date', 'close'], parse_dates=['date'])
+    bars = bars[bars['date'] > after]
+    return bars.set_index('date')['close']
+
+
+def load_new_bars(store_dir: str, universes: Iterable[str], after, modified_since: Optional[float] = None,
+                  tail_bytes: int = 4096) -> pd.DataFrame:
+    """
+    从本地K线库读取某个日期之后新增的收盘价（用于 BreadthEngine.update 增量更新）
+
+    Args:
+        store_dir: K线库根目录
+        universes: 成分股范围
+        after: 只返回晚于该日期的K线
+        modified_since: 只读取在该时间戳（time.time()）之后修改过的文件，为None时读取全部文件
+        tail_bytes: 每个文件只读取末尾的字节数（不够覆盖新增K线时整个读取）
+
+    Returns:
+        宽表收盘价（新增日期 × 股票），没有新增K线时为空DataFrame
+    """
+    after = pd.Timestamp(after)
+    series = {}
+    for universe in universes:
+        for path in sorted(glob.glob(os.path.join(store_dir, universe, '*.csv'))):
+            symbol = os.path.splitext(os.path.basename(path))[0]
+            if symbol in series:
+                continue
+            if modified_since is not None and os.path.getmtime(path) < modified_since:
+                continue
+            bars = _read_tail(path, after, tail_bytes)
+            if not bars.empty:
+                series[symbol] = bars
+
+    if not series:
+        return pd.DataFrame()
+    return pd.DataFrame(series).sort_index()
+
+
+class BreadthEngine:
+    """
+    市场宽度计算引擎
+
+    compute 对整个 日期 × 股票 矩阵一次性向量化计算全部历史；
+    update 在已有状态上增量追加一天，只保留计算所需的最近窗口
+    """
+
+    def __init__(self, ma_windows: Tuple[int, ...] = (20, 60), high_low_window: int = 60):
+        """
+        初始化宽度引擎
+
+        Args:
+            ma_windows: 计算站上均线比例的均线周期
+            high_low_window: 新高/新低的回看周期
+        """
+        self.ma_windows = tuple(ma_windows)
+        self.high_low_window = high_low_window
+        self.window = max(self.ma_windows + (high_low_window,))
+
+        # 增量计算状态
+        self.columns = None
+        self._buffer = None      # 最近window天的收盘价（环形缓冲区）
+        self._count = 0          # 已写入的天数
+        self._ad_line = 0.0
+        self._computed = pd.DataFrame()
+        self._updates = []
+
+    def compute(self, close: pd.DataFrame) -> pd.DataFrame:
+        """
+        向量化计算全部历史的宽度指标，并以最后window天初始化增量状态
+
+        Args:
+            close: 宽表收盘价（日期 × 股票），停牌或未上市为NaN
+
+        Returns:
+            以日期为索引的宽度指标DataFrame
+        """
+        values = close.to_numpy(dtype=float)
+        result = pd.DataFrame(index=close.index)
+
+        for window in self.ma_windows:
+            ma = close.rolling(window=window).mean().to_numpy()
+            has_ma = ~np.isnan(ma) & ~np.isnan(values)
+            above = (values > ma) & has_ma
+            result[f'pct_above_ma{window}'] = self._ratio(above.sum(axis=1), has_ma.sum(axis=1))
+
+        prev = np.vstack([np.full((1, values.shape[1]), np.nan), values[:-1]])
+        advances = (values > prev).sum(axis=1)
+        declines = (values < prev).sum(axis=1)
+        result['advances'] = advances
+        result['declines'] = declines
+        result['ad_line'] = np.cumsum(advances - declines).astype(float)
+
+        rolling_high = close.rolling(window=self.high_low_window).max().to_numpy()
+        rolling_low = close.rolling(window=self.high_low_window).min().to_numpy()
+        new_highs = (values >= rolling_high).sum(axis=1)
+        new_lows = (values <= rolling_low).sum(axis=1)
+        result['new_highs'] = new_highs
+        result['new_lows'] = new_lows
+        result['nh_nl'] = new_highs - new_lows
+
+        # 初始化增量状态
+        self.columns = close.columns
+        self._buffer = np.full((self.window, values.shape[1]), np.nan)
+        tail = values[-self.window:]
+        self._count = len(values)
+        for offset, row in enumerate(tail):
+            self._buffer[(self._count - len(tail) + offset) % self.window] = row
+        self._ad_line = float(result['ad_line'].iloc[-1]) if len(result) else 0.0
+        self._computed = result
+        self._updates = []
+        return result
+
+    def update(self, date, close_row) -> Dict:
+        """
+        增量追加一天的收盘价，只用最近window天的数据计算当日宽度
+
+        Args:
+            date: 交易日期
+            close_row: 当日各股票收盘价（顺序与compute时的列一致，也可传入Series）
+
+        Returns:
+            当日的宽度指标字典
+        """
+        if isinstance(close_row, pd.Series):
+            if self.columns is None:
+                self.columns = close_row.index
+            close_row = close_row.reindex(self.columns)
+        row = np.asarray(close_row, dtype=float)
+        if self._buffer is None:
+            self._buffer = np.full((self.window, len(row)), np.nan)
+
+        prev = self._buffer[(self._count - 1) % self.window] if self._count else np.full(len(row), np.nan)
+        self._buffer[self._count % self.window] = row
+        self._count += 1
+        recent = self._recent()
+
+        values = {'date': date}
+        for window in self.ma_windows:
+            block = recent[-window:]
+            full = (len(block) == window) & ~np.isnan(block).any(axis=0)
+            ma = block.mean(axis=0) if len(block) == window else np.full(len(row), np.nan)
+            has_ma = full & ~np.isnan(row)
+            values[f'pct_above_ma{window}'] = self._ratio(((row > ma) & has_ma).sum(), has_ma.sum())
+
+        advances = int((row > prev).sum())
+        declines = int((row < prev).sum())
+        self._ad_line += advances - declines
+        values['advances'] = advances
+        values['declines'] = declines
+        values['ad_line'] = self._ad_line
+
+        block = recent[-self.high_low_window:]
+        if len(block) == self.high_low_window:
+            full = ~np.isnan(block).any(axis=0)
+            new_highs = int(((row >= block.max(axis=0)) & full).sum())
+            new_lows = int(((row <= block.min(axis=0)) & full).sum())
+        else:
+            new_highs = new_lows = 0
+        values['new_highs'] = new_highs
+        values['new_lows'] = new_lows
+        values['nh_nl'] = new_highs - new_lows
+
+        self._updates.append(values)
+        return values
+
+    def to_frame(self) -> pd.DataFrame:
+        """将当前累计的宽度指标转换为DataFrame"""
+        if not self._updates:
+            return self._computed
+        updates = pd.DataFrame(self._updates).set_index('date')
+        return pd.concat([self._computed, updates]) if len(self._computed) else updates
+
+    def _recent(self) -> np.ndarray:
+        """按时间顺序返回环形缓冲区中最近的数据"""
+        n = min(self._count, self.window)
+        start = self._count - n
+        order = [(start + i) % self.window for i in range(n)]
+        return self._buffer[order]
+
+    @staticmethod
+    def _ratio(numerator, denominator):
+        """计算比例，分母为0时为NaN"""
+        numerator = np.asarray(numerator, dtype=float)
+        denominator = np.asarray(denominator, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def compute_market_breadth(store_dir: str, market: str = 'A', days: int = 250,
+                           engine: Optional[BreadthEngine] = None) -> pd.DataFrame:
+    """
+    读取指定市场的成分股K线并计算宽度指标
+
+    Args:
+        store_dir: K线库根目录
+        market: 'A' 表示A股（沪深300/中证500/中证1000），'H' 表示港股（恒生指数）
+        days: 使用最近多少个交易日
+
+    Returns:
+        宽度指标DataFrame；K线库中没有数据时返回空DataFrame
+    """
+    close = load_bar_store(store_dir, MARKET_UNIVERSES.get(market, []), days=days)
+    if close.empty:
+        return pd.DataFrame()
+    engine = engine or BreadthEngine()
+    return engine.compute(close)
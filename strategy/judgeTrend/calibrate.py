@@ -0,0 +1,302 @@
+"""
+TrendJudge参数校准工具
+用历史数据上的未来收益作为标签，搜索各指标权重、趋势阈值以及布林带/动量阈值的最佳组合
+
+做法：
+1. 每个指数只计算一次全部K线的技术指标，并用面板评分函数一次得到各指标逐K线的(信号, 强度)
+2. 每根K线的综合信号是各指标 信号×强度 的线性组合，因此上万组权重可以用一次矩阵乘法同时计算
+3. 权重网格按列分块计算，每块只占用 (K线数, chunk_size) 的矩阵，避免多进程同时占用过多内存
+4. 各指数在独立进程中并行计算，最后汇总所有指数的结果
+"""
+import argparse
+import itertools
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trend_judge import DEFAULT_WEIGHTS, TrendJudge
+
+
+SCORERS = list(DEFAULT_WEIGHTS.keys())
+
+
+def weight_grid(step: float = 0.05) -> np.ndarray:
+    """
+    生成各指标权重的网格（每个权重为step的整数倍，且权重之和为1）
+
+    Returns:
+        形状为 (组合数, 指标数) 的数组，第一行为默认权重
+    """
+    units = int(round(1 / step))
+    rows = []
+    # 将units个单位分配给len(SCORERS)个指标（隔板法）
+    for bars in itertools.combinations(range(units + len(SCORERS) - 1), len(SCORERS) - 1):
+        edges = (-1,) + bars + (units + len(SCORERS) - 1,)
+        rows.append([(edges[i + 1] - edges[i] - 1) * step for i in range(len(SCORERS))])
+    grid = np.array(rows)
+
+    default = np.array([DEFAULT_WEIGHTS[k] for k in SCORERS])
+    grid = grid[~np.all(np.isclose(grid, default), axis=1)]
+    return np.vstack([default, grid])
+
+
+def scorer_series(judge: TrendJudge, ind: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算每根K线上各指标的 信号×强度 与 强度
+
+    Args:
+        judge: 趋势判断器（决定布林带、动量阈值）
+        ind: calculate_indicators_panel 的结果（单列面板）
+
+    Returns:
+        (contribution, strength)，形状均为 (K线数, 指标数)
+    """
+    names = [k for k in ind if k != 'valid']
+    cur = {k: ind[k][:, 0] for k in names}
+    # 前一根K线，第一根K线与judge_trend_panel一样取自身
+    prev = {k: np.concatenate([v[:1], v[:-1]]) for k, v in cur.items()}
+    signals = judge.score_panel(cur, prev, cur['n_obs'])
+
+    contribution = np.column_stack([signals[k][0] * signals[k][1] for k in SCORERS])
+    strength = np.column_stack([signals[k][1] for k in SCORERS])
+    return contribution, strength
+
+
+def evaluate_index(task: Dict) -> Dict:
+    """
+    评估单个指数上所有参数组合的表现（在子进程中运行）
+
+    Args:
+        task: 包含 close（收盘价数组）、weights、thresholds、cutoffs、horizon、label_band、min_obs、chunk_size
+
+    Returns:
+        {'correct': 预测正确的K线数, 'return_sum': 按趋势方向持仓的未来收益之和, 'n': 参与评估的K线数}，
+        前两项形状为 (阈值组合数, 权重组合数, 趋势阈值数)
+    """
+    close = pd.DataFrame({'close': task['close']})
+    weights = task['weights']
+    thresholds = task['thresholds']
+    horizon = task['horizon']
+    band = task['label_band']
+    chunk_size = task['chunk_size']
+
+    judge = TrendJudge()
+    ind = judge.calculate_indicators_panel(close)
+    prices = ind['close'][:, 0]
+
+    # 未来收益标签
+    forward = np.full(len(prices), np.nan)
+    forward[:-horizon] = prices[horizon:] / prices[:-horizon] - 1
+    mask = (ind['n_obs'][:, 0] >= task['min_obs']) & ind['valid'][:, 0] & ~np.isnan(forward)
+    forward = forward[mask]
+    label_up = (forward > band).astype(float)
+    label_down = (forward < -band).astype(float)
+    label_side = 1.0 - label_up - label_down
+
+    shape = (len(task['cutoffs']), len(weights), len(thresholds))
+    correct = np.zeros(shape)
+    return_sum = np.zeros(shape)
+    if not mask.any():
+        return {'correct': correct, 'return_sum': return_sum, 'n': 0}
+
+    for p, (bb_width, short_cut, long_cut) in enumerate(task['cutoffs']):
+        judge.bb_squeeze_width = bb_width
+        judge.momentum_short_cutoff = short_cut
+        judge.momentum_long_cutoff = long_cut
+        contribution, _ = scorer_series(judge, ind)
+
+        contribution = contribution[mask]
+        for start in range(0, len(weights), chunk_size):
+            columns = slice(start, start + chunk_size)
+            # (K线数, 本块权重组合数)：本块权重组合的综合信号
+            total = contribution @ weights[columns].T
+            for k, threshold in enumerate(thresholds):
+                up = total > threshold
+                down = total < -threshold
+                side = ~(up | down)
+                correct[p, columns, k] = label_up @ up + label_down @ down + label_side @ side
+                return_sum[p, columns, k] = forward @ up - forward @ down
+
+    return {'correct': correct, 'return_sum': return_sum, 'n': int(mask.sum())}
+
+
+def calibrate(closes: Dict[str, pd.Series], weights: np.ndarray, thresholds: List[float],
+              cutoffs: List[Tuple[float, float, float]], horizon: int = 20,
+              label_band: float = 0.03, min_obs: int = 60, metric: str = 'accuracy',
+              workers: Optional[int] = None, top: int = 10, chunk_size: int = 512) -> Dict:
+    """
+    在多个指数上并行搜索最佳参数组合
+
+    Args:
+        closes: 指数名 -> 收盘价序列
+        weights: 权重网格 (组合数, 指标数)
+        thresholds: 趋势阈值候选
+        cutoffs: (布林带收窄宽度, 5日动量阈值, 20日动量阈值) 候选
+        horizon: 未来收益的天数（至少为1）
+        label_band: 未来收益超过±该值标记为上涨/下跌，否则为震荡
+        min_obs: 至少有多少条数据的K线才参与评估（与main.py的60条一致）
+        metric: 'accuracy' 按三分类准确率选择，'return' 按趋势方向持仓的平均未来收益选择
+        workers: 并行进程数
+        top: 报告前多少个组合
+        chunk_size: 每次同时计算多少组权重（每个进程的综合信号矩阵为 K线数 × chunk_size）
+
+    Returns:
+        包含最佳组合、默认参数表现和前top个组合的字典
+    """
+    if horizon < 1:
+        raise ValueError(f"horizon 至少为1，当前为 {horizon}")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size 至少为1，当前为 {chunk_size}")
+
+    tasks = [{'close': series.to_numpy(dtype=float), 'weights': weights, 'thresholds': thresholds,
+              'cutoffs': cutoffs, 'horizon': horizon, 'label_band': label_band, 'min_obs': min_obs,
+              'chunk_size': chunk_size}
+             for series in closes.values()]
+
+    correct = 0
+    return_sum = 0
+    n = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for name, result in zip(closes, executor.map(evaluate_index, tasks)):
+            print(f"  {name}: {result['n']} 根K线")
+            correct = correct + result['correct']
+            return_sum = return_sum + result['return_sum']
+            n += result['n']
+
+    if n == 0:
+        return {}
+
+    accuracy = correct / n
+    avg_return = return_sum / n
+    score = accuracy if metric == 'accuracy' else avg_return
+    order = np.argsort(score, axis=None)[::-1][:top]
+
+    def describe(flat_index):
+        p, m, k = np.unravel_index(flat_index, score.shape)
+        bb_width, short_cut, long_cut = cutoffs[p]
+        return {
+            'weights': {name: round(float(w), 4) for name, w in zip(SCORERS, weights[m])},
+            'trend_threshold': float(thresholds[k]),
+            'bb_squeeze_width': bb_width,
+            'momentum_short_cutoff': short_cut,
+            'momentum_long_cutoff': long_cut,
+            'accuracy': float(accuracy[p, m, k]),
+            'avg_forward_return': float(avg_return[p, m, k]),
+        }
+
+    # 默认参数：第0行权重、阈值0.3、默认布林带/动量阈值
+    default_index = None
+    if 0.3 in thresholds and (0.1, 0.02, 0.05) in cutoffs:
+        default_index = np.ravel_multi_index(
+            (cutoffs.index((0.1, 0.02, 0.05)), 0, thresholds.index(0.3)), score.shape)
+
+    return {
+        'bars': n,
+        'combinations': int(score.size),
+        'best': describe(order[0]),
+        'default': describe(default_index) if default_index is not None else None,
+        'top': [describe(i) for i in order],
+    }
+
+
+def load_closes(args) -> Dict[str, pd.Series]:
+    """读取待校准指数的收盘价：宽表CSV或通过数据源获取主要指数"""
+    if args.panel_csv:
+        panel = pd.read_csv(args.panel_csv, index_col=0, parse_dates=True).sort_index()
+        return {col: panel[col].dropna() for col in panel.columns}
+
+    from market_data import MarketDataFetcher
+    fetcher = MarketDataFetcher(tushare_token=args.tushare_token)
+    markets = ['A', 'H'] if args.market == 'all' else [args.market]
+    closes = {}
+    for market in markets:
+        for key, df in fetcher.get_market_indices(market=market, days=args.days).items():
+            closes[f'{market}:{key}'] = df.set_index('date')['close']
+    return closes
+
+
+def parse_floats(text: str) -> List[float]:
+    return [float(x) for x in text.split(',') if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TrendJudge参数校准')
+    parser.add_argument('--panel-csv', type=str,
+                        help='宽表收盘价CSV（第一列为日期，其余每列一个指数）；不提供则通过数据源获取')
+    parser.add_argument('--market', type=str, choices=['A', 'H', 'all'], default='all')
+    parser.add_argument('--days', type=int, default=2500, help='通过数据源获取时的历史天数')
+    parser.add_argument('--tushare-token', type=str, help='Tushare API token')
+    parser.add_argument('--horizon', type=int, default=20, help='未来收益天数（默认20）')
+    parser.add_argument('--label-band', type=float, default=0.03,
+                        help='未来收益超过±该值视为上涨/下跌（默认0.03）')
+    parser.add_argument('--weight-step', type=float, default=0.05, help='权重网格步长（默认0.05）')
+    parser.add_argument('--thresholds', type=str, default='0.1,0.15,0.2,0.25,0.3,0.35,0.4',
+                        help='趋势阈值候选，逗号分隔')
+    parser.add_argument('--bb-widths', type=str, default='0.1', help='布林带收窄宽度候选')
+    parser.add_argument('--momentum-short', type=str, default='0.02', help='5日动量阈值候选')
+    parser.add_argument('--momentum-long', type=str, default='0.05', help='20日动量阈值候选')
+    parser.add_argument('--metric', type=str, choices=['accuracy', 'return'], default='accuracy')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数（默认CPU核数）')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=512,
+                        help='每次同时计算的权重组合数，越小越省内存（默认512）')
+    parser.add_argument('--output', type=str, help='输出结果到文件（JSON格式）')
+    args = parser.parse_args()
+    if args.horizon < 1:
+        parser.error('--horizon 至少为1')
+    if args.chunk_size < 1:
+        parser.error('--chunk-size 至少为1')
+
+    closes = load_closes(args)
+    if not closes:
+        print("没有可用于校准的数据")
+        return
+
+    weights = weight_grid(args.weight_step)
+    thresholds = parse_floats(args.thresholds)
+    cutoffs = list(itertools.product(parse_floats(args.bb_widths),
+                                     parse_floats(args.momentum_short),
+                                     parse_floats(args.momentum_long)))
+
+    print("=" * 60)
+    print(f"校准 {len(closes)} 个指数：{len(weights)} 组权重 × {len(thresholds)} 个趋势阈值 × "
+          f"{len(cutoffs)} 组布林带/动量阈值")
+    print("=" * 60)
+
+    report = calibrate(closes, weights, thresholds, cutoffs, horizon=args.horizon,
+                       label_band=args.label_band, metric=args.metric,
+                       workers=args.workers, top=args.top, chunk_size=args.chunk_size)
+    if not report:
+        print("数据量不足，无法校准")
+        return
+
+    print(f"\n共评估 {report['combinations']} 个组合，{report['bars']} 根K线")
+    if report['default']:
+        default = report['default']
+        print(f"默认参数: 准确率 {default['accuracy']:.2%}, "
+              f"平均未来收益 {default['avg_forward_return']:.3%}")
+    print(f"\n前 {len(report['top'])} 个组合（按{'准确率' if args.metric == 'accuracy' else '平均未来收益'}）:")
+    for rank, item in enumerate(report['top'], 1):
+        weights_text = ', '.join(f"{k}={v:.2f}" for k, v in item['weights'].items())
+        print(f"  {rank:>2}. 准确率 {item['accuracy']:.2%}  收益 {item['avg_forward_return']:.3%}  "
+              f"阈值 {item['trend_threshold']:.2f}  布林带 {item['bb_squeeze_width']:.2f}  "
+              f"动量 {item['momentum_short_cutoff']:.2f}/{item['momentum_long_cutoff']:.2f}  [{weights_text}]")
+
+    best = report['best']
+    print("\n最佳参数可直接传入 TrendJudge：")
+    print(f"  TrendJudge(weights={best['weights']}, trend_threshold={best['trend_threshold']}, "
+          f"bb_squeeze_width={best['bb_squeeze_width']}, "
+          f"momentum_short_cutoff={best['momentum_short_cutoff']}, "
+          f"momentum_long_cutoff={best['momentum_long_cutoff']})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
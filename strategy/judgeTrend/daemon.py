@@ -0,0 +1,247 @@
+"""
+趋势判断常驻模式
+按A股/港股交易时间定时唤醒，只刷新过期的指数、只重算数据有变化的指数，
+结果原子写入JSON文件，并通过本机HTTP接口从内存直接提供给其他任务读取
+"""
+import json
+import threading
+import time
+from datetime import datetime, date, timedelta, timezone, time as dtime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+from main import MarketTrendAnalyzer, save_results, to_serializable
+
+
+# A股与港股均为UTC+8，且没有夏令时
+MARKET_TZ = timezone(timedelta(hours=8))
+
+# 各市场交易时段（当地时间）
+MARKET_SESSIONS = {
+    'A': [(dtime(9, 30), dtime(11, 30)), (dtime(13, 0), dtime(15, 0))],
+    'H': [(dtime(9, 30), dtime(12, 0)), (dtime(13, 0), dtime(16, 0))],
+}
+
+
+def session_bounds(market: str, day: date) -> List[Tuple[datetime, datetime]]:
+    """获取某天的交易时段（周末返回空列表，节假日未处理）"""
+    if day.weekday() >= 5:
+        return []
+    return [(datetime.combine(day, start, MARKET_TZ), datetime.combine(day, end, MARKET_TZ))
+            for start, end in MARKET_SESSIONS[market]]
+
+
+def in_session(market: str, now: datetime) -> bool:
+    """当前是否处于交易时段"""
+    return any(start <= now < end for start, end in session_bounds(market, now.date()))
+
+
+def last_session_close(market: str, now: datetime) -> Optional[datetime]:
+    """最近一次已经结束的交易时段的收盘时间"""
+    for days_back in range(8):
+        day = now.date() - timedelta(days=days_back)
+        closes = [end for _, end in session_bounds(market, day) if end <= now]
+        if closes:
+            return max(closes)
+    return None
+
+
+def next_wake_time(market: str, now: datetime, interval: timedelta,
+                   close_delay: timedelta) -> datetime:
+    """
+    下一次需要唤醒的时间
+
+    交易时段内每隔interval刷新一次；每个时段开盘时、收盘后close_delay各刷新一次
+    """
+    if in_session(market, now):
+        candidates = [now + interval]
+    else:
+        candidates = []
+    for days_ahead in range(8):
+        day = now.date() + timedelta(days=days_ahead)
+        for start, end in session_bounds(market, day):
+            for event in (start, end + close_delay):
+                if event > now:
+                    candidates.append(event)
+        if candidates:
+            break
+    return min(candidates)
+
+
+class TrendDaemon:
+    """趋势判断常驻进程"""
+
+    def __init__(self, analyzer: MarketTrendAnalyzer, markets: List[str],
+                 output_path: Optional[str] = None,
+                 interval_minutes: int = 30, close_delay_minutes: int = 15):
+        """
+        初始化常驻进程
+
+        Args:
+            analyzer: 市场趋势分析器（保持进程常驻，数据源只需导入一次）
+            markets: 要分析的市场列表，如 ['A', 'H']
+            output_path: 结果JSON文件路径（与 --output 格式相同），None表示不写文件
+            interval_minutes: 交易时段内的刷新间隔（分钟）
+            close_delay_minutes: 收盘后延迟多久刷新收盘数据（分钟）
+        """
+        self.analyzer = analyzer
+        self.markets = markets
+        self.output_path = output_path
+        self.interval = timedelta(minutes=interval_minutes)
+        self.close_delay = timedelta(minutes=close_delay_minutes)
+
+        # (市场, 指数简称) -> {'df', 'fetched_at', 'result'}
+        self.cache = {}
+        self.results = {}
+        self._payload = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def is_stale(self, market: str, fetched_at: Optional[datetime], now: datetime) -> bool:
+        """
+        判断指数数据是否过期
+
+        从未获取、获取后又有交易时段收盘、或交易时段内超过刷新间隔，均视为过期
+        """
+        if fetched_at is None:
+            return True
+        closed_at = last_session_close(market, now)
+        if closed_at is not None and fetched_at < closed_at:
+            return True
+        return in_session(market, now) and now - fetched_at >= self.interval
+
+    def refresh(self, now: Optional[datetime] = None) -> bool:
+        """
+        刷新过期的指数并增量重算趋势
+
+        Returns:
+            结果是否有变化
+        """
+        now = now or datetime.now(MARKET_TZ)
+        fetcher = self.analyzer.data_fetcher
+        changed = False
+
+        for market in self.markets:
+            indices = fetcher.A_SHARE_INDICES if market == 'A' else fetcher.HK_INDICES
+            market_changed = market not in self.results
+
+            for index_key, index_info in indices.items():
+                entry = self.cache.get((market, index_key), {})
+                if not self.is_stale(market, entry.get('fetched_at'), now):
+                    continue
+
+                df = fetcher.get_index_data(index_info['code'], market=market)
+                # 避免请求过快，与get_market_indices的延时一致
+                time.sleep(1 if market == 'A' else 2)
+                if df is None or df.empty:
+                    print(f"[{now:%H:%M:%S}] {index_info['name']} 获取失败，保留上次结果")
+                    continue
+                entry['fetched_at'] = now
+
+                # 最新K线未变化则不重算
+                old_df = entry.get('df')
+                if old_df is not None and len(old_df) == len(df) and \
+                        old_df.iloc[-1]['date'] == df.iloc[-1]['date'] and \
+                        old_df.iloc[-1]['close'] == df.iloc[-1]['close']:
+                    self.cache[(market, index_key)] = entry
+                    continue
+
+                entry['df'] = df
+                breadth = self.analyzer.get_breadth(market)
+                entry['result'] = self.analyzer.trend_judge.judge_trend(df, breadth=breadth) \
+                    if len(df) >= 60 else None
+                self.cache[(market, index_key)] = entry
+                market_changed = True
+                print(f"[{now:%H:%M:%S}] {index_info['name']} 已更新，共 {len(df)} 条记录")
+
+            if market_changed:
+                index_results = {
+                    index_key: {
+                        'name': self.analyzer._get_index_name(index_key, market),
+                        'result': self.cache[(market, index_key)]['result']
+                    }
+                    for index_key in indices
+                    if self.cache.get((market, index_key), {}).get('result') is not None
+                }
+                self.results[market] = self.analyzer.summarize_market(market, index_results)
+                changed = True
+
+        if changed:
+            self._publish()
+        return changed
+
+    def _publish(self):
+        """更新内存中的结果，并原子写入JSON文件"""
+        data = to_serializable(self.results)
+        payload = {'': json.dumps(data, ensure_ascii=False).encode('utf-8')}
+        for market, result in data.items():
+            payload[market] = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            self._payload = payload
+
+        if self.output_path:
+            save_results(self.results, self.output_path)
+
+    def get_payload(self, market: str = '') -> Optional[bytes]:
+        """获取最新结果的JSON（已预先序列化，读取几乎没有开销）"""
+        with self._lock:
+            return self._payload.get(market)
+
+    def seconds_until_next_wake(self, now: Optional[datetime] = None) -> float:
+        """距离下一次唤醒的秒数"""
+        now = now or datetime.now(MARKET_TZ)
+        wake = min(next_wake_time(market, now, self.interval, self.close_delay)
+                   for market in self.markets)
+        return max((wake - now).total_seconds(), 1.0)
+
+    def start_server(self, host: str = '127.0.0.1', port: int = 8765):
+        """
+        在后台线程启动本机HTTP服务
+
+        GET /regime 返回全部市场结果，GET /regime/A、/regime/H 返回单个市场
+        """
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.rstrip('/')
+                if path == '/regime':
+                    body = daemon.get_payload()
+                elif path.startswith('/regime/'):
+                    body = daemon.get_payload(path[len('/regime/'):])
+                else:
+                    body = None
+
+                if body is None:
+                    # 尚未完成首次计算返回503，路径或市场不存在返回404
+                    self.send_response(503 if daemon.get_payload() is None else 404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        print(f"本地服务已启动: http://{host}:{port}/regime")
+
+    def run_forever(self, host: str = '127.0.0.1', port: int = 8765):
+        """常驻运行：刷新 -> 休眠到下一个唤醒时间 -> 刷新"""
+        self.start_server(host, port)
+        try:
+            while True:
+                self.refresh()
+                sleep_seconds = self.seconds_until_next_wake()
+                print(f"下次刷新: {datetime.now(MARKET_TZ) + timedelta(seconds=sleep_seconds):%Y-%m-%d %H:%M}")
+                time.sleep(sleep_seconds)
+        except KeyboardInterrupt:
+            print("\n常驻进程已停止")
+        finally:
+            if self._server:
+                self._server.shutdown()
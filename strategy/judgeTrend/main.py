@@ -3,10 +3,12 @@
 判断A股和港股市场是处于上升趋势、震荡还是下降趋势
 """
 import sys
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 import pandas as pd
 
+from breadth import MARKET_UNIVERSES, BreadthEngine, load_bar_store, load_new_bars
 from market_data import MarketDataFetcher
 from trend_judge import TrendJudge, TrendType
 
@@ -14,15 +16,54 @@ from trend_judge import TrendJudge, TrendType
 class MarketTrendAnalyzer:
     """市场趋势分析器"""
     
-    def __init__(self, tushare_token: str = None):
+    def __init__(self, tushare_token: str = None, breadth_store: str = None):
         """
         初始化分析器
         
         Args:
             tushare_token: Tushare API token（可选，但强烈推荐使用以获得更稳定的数据）
+            breadth_store: 成分股本地K线库目录（可选，提供时加入市场宽度信号）
         """
         self.data_fetcher = MarketDataFetcher(tushare_token=tushare_token)
         self.trend_judge = TrendJudge()
+        self.breadth_store = breadth_store
+        # 市场 -> {engine, last_date, loaded_at}：第一次全量计算，之后只把新增的K线增量加入引擎
+        self._breadth = {}
+    
+    def get_breadth(self, market: str) -> Optional[pd.DataFrame]:
+        """
+        获取市场宽度指标（未配置K线库或K线库为空时返回None）
+        
+        第一次调用时读取全部成分股K线并用 BreadthEngine.compute 计算全部历史；
+        之后只读取修改过的K线文件的末尾，把新增的交易日逐日传给 BreadthEngine.update。
+        
+        Args:
+            market: 'A' 表示A股，'H' 表示港股
+        """
+        if not self.breadth_store:
+            return None
+        universes = MARKET_UNIVERSES.get(market, [])
+        state = self._breadth.get(market)
+        loaded_at = time.time()
+        
+        if state is None:
+            close = load_bar_store(self.breadth_store, universes)
+            if close.empty:
+                return None
+            engine = BreadthEngine()
+            engine.compute(close)
+            self._breadth[market] = {'engine': engine, 'last_date': close.index[-1], 'loaded_at': loaded_at}
+            return engine.to_frame()
+        
+        engine = state['engine']
+        new_bars = load_new_bars(self.breadth_store, universes, after=state['last_date'],
+                                 modified_since=state['loaded_at'])
+        for date, row in new_bars.iterrows():
+            engine.update(date, row)
+        if not new_bars.empty:
+            state['last_date'] = new_bars.index[-1]
+        state['loaded_at'] = loaded_at
+        return engine.to_frame()
     
     def analyze_market(self, market: str = 'A') -> Dict:
         """
@@ -50,10 +91,16 @@ class MarketTrendAnalyzer:
                 'indices': {}
             }
         
+        # 市场宽度（所有指数共用）
+        breadth = self.get_breadth(market)
+        if breadth is not None:
+            latest = breadth.iloc[-1]
+            print(f"市场宽度: 站上20日线 {latest['pct_above_ma20']:.1%}, "
+                  f"站上60日线 {latest['pct_above_ma60']:.1%}, "
+                  f"新高-新低 {int(latest['nh_nl'])}")
+        
         # 对每个指数进行趋势判断
         index_results = {}
-        trend_scores = []
-        confidences = []
         
         for index_key, df in indices_data.items():
             index_name = self._get_index_name(index_key, market)
@@ -65,26 +112,51 @@ class MarketTrendAnalyzer:
                 continue
             
             # 判断趋势
-            result = self.trend_judge.judge_trend(df)
+            result = self.trend_judge.judge_trend(df, breadth=breadth)
             index_results[index_key] = {
                 'name': index_name,
                 'result': result
             }
             
-            trend_scores.append(result['trend_value'])
-            confidences.append(result['confidence'])
-            
             # 打印结果
             self._print_index_result(index_name, result)
         
         # 综合判断市场整体趋势
+        summary = self.summarize_market(market, index_results)
+        
+        # 打印综合结果
+        print(f"\n{'='*60}")
+        print(f"{'A股' if market == 'A' else '港股'}市场整体趋势判断:")
+        print(f"{'='*60}")
+        print(f"趋势类型: {summary['trend'].value}")
+        print(f"趋势强度: {summary['trend_value']:.3f}")
+        print(f"置信度: {summary['confidence']:.2%}")
+        print(f"{'='*60}\n")
+        
+        return summary
+    
+    def summarize_market(self, market: str, index_results: Dict) -> Dict:
+        """
+        根据各指数的判断结果综合得出市场整体趋势
+        
+        Args:
+            market: 'A' 表示A股，'H' 表示港股
+            index_results: 指数简称 -> {'name': 名称, 'result': judge_trend结果}
+            
+        Returns:
+            包含市场趋势分析结果的字典
+        """
+        trend_scores = [item['result']['trend_value'] for item in index_results.values()]
+        confidences = [item['result']['confidence'] for item in index_results.values()]
+        
         if trend_scores:
             avg_trend_score = sum(trend_scores) / len(trend_scores)
             avg_confidence = sum(confidences) / len(confidences)
             
-            if avg_trend_score > 0.3:
+            threshold = self.trend_judge.trend_threshold
+            if avg_trend_score > threshold:
                 overall_trend = TrendType.UP
-            elif avg_trend_score < -0.3:
+            elif avg_trend_score < -threshold:
                 overall_trend = TrendType.DOWN
             else:
                 overall_trend = TrendType.SIDEWAYS
@@ -93,15 +165,6 @@ class MarketTrendAnalyzer:
             avg_trend_score = 0
             avg_confidence = 0
         
-        # 打印综合结果
-        print(f"\n{'='*60}")
-        print(f"{'A股' if market == 'A' else '港股'}市场整体趋势判断:")
-        print(f"{'='*60}")
-        print(f"趋势类型: {overall_trend.value}")
-        print(f"趋势强度: {avg_trend_score:.3f}")
-        print(f"置信度: {avg_confidence:.2%}")
-        print(f"{'='*60}\n")
-        
         return {
             'market': market,
             'trend': overall_trend,
@@ -111,6 +174,74 @@ class MarketTrendAnalyzer:
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
     
+    def analyze_panel(self, close_panel: pd.DataFrame, label: str = '面板',
+                      names: Dict[str, str] = None) -> Dict:
+        """
+        面板模式分析：一次向量化判断数百个指数（如申万/中证行业、概念指数）的趋势
+        
+        Args:
+            close_panel: 宽表收盘价，index为日期，columns为指数代码
+            label: 结果标签，用于打印
+            names: 指数代码 -> 名称（可选）
+            
+        Returns:
+            包含整体趋势和各指数结果的字典，结构与analyze_market一致
+        """
+        names = names or {}
+        print(f"\n{'='*60}")
+        print(f"开始分析{label}趋势（{close_panel.shape[1]} 个指数）...")
+        print(f"{'='*60}\n")
+        
+        panel_result = self.trend_judge.judge_trend_panel(close_panel)
+        
+        # 与analyze_market一致：数据量不足60条的指数不参与判断
+        if not panel_result.empty:
+            insufficient = panel_result['n_obs'] < 60
+            if insufficient.any():
+                print(f"  ⚠️  {int(insufficient.sum())} 个指数数据量不足，已跳过")
+                panel_result = panel_result[~insufficient]
+        
+        overall = self.trend_judge.summarize_panel(panel_result)
+        
+        index_results = {}
+        for code, row in panel_result.iterrows():
+            index_results[code] = {
+                'name': names.get(code, code),
+                'result': {
+                    'trend': row['trend'],
+                    'trend_value': float(row['trend_value']),
+                    'confidence': float(row['confidence']),
+                    'signals': {
+                        key: {'signal': float(row[f'{key}_signal']),
+                              'strength': float(row[f'{key}_strength'])}
+                        for key in ['ma', 'macd', 'rsi', 'bb', 'momentum']
+                    },
+                }
+            }
+        
+        if not panel_result.empty:
+            counts = panel_result['trend'].map(lambda t: t.value).value_counts()
+            print("各趋势类型指数数量:")
+            for trend_name, count in counts.items():
+                print(f"  {trend_name}: {count}")
+        
+        print(f"\n{'='*60}")
+        print(f"{label}整体趋势判断:")
+        print(f"{'='*60}")
+        print(f"趋势类型: {overall['trend'].value}")
+        print(f"趋势强度: {overall['trend_value']:.3f}")
+        print(f"置信度: {overall['confidence']:.2%}")
+        print(f"{'='*60}\n")
+        
+        return {
+            'market': label,
+            'trend': overall['trend'],
+            'trend_value': overall['trend_value'],
+            'confidence': overall['confidence'],
+            'indices': index_results,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    
     def _get_index_name(self, index_key: str, market: str) -> str:
         """获取指数名称"""
         if market == 'A':
@@ -156,6 +287,8 @@ class MarketTrendAnalyzer:
         print(f"    MA: {signals['ma']['signal']:.2f} (强度: {signals['ma']['strength']:.2f})")
         print(f"    MACD: {signals['macd']['signal']:.2f} (强度: {signals['macd']['strength']:.2f})")
         print(f"    动量: {signals['momentum']['signal']:.2f} (强度: {signals['momentum']['strength']:.2f})")
+        if 'breadth' in signals:
+            print(f"    宽度: {signals['breadth']['signal']:.2f} (强度: {signals['breadth']['strength']:.2f})")
     
     def analyze_all_markets(self) -> Dict:
         """分析所有市场"""
@@ -205,6 +338,43 @@ class MarketTrendAnalyzer:
             return "趋势不明 - 建议谨慎操作"
 
 
+def to_serializable(obj):
+    """将结果中的枚举类型转换为字符串，便于输出JSON"""
+    if isinstance(obj, TrendType):
+        return obj.value
+    elif isinstance(obj, dict):
+        return {k: to_serializable(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [to_serializable(item) for item in obj]
+    else:
+        return obj
+
+
+def save_results(results: Dict, output_path: str):
+    """
+    将结果保存为JSON文件（原子写入）
+    
+    先写入同目录下的临时文件再替换，读取方不会读到写了一半的文件
+    """
+    import json
+    import os
+    import tempfile
+    
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix='.trend_', suffix='.json.tmp')
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(to_serializable(results), f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def main():
     """主函数"""
     import argparse
@@ -215,12 +385,34 @@ def main():
     parser.add_argument('--output', type=str, help='输出结果到文件（JSON格式）')
     parser.add_argument('--tushare-token', type=str, 
                        help='Tushare API token（推荐使用以获得更稳定的数据）')
+    parser.add_argument('--panel-csv', type=str,
+                       help='面板模式：宽表收盘价CSV（第一列为日期，其余每列一个指数）')
+    parser.add_argument('--breadth-store', type=str,
+                       help='成分股本地K线库目录（<目录>/<csi300|csi500|csi1000|hsi>/<代码>.csv），提供时加入市场宽度信号')
+    parser.add_argument('--daemon', action='store_true',
+                       help='常驻模式：按交易时间定时刷新，结果通过本机HTTP提供')
+    parser.add_argument('--port', type=int, default=8765,
+                       help='常驻模式的本机HTTP端口（默认8765）')
+    parser.add_argument('--interval', type=int, default=30,
+                       help='常驻模式交易时段内的刷新间隔，单位分钟（默认30）')
     
     args = parser.parse_args()
     
-    analyzer = MarketTrendAnalyzer(tushare_token=args.tushare_token)
+    analyzer = MarketTrendAnalyzer(tushare_token=args.tushare_token,
+                                   breadth_store=args.breadth_store)
+    
+    if args.daemon:
+        from daemon import TrendDaemon
+        markets = ['A', 'H'] if args.market == 'all' else [args.market]
+        trend_daemon = TrendDaemon(analyzer, markets, output_path=args.output,
+                                   interval_minutes=args.interval)
+        trend_daemon.run_forever(port=args.port)
+        return
     
-    if args.market == 'all':
+    if args.panel_csv:
+        close_panel = pd.read_csv(args.panel_csv, index_col=0, parse_dates=True)
+        results = {'panel': analyzer.analyze_panel(close_panel)}
+    elif args.market == 'all':
         results = analyzer.analyze_all_markets()
     elif args.market == 'A':
         results = {'A': analyzer.analyze_market(market='A')}
@@ -229,21 +421,7 @@ def main():
     
     # 如果需要输出到文件
     if args.output:
-        import json
-        # 将枚举类型转换为字符串
-        def convert_to_dict(obj):
-            if isinstance(obj, TrendType):
-                return obj.value
-            elif isinstance(obj, dict):
-                return {k: convert_to_dict(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_to_dict(item) for item in obj]
-            else:
-                return obj
-        
-        output_data = convert_to_dict(results)
-        with open(args.output, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        save_results(results, args.output)
         print(f"\n结果已保存到: {args.output}")
 
 
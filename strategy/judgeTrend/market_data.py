@@ -4,7 +4,8 @@
 """
 import pandas as pd
 import numpy as np
-import akshare as ak
+import importlib
+import importlib.util
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 import warnings
@@ -12,19 +13,53 @@ import time
 import os
 warnings.filterwarnings('ignore')
 
-# 尝试导入tushare（可选）
-try:
-    import tushare as ts
-    TUSHARE_AVAILABLE = True
-except ImportError:
-    TUSHARE_AVAILABLE = False
 
-# 尝试导入yfinance（可选）
-try:
-    import yfinance as yf
-    YFINANCE_AVAILABLE = True
-except ImportError:
-    YFINANCE_AVAILABLE = False
+class LazySource:
+    """
+    按需加载的数据源插件
+    
+    akshare、tushare、yfinance 导入都很慢（合计数秒），只在第一次真正调用
+    该数据源时才导入；判断是否安装只查找模块，不执行导入
+    """
+    
+    def __init__(self, module_name: str):
+        self.module_name = module_name
+        self._module = None
+    
+    @property
+    def available(self) -> bool:
+        """数据源是否已安装"""
+        if self._module is not None:
+            return True
+        return importlib.util.find_spec(self.module_name) is not None
+    
+    @property
+    def loaded(self) -> bool:
+        """数据源是否已经导入"""
+        return self._module is not None
+    
+    def load(self):
+        """导入并返回数据源模块"""
+        if self._module is None:
+            self._module = importlib.import_module(self.module_name)
+        return self._module
+    
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+# 数据源插件（均为按需导入）
+SOURCES = {
+    'akshare': LazySource('akshare'),
+    'tushare': LazySource('tushare'),    # 可选
+    'yfinance': LazySource('yfinance'),  # 可选
+}
+ak = SOURCES['akshare']
+ts = SOURCES['tushare']
+yf = SOURCES['yfinance']
+
+TUSHARE_AVAILABLE = ts.available
+YFINANCE_AVAILABLE = yf.available
 
 
 class MarketDataFetcher:
@@ -379,12 +414,13 @@ class MarketDataFetcher:
             print(f"处理港股指数数据失败 {index_code}: {e}")
             return None
     
-    def get_market_indices(self, market: str = 'A') -> Dict[str, pd.DataFrame]:
+    def get_market_indices(self, market: str = 'A', days: int = 250) -> Dict[str, pd.DataFrame]:
         """
         获取市场主要指数数据
         
         Args:
             market: 'A' 表示A股，'H' 表示港股
+            days: 获取最近多少天的数据
             
         Returns:
             字典，key为指数简称，value为DataFrame
@@ -394,7 +430,7 @@ class MarketDataFetcher:
         
         for key, index_info in indices.items():
             print(f"正在获取 {index_info['name']} ({index_info['code']}) 数据...")
-            df = self.get_index_data(index_info['code'], market=market)
+            df = self.get_index_data(index_info['code'], market=market, days=days)
             if df is not None and not df.empty:
                 result[key] = df
                 print(f"  ✓ {index_info['name']} 数据获取成功，共 {len(df)} 条记录")
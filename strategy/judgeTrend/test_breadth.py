@@ -0,0 +1,70 @@
+"""
+市场宽度增量计算测试
+通过 MarketTrendAnalyzer.get_breadth 的增量路径（compute 前n-1天，再追加第n天调用 update），
+结果必须与直接 compute 全部n天一致
+
+运行: python3 test_breadth.py
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from breadth import BreadthEngine, MARKET_UNIVERSES, load_bar_store
+from main import MarketTrendAnalyzer
+
+
+def write_store(store_dir, closes, dates):
+    """把 日期 × 股票 收盘价写成K线库（停牌日不写入）"""
+    universes = MARKET_UNIVERSES['A']
+    for j, symbol in enumerate(closes.columns):
+        path = os.path.join(store_dir, universes[j % len(universes)], f"{symbol}.csv")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        bars = pd.DataFrame({'date': dates, 'close': closes[symbol].to_numpy()}).dropna()
+        bars.to_csv(path, index=False, float_format='%.4f')
+
+
+def append_day(store_dir, closes, date):
+    """给每只股票的CSV追加一天（当日为NaN的停牌股票不追加）"""
+    universes = MARKET_UNIVERSES['A']
+    for j, symbol in enumerate(closes.index):
+        if np.isnan(closes[symbol]):
+            continue
+        path = os.path.join(store_dir, universes[j % len(universes)], f"{symbol}.csv")
+        with open(path, 'a') as f:
+            f.write(f"{date:%Y-%m-%d},{closes[symbol]:.4f}\n")
+
+
+def check_incremental(n=200, stocks=300, extra_days=3, seed=0):
+    """compute(n-1) 后逐日 update 必须等于 compute(n)"""
+    rng = np.random.default_rng(seed)
+    total = n + extra_days - 1
+    dates = pd.bdate_range('2023-01-02', periods=total)
+    values = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, (total, stocks)), axis=0))
+    values[rng.random(values.shape) < 0.02] = np.nan  # 停牌
+    values = np.round(values, 4)
+    closes = pd.DataFrame(values, index=dates, columns=[f"{600000 + j}" for j in range(stocks)])
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        write_store(store_dir, closes.iloc[:n - 1], dates[:n - 1])
+        analyzer = MarketTrendAnalyzer(breadth_store=store_dir)
+        analyzer.get_breadth('A')
+
+        for day in range(n - 1, total):
+            append_day(store_dir, closes.iloc[day], dates[day])
+            incremental = analyzer.get_breadth('A')
+            expected = BreadthEngine().compute(load_bar_store(store_dir, MARKET_UNIVERSES['A']))
+            got, want = incremental.iloc[-1], expected.iloc[-1]
+            assert incremental.index[-1] == expected.index[-1] == dates[day]
+            for column in expected.columns:
+                assert np.isclose(got[column], want[column], equal_nan=True), \
+                    f"{dates[day]:%Y-%m-%d} {column}: 增量 {got[column]} != 全量 {want[column]}"
+
+        # 没有新增K线时不变
+        assert len(analyzer.get_breadth('A')) == len(incremental)
+    print(f"✓ 增量宽度测试通过（{stocks} 只股票，compute {n - 1} 天后逐日 update {extra_days} 天）")
+
+
+if __name__ == '__main__':
+    check_incremental()
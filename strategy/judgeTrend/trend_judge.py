@@ -15,12 +15,25 @@ class TrendType(Enum):
     UNKNOWN = "未知"
 
 
+# 各指标的默认权重（可通过calibrate.py校准）
+DEFAULT_WEIGHTS = {
+    'ma': 0.3,
+    'macd': 0.25,
+    'momentum': 0.2,
+    'rsi': 0.15,
+    'bb': 0.1
+}
+
+
 class TrendJudge:
     """趋势判断类"""
     
     def __init__(self, short_ma: int = 20, long_ma: int = 60, 
                  macd_fast: int = 12, macd_slow: int = 26, macd_signal: int = 9,
-                 rsi_period: int = 14, bb_period: int = 20, bb_std: float = 2.0):
+                 rsi_period: int = 14, bb_period: int = 20, bb_std: float = 2.0,
+                 breadth_weight: float = 0.25, weights: Optional[Dict[str, float]] = None,
+                 trend_threshold: float = 0.3, bb_squeeze_width: float = 0.1,
+                 momentum_short_cutoff: float = 0.02, momentum_long_cutoff: float = 0.05):
         """
         初始化趋势判断器
         
@@ -33,6 +46,12 @@ class TrendJudge:
             rsi_period: RSI周期
             bb_period: 布林带周期
             bb_std: 布林带标准差倍数
+            breadth_weight: 提供市场宽度时宽度信号所占权重，其余指标按比例缩减
+            weights: 各指标权重（默认DEFAULT_WEIGHTS）
+            trend_threshold: 综合信号超过±该值判定为上升/下降趋势
+            bb_squeeze_width: 布林带宽度低于该值视为收窄
+            momentum_short_cutoff: 5日涨跌幅阈值
+            momentum_long_cutoff: 20日涨跌幅阈值
         """
         self.short_ma = short_ma
         self.long_ma = long_ma
@@ -42,6 +61,12 @@ class TrendJudge:
         self.rsi_period = rsi_period
         self.bb_period = bb_period
         self.bb_std = bb_std
+        self.breadth_weight = breadth_weight
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.trend_threshold = trend_threshold
+        self.bb_squeeze_width = bb_squeeze_width
+        self.momentum_short_cutoff = momentum_short_cutoff
+        self.momentum_long_cutoff = momentum_long_cutoff
     
     def calculate_ma(self, df: pd.DataFrame, period: int) -> pd.Series:
         """计算移动平均线"""
@@ -284,7 +309,7 @@ class TrendJudge:
             strength = 0.1
         
         # 如果布林带收窄，可能是震荡
-        if bb_width < 0.1:  # 布林带宽度小于10%
+        if bb_width < self.bb_squeeze_width:  # 布林带宽度小于10%
             signal = signal * 0.5  # 降低信号强度
             strength = strength * 0.7
         
@@ -309,21 +334,23 @@ class TrendJudge:
         change_5 = latest['price_change_5']
         change_20 = latest['price_change_20']
         
+        short_cut = self.momentum_short_cutoff
+        long_cut = self.momentum_long_cutoff
         if pd.notna(change_5) and pd.notna(change_20):
             # 短期和中期都上涨
-            if change_5 > 0.02 and change_20 > 0.05:  # 5日涨2%以上，20日涨5%以上
+            if change_5 > short_cut and change_20 > long_cut:  # 5日涨2%以上，20日涨5%以上
                 signal = 0.8
                 strength = 0.7
             # 短期和中期都下跌
-            elif change_5 < -0.02 and change_20 < -0.05:  # 5日跌2%以上，20日跌5%以上
+            elif change_5 < -short_cut and change_20 < -long_cut:  # 5日跌2%以上，20日跌5%以上
                 signal = -0.8
                 strength = 0.7
             # 短期上涨但中期下跌（可能反弹）
-            elif change_5 > 0.02 and change_20 < -0.05:
+            elif change_5 > short_cut and change_20 < -long_cut:
                 signal = 0.3
                 strength = 0.4
             # 短期下跌但中期上涨（可能回调）
-            elif change_5 < -0.02 and change_20 > 0.05:
+            elif change_5 < -short_cut and change_20 > long_cut:
                 signal = -0.3
                 strength = 0.4
             # 震荡
@@ -333,12 +360,56 @@ class TrendJudge:
         
         return {'signal': signal, 'strength': strength}
     
-    def judge_trend(self, df: pd.DataFrame) -> Dict:
+    def judge_by_breadth(self, breadth: pd.DataFrame) -> Dict[str, float]:
+        """
+        基于市场宽度判断趋势
+        
+        Args:
+            breadth: 宽度指标DataFrame（见 breadth.BreadthEngine.compute）
+            
+        Returns:
+            包含信号和强度的字典
+        """
+        if breadth is None or breadth.empty:
+            return {'signal': 0, 'strength': 0}
+        
+        latest = breadth.iloc[-1]
+        pct_columns = [c for c in breadth.columns if c.startswith('pct_above_ma')]
+        pct_above = latest[pct_columns].mean() if pct_columns else np.nan
+        if pd.isna(pct_above):
+            return {'signal': 0, 'strength': 0}
+        
+        signal = 0
+        strength = 0.3
+        
+        # 多数成分股站上均线
+        if pct_above > 0.6:
+            signal = 0.6
+            strength = 0.6
+        # 多数成分股跌破均线
+        elif pct_above < 0.4:
+            signal = -0.6
+            strength = 0.6
+        
+        # 涨跌家数线5日变化与新高减新低方向一致时加强信号
+        ad_change = latest['ad_line'] - breadth['ad_line'].iloc[-6] if len(breadth) > 5 else 0
+        nh_nl = latest['nh_nl']
+        if ad_change > 0 and nh_nl > 0:
+            signal += 0.3
+            strength += 0.1
+        elif ad_change < 0 and nh_nl < 0:
+            signal -= 0.3
+            strength += 0.1
+        
+        return {'signal': max(min(signal, 1.0), -1.0), 'strength': strength}
+    
+    def judge_trend(self, df: pd.DataFrame, breadth: Optional[pd.DataFrame] = None) -> Dict:
         """
         综合判断趋势
         
         Args:
             df: 包含OHLCV数据的DataFrame
+            breadth: 可选的市场宽度指标DataFrame，提供时作为额外信号参与加权
             
         Returns:
             包含趋势判断结果的字典
@@ -362,13 +433,12 @@ class TrendJudge:
         momentum_signal = self.judge_by_price_momentum(df_with_indicators)
         
         # 加权综合信号（权重可调整）
-        weights = {
-            'ma': 0.3,
-            'macd': 0.25,
-            'momentum': 0.2,
-            'rsi': 0.15,
-            'bb': 0.1
-        }
+        weights = dict(self.weights)
+        breadth_signal = None
+        if breadth is not None and not breadth.empty:
+            breadth_signal = self.judge_by_breadth(breadth)
+            weights = {k: w * (1 - self.breadth_weight) for k, w in weights.items()}
+            weights['breadth'] = self.breadth_weight
         
         # 计算加权平均信号
         total_signal = (
@@ -387,11 +457,14 @@ class TrendJudge:
             rsi_signal['strength'] * weights['rsi'] +
             bb_signal['strength'] * weights['bb']
         )
+        if breadth_signal is not None:
+            total_signal += breadth_signal['signal'] * weights['breadth'] * breadth_signal['strength']
+            total_strength += breadth_signal['strength'] * weights['breadth']
         
         # 判断趋势类型
-        if total_signal > 0.3:
+        if total_signal > self.trend_threshold:
             trend = TrendType.UP
-        elif total_signal < -0.3:
+        elif total_signal < -self.trend_threshold:
             trend = TrendType.DOWN
         else:
             trend = TrendType.SIDEWAYS
@@ -399,17 +472,21 @@ class TrendJudge:
         # 获取最新数据
         latest = df_with_indicators.iloc[-1]
         
+        signals = {
+            'ma': ma_signal,
+            'macd': macd_signal,
+            'rsi': rsi_signal,
+            'bb': bb_signal,
+            'momentum': momentum_signal
+        }
+        if breadth_signal is not None:
+            signals['breadth'] = breadth_signal
+        
         return {
             'trend': trend,
             'trend_value': total_signal,
             'confidence': min(total_strength, 1.0),
-            'signals': {
-                'ma': ma_signal,
-                'macd': macd_signal,
-                'rsi': rsi_signal,
-                'bb': bb_signal,
-                'momentum': momentum_signal
-            },
+            'signals': signals,
             'indicators': {
                 'current_price': float(latest['close']),
                 'ma_short': float(latest['ma_short']) if pd.notna(latest['ma_short']) else None,
@@ -425,3 +502,252 @@ class TrendJudge:
             }
         }
 
+    
+    # ------------------------------------------------------------------
+    # 面板模式（日期 × 标的）：一次向量化计算数百个指数的趋势
+    # ------------------------------------------------------------------
+    
+    def calculate_indicators_panel(self, close: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        面板模式计算所有技术指标（逐列向量化）
+        
+        Args:
+            close: 宽表收盘价，index为日期，columns为标的（如行业/概念指数代码）。
+                   各标的上市时间不同可留空（NaN），中间缺失按前值填充
+            
+        Returns:
+            指标名 -> 与close同形状的二维数组（行为日期，列为标的）
+        """
+        close = close.sort_index()
+        # 只填充中间缺失，首尾的NaN保留（不同标的的起止日期可以不同）
+        close = close.ffill().where(close.bfill().notna())
+        
+        valid = close.notna().to_numpy()
+        # 每根K线对应的已有数据条数，相当于单标的模式下的len(df)
+        n_obs = np.cumsum(valid, axis=0)
+        
+        ma_short = close.rolling(window=self.short_ma).mean()
+        ma_long = close.rolling(window=self.long_ma).mean()
+        
+        ema_fast = close.ewm(span=self.macd_fast, adjust=False).mean()
+        ema_slow = close.ewm(span=self.macd_slow, adjust=False).mean()
+        dif = ema_fast - ema_slow
+        dea = dif.ewm(span=self.macd_signal, adjust=False).mean()
+        
+        delta = close.diff()
+        gain = delta.where(delta > 0, 0).rolling(window=self.rsi_period).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=self.rsi_period).mean()
+        rsi = (100 - (100 / (1 + gain / loss))).to_numpy()
+        # 上市前的0值会被滚动窗口计入，数据不足的部分置为NaN
+        rsi = np.where(n_obs >= self.rsi_period, rsi, np.nan)
+        
+        bb_middle = close.rolling(window=self.bb_period).mean()
+        bb_std = close.rolling(window=self.bb_period).std()
+        
+        return {
+            'close': close.to_numpy(dtype=float),
+            'valid': valid,
+            'n_obs': n_obs,
+            'ma_short': ma_short.to_numpy(),
+            'ma_long': ma_long.to_numpy(),
+            'macd_dif': dif.to_numpy(),
+            'macd_dea': dea.to_numpy(),
+            'rsi': rsi,
+            'bb_upper': (bb_middle + bb_std * self.bb_std).to_numpy(),
+            'bb_middle': bb_middle.to_numpy(),
+            'bb_lower': (bb_middle - bb_std * self.bb_std).to_numpy(),
+            'price_change': (close / close.shift(1) - 1).to_numpy(),
+            'price_change_5': (close / close.shift(5) - 1).to_numpy(),
+            'price_change_20': (close / close.shift(20) - 1).to_numpy(),
+        }
+    
+    def score_ma_panel(self, cur: Dict[str, np.ndarray], prev: Dict[str, np.ndarray],
+                       n_obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """均线信号的向量化版本，规则与judge_by_ma一致"""
+        price_above_short = cur['close'] > cur['ma_short']
+        price_above_long = cur['close'] > cur['ma_long']
+        short_above_long = cur['ma_short'] > cur['ma_long']
+        ma_short_up = cur['ma_short'] > prev['ma_short']
+        ma_long_up = cur['ma_long'] > prev['ma_long']
+        
+        up = price_above_short & price_above_long & short_above_long
+        down = ~price_above_short & ~price_above_long & ~short_above_long
+        conds = [up & ma_short_up & ma_long_up, up,
+                 down & ~ma_short_up & ~ma_long_up, down]
+        
+        enough = n_obs >= self.long_ma
+        signal = np.where(enough, np.select(conds, [1, 0.5, -1, -0.5], 0), 0)
+        strength = np.where(enough, np.select(conds, [0.8, 0.5, 0.8, 0.5], 0.3), 0)
+        return signal, strength
+    
+    def score_macd_panel(self, cur: Dict[str, np.ndarray], prev: Dict[str, np.ndarray],
+                         n_obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """MACD信号的向量化版本，规则与judge_by_macd一致"""
+        dif, dea = cur['macd_dif'], cur['macd_dea']
+        cross_up = (dif > dea) & (prev['macd_dif'] <= prev['macd_dea'])
+        cross_down = (dif < dea) & (prev['macd_dif'] >= prev['macd_dea'])
+        
+        up = (dif > 0) & (dif > dea)
+        down = (dif < 0) & (dif < dea)
+        conds = [up & cross_up, up, down & cross_down, down]
+        
+        enough = n_obs >= self.macd_slow
+        signal = np.where(enough, np.select(conds, [1, 0.6, -1, -0.6], 0), 0)
+        strength = np.where(enough, np.select(conds, [0.9, 0.6, 0.9, 0.6], 0.3), 0)
+        return signal, strength
+    
+    def score_rsi_panel(self, cur: Dict[str, np.ndarray], prev: Dict[str, np.ndarray],
+                        n_obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """RSI信号的向量化版本，规则与judge_by_rsi一致"""
+        rsi = cur['rsi']
+        conds = [rsi > 70, rsi < 30, rsi > 50, rsi < 50]
+        
+        enough = n_obs >= self.rsi_period
+        signal = np.where(enough, np.select(conds, [-0.3, 0.3, 0.2, -0.2], 0), 0)
+        strength = np.where(enough, np.select(conds, [0.4, 0.4, 0.3, 0.3], 0.2), 0)
+        return signal, strength
+    
+    def score_bollinger_panel(self, cur: Dict[str, np.ndarray], prev: Dict[str, np.ndarray],
+                              n_obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """布林带信号的向量化版本，规则与judge_by_bollinger一致"""
+        price = cur['close']
+        upper, middle, lower = cur['bb_upper'], cur['bb_middle'], cur['bb_lower']
+        conds = [price > upper, price < lower, price > middle, price < middle]
+        
+        signal = np.select(conds, [0.3, -0.3, 0.1, -0.1], 0)
+        strength = np.select(conds, [0.4, 0.4, 0.2, 0.2], 0.1)
+        
+        # 布林带收窄，降低信号强度
+        with np.errstate(divide='ignore', invalid='ignore'):
+            narrow = (upper - lower) / middle < self.bb_squeeze_width
+        signal = np.where(narrow, signal * 0.5, signal)
+        strength = np.where(narrow, strength * 0.7, strength)
+        
+        enough = n_obs >= self.bb_period
+        return np.where(enough, signal, 0), np.where(enough, strength, 0)
+    
+    def score_momentum_panel(self, cur: Dict[str, np.ndarray], prev: Dict[str, np.ndarray],
+                             n_obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """价格动量信号的向量化版本，规则与judge_by_price_momentum一致"""
+        change_5 = cur['price_change_5']
+        change_20 = cur['price_change_20']
+        short_cut = self.momentum_short_cutoff
+        long_cut = self.momentum_long_cutoff
+        conds = [(change_5 > short_cut) & (change_20 > long_cut),
+                 (change_5 < -short_cut) & (change_20 < -long_cut),
+                 (change_5 > short_cut) & (change_20 < -long_cut),
+                 (change_5 < -short_cut) & (change_20 > long_cut)]
+        
+        enough = (n_obs >= 20) & ~np.isnan(change_5) & ~np.isnan(change_20)
+        signal = np.where(enough, np.select(conds, [0.8, -0.8, 0.3, -0.3], 0), 0)
+        strength = np.where(enough, np.select(conds, [0.7, 0.7, 0.4, 0.4], 0.2), 0)
+        return signal, strength
+    
+    def score_panel(self, cur: Dict[str, np.ndarray], prev: Dict[str, np.ndarray],
+                    n_obs: np.ndarray) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        计算各指标的(信号, 强度)数组
+        
+        Args:
+            cur: 当前K线的指标值（任意形状的数组）
+            prev: 前一根K线的指标值（与cur同形状）
+            n_obs: 截至当前K线的数据条数
+        """
+        return {
+            'ma': self.score_ma_panel(cur, prev, n_obs),
+            'macd': self.score_macd_panel(cur, prev, n_obs),
+            'rsi': self.score_rsi_panel(cur, prev, n_obs),
+            'bb': self.score_bollinger_panel(cur, prev, n_obs),
+            'momentum': self.score_momentum_panel(cur, prev, n_obs),
+        }
+    
+    def judge_trend_panel(self, close: pd.DataFrame) -> pd.DataFrame:
+        """
+        面板模式综合判断趋势，逐列结果与对每个标的单独调用judge_trend一致
+        
+        Args:
+            close: 宽表收盘价，index为日期，columns为标的
+            
+        Returns:
+            每个标的一行的DataFrame，包含trend、trend_value、confidence、
+            各指标信号/强度以及最新指标值
+        """
+        columns = close.columns
+        if close.empty:
+            return pd.DataFrame(index=columns)
+        
+        ind = self.calculate_indicators_panel(close)
+        valid = ind['valid']
+        n_rows = valid.shape[0]
+        cols = np.arange(valid.shape[1])
+        
+        # 每列最后一根有效K线及其前一根
+        has_data = valid.any(axis=0)
+        last = n_rows - 1 - np.argmax(valid[::-1], axis=0)
+        prev_row = np.maximum(last - 1, 0)
+        
+        names = [k for k in ind if k != 'valid']
+        cur = {k: ind[k][last, cols] for k in names}
+        prev = {k: ind[k][prev_row, cols] for k in names}
+        n_obs = np.where(has_data, cur['n_obs'], 0)
+        
+        signals = self.score_panel(cur, prev, n_obs)
+        
+        # 加权综合信号（权重与judge_trend一致）
+        total_signal = 0
+        total_strength = 0
+        for key, weight in self.weights.items():
+            signal, strength = signals[key]
+            total_signal = total_signal + signal * weight * strength
+            total_strength = total_strength + strength * weight
+        
+        trend = np.select([total_signal > self.trend_threshold, total_signal < -self.trend_threshold],
+                          [TrendType.UP, TrendType.DOWN], TrendType.SIDEWAYS)
+        trend = np.where(has_data, trend, TrendType.UNKNOWN)
+        
+        result = pd.DataFrame({
+            'trend': trend,
+            'trend_value': np.where(has_data, total_signal, 0.0),
+            'confidence': np.where(has_data, np.minimum(total_strength, 1.0), 0.0),
+            'n_obs': n_obs,
+        }, index=columns)
+        for key, (signal, strength) in signals.items():
+            result[f'{key}_signal'] = signal
+            result[f'{key}_strength'] = strength
+        
+        result['current_price'] = cur['close']
+        for key in ['ma_short', 'ma_long', 'rsi', 'macd_dif', 'macd_dea']:
+            result[key] = cur[key]
+        result['price_change_1d'] = np.nan_to_num(cur['price_change'])
+        result['price_change_5d'] = np.nan_to_num(cur['price_change_5'])
+        result['price_change_20d'] = np.nan_to_num(cur['price_change_20'])
+        return result
+    
+    def summarize_panel(self, panel_result: pd.DataFrame) -> Dict:
+        """
+        将面板结果汇总为市场整体趋势（各标的等权平均，按 trend_threshold 判定趋势类型）
+        
+        Args:
+            panel_result: judge_trend_panel的返回值
+            
+        Returns:
+            包含trend、trend_value、confidence的字典
+        """
+        if panel_result.empty or 'trend' not in panel_result:
+            return {'trend': TrendType.UNKNOWN, 'trend_value': 0, 'confidence': 0}
+        
+        known = panel_result['trend'].to_numpy() != TrendType.UNKNOWN
+        if not known.any():
+            return {'trend': TrendType.UNKNOWN, 'trend_value': 0, 'confidence': 0}
+        
+        avg_trend_score = float(panel_result['trend_value'].to_numpy()[known].mean())
+        avg_confidence = float(panel_result['confidence'].to_numpy()[known].mean())
+        
+        if avg_trend_score > self.trend_threshold:
+            trend = TrendType.UP
+        elif avg_trend_score < -self.trend_threshold:
+            trend = TrendType.DOWN
+        else:
+            trend = TrendType.SIDEWAYS
+        
+        return {'trend': trend, 'trend_value': avg_trend_score, 'confidence': avg_confidence}
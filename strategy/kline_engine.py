@@ -0,0 +1,202 @@
+"""
+K线包含处理与高点突破信号的共用引擎（JQData、up、quant_stock_selector 共用）
+
+三种包含处理语义：
+- CASCADE（JQData `_add_effective_bar`）：当日被上一有效K线包含则忽略当日；
+  当日包住上一有效K线则移除上一有效K线，并继续与更早的有效K线比较
+- RESCAN（up/ 原 `KlineProcessor`）：每加入一根K线从头重新扫描，直到不存在相邻包含关系。
+  相邻有效K线始终互不包含，新K线只可能与栈顶发生包含，因此结果与CASCADE完全相同，
+  使用同一个内核实现（benchmark_kline_engine.py 中有与原实现的对比）
+- SINGLE（quant_stock_selector `filter_kline`）：当日包住上一有效K线时只移除上一根，
+  不再与更早的有效K线比较
+
+两种内核：
+- 批量内核 effective_bars：一次处理整段K线，返回各种逐K线状态数组，供回测使用
+- 增量内核 ContainmentKernel：逐根加入，每根K线均摊O(1)，供实盘/逐根回测使用
+
+在其他目录中使用时先把本目录加入 sys.path：
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+CASCADE = 'cascade'
+RESCAN = 'rescan'
+SINGLE = 'single'
+MODES = (CASCADE, RESCAN, SINGLE)
+
+
+def _check_mode(mode: str) -> bool:
+    """检查模式，返回是否需要继续与更早的有效K线比较"""
+    if mode not in MODES:
+        raise ValueError(f"未知的包含处理模式: {mode}，可选 {MODES}")
+    return mode != SINGLE
+
+
+class ContainmentKernel:
+    """增量内核：维护有效K线索引栈（按时间顺序，栈顶为最后一根有效K线）"""
+
+    def __init__(self, mode: str = CASCADE, capacity: int = 256):
+        self.mode = mode
+        self.cascade = _check_mode(mode)
+        self.stack = np.empty(capacity, dtype=np.int32)
+        self.size = 0
+
+    def push(self, highs, lows, i: int) -> Tuple[bool, List[int]]:
+        """
+        处理第i根K线（highs/lows 为调用方保存的全部K线高低点，需已包含第i根）
+
+        Returns:
+            (当日是否纳入有效K线, 被当日包住而移除的有效K线索引列表)
+        """
+        high = highs[i]
+        low = lows[i]
+        stack = self.stack
+        removed = []
+
+        while self.size:
+            last = stack[self.size - 1]
+            # 当日被上一有效K线完全包含 -> 忽略当日
+            if high <= highs[last] and low >= lows[last]:
+                return False, removed
+            # 当日完全包住上一有效K线 -> 移除上一有效K线
+            if high >= highs[last] and low <= lows[last]:
+                self.size -= 1
+                removed.append(int(last))
+                if self.cascade:
+                    continue
+            break
+
+        if self.size == len(stack):
+            grown = np.empty(len(stack) * 2, dtype=np.int32)
+            grown[:self.size] = stack[:self.size]
+            self.stack = stack = grown
+        stack[self.size] = i
+        self.size += 1
+        return True, removed
+
+    @property
+    def indices(self) -> np.ndarray:
+        """有效K线索引数组（视图）"""
+        return self.stack[:self.size]
+
+    def last(self, offset: int = 1) -> int:
+        """倒数第offset根有效K线的索引（没有时为-1）"""
+        return int(self.stack[self.size - offset]) if self.size >= offset else -1
+
+
+def effective_bars(highs, lows, mode: str = CASCADE) -> Dict[str, np.ndarray]:
+    """
+    批量内核：一次处理整段K线
+
+    Args:
+        highs, lows: 高点、低点序列
+        mode: CASCADE / RESCAN / SINGLE
+
+    Returns:
+        字典：
+        - valid: 处理完全部K线后仍有效的K线（bool）
+        - included: 每根K线加入当时是否纳入有效K线（bool）
+        - prev: 每根K线纳入时前一根有效K线的索引（未纳入或没有时为-1）
+        - current / previous: 每根K线加入后最后两根有效K线的索引（不足两根时为-1）。
+          之后的K线可能移除更早的有效K线，逐根回测必须使用加入当时的状态
+    """
+    cascade = _check_mode(mode)
+    # 逐根比较依赖之前的出栈结果，无法整体向量化；用Python列表循环避免NumPy标量索引开销
+    high_list = np.asarray(highs, dtype=float).tolist()
+    low_list = np.asarray(lows, dtype=float).tolist()
+    n = len(high_list)
+
+    included = [False] * n
+    prev = [-1] * n
+    current = [-1] * n
+    previous = [-1] * n
+    stack = []
+
+    for i in range(n):
+        high = high_list[i]
+        low = low_list[i]
+        keep = True
+        while stack:
+            last = stack[-1]
+            if high <= high_list[last] and low >= low_list[last]:
+                keep = False
+                break
+            if high >= high_list[last] and low <= low_list[last]:
+                stack.pop()
+                if cascade:
+                    continue
+            break
+        if keep:
+            included[i] = True
+            prev[i] = stack[-1] if stack else -1
+            stack.append(i)
+        if len(stack) >= 2:
+            current[i] = stack[-1]
+            previous[i] = stack[-2]
+
+    valid = np.zeros(n, dtype=bool)
+    valid[stack] = True
+    return {
+        'valid': valid,
+        'included': np.array(included, dtype=bool),
+        'prev': np.array(prev, dtype=np.int64),
+        'current': np.array(current, dtype=np.int64),
+        'previous': np.array(previous, dtype=np.int64),
+    }
+
+
+def breakout_events(highs, lows, current, previous, holding: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    向量化计算"高点越来越高就持有、跌破前一有效K线低点就清仓"的买卖点
+
+    Args:
+        highs, lows: 高点、低点数组
+        current, previous: effective_bars 返回的每根K线加入后最后两根有效K线索引
+        holding: 这段K线之前是否已持仓
+
+    Returns:
+        (bars, is_buy)：发生买卖的K线位置（按时间顺序）以及是否为买入
+    """
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    has_pair = previous >= 0
+    current_safe = np.where(has_pair, current, 0)
+    previous_safe = np.where(has_pair, previous, 0)
+    # 相邻有效K线互不包含，高点更高时低点必然也更高，因此买卖条件不会同时成立
+    buy = has_pair & (highs[current_safe] > highs[previous_safe])
+    sell = has_pair & (lows[current_safe] < lows[previous_safe])
+
+    holding_after = position_states(buy, sell, holding)
+    holding_before = np.concatenate([[holding], holding_after[:-1]])
+
+    bars = np.flatnonzero(holding_after != holding_before)
+    return bars, holding_after[bars]
+
+
+def position_states(buy, sell, holding: bool = False) -> np.ndarray:
+    """
+    向量化计算每根K线之后的持仓状态：空仓时满足买入条件则持仓，持仓时满足卖出条件则空仓，
+    持仓时再次满足买入条件、空仓时满足卖出条件都不改变状态；两个条件同时成立时状态翻转
+
+    Args:
+        buy, sell: 每根K线的买入、卖出条件（布尔数组）
+        holding: 第一根K线之前是否已持仓
+
+    Returns:
+        每根K线之后是否持仓（布尔数组）
+    """
+    buy = np.asarray(buy, dtype=bool)
+    sell = np.asarray(sell, dtype=bool)
+    index = np.arange(len(buy))
+
+    # 只有一个条件成立的K线决定状态，之后每遇到一次两个条件同时成立就翻转一次
+    decisive = buy != sell
+    flips = np.cumsum(buy & sell)
+    last = np.maximum.accumulate(np.where(decisive, index, -1))
+    last_safe = np.maximum(last, 0)
+    base = np.where(last >= 0, buy[last_safe], holding)
+    flips_since = flips - np.where(last >= 0, flips[last_safe], 0)
+    return base ^ (flips_since % 2 == 1)
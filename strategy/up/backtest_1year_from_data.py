@@ -7,11 +7,14 @@
 
 import pandas as pd
 import numpy as np
-import akshare as ak
 import time
 import warnings
 warnings.filterwarnings('ignore')
 
+from kline_processor import BreakoutStrategy
+from hk_pipeline import run_pipeline
+from history_store import hk_history_store
+
 HK_STOCKS = {
     '德林控股': '01709',
     '趣志集团': '01691',
@@ -24,89 +27,15 @@ HK_STOCKS = {
 }
 
 
-class KlineProcessor:
-    def __init__(self):
-        self.klines = []
-        self.ignored_indices = set()
-    
-    def add_kline(self, date, high, low, open_price, close):
-        kline = {'date': date, 'high': float(high), 'low': float(low), 
-                'open': float(open_price), 'close': float(close), 'ignored': False}
-        self.klines.append(kline)
-        self.process_containment()
-    
-    def is_contained(self, k1, k2):
-        return (k1['high'] <= k2['high'] and k1['low'] >= k2['low']) or \
-               (k1['high'] >= k2['high'] and k1['low'] <= k2['low'])
-    
-    def find_prev_valid_kline(self, current_index):
-        for i in range(current_index - 1, -1, -1):
-            if i not in self.ignored_indices:
-                return i
-        return -1
-    
-    def process_containment(self):
-        if len(self.klines) < 2:
-            return
-        processed = True
-        while processed:
-            processed = False
-            for i in range(1, len(self.klines)):
-                if i in self.ignored_indices:
-                    continue
-                prev_index = self.find_prev_valid_kline(i)
-                if prev_index == -1:
-                    continue
-                current = self.klines[i]
-                previous = self.klines[prev_index]
-                if self.is_contained(current, previous):
-                    if current['high'] <= previous['high'] and current['low'] >= previous['low']:
-                        self.ignored_indices.add(i)
-                    else:
-                        self.ignored_indices.add(prev_index)
-                    processed = True
-                    break
-    
-    def get_valid_klines(self):
-        return [kline for i, kline in enumerate(self.klines) if i not in self.ignored_indices]
-
-
-class TradingStrategy:
-    def __init__(self):
-        self.processor = KlineProcessor()
-        self.holding = False
-        self.entry_price = 0
-        self.trades = []
-    
-    def add_kline(self, date, high, low, open_price, close):
-        self.processor.add_kline(date, high, low, open_price, close)
-        self.execute_strategy()
-    
-    def execute_strategy(self):
-        valid_klines = self.processor.get_valid_klines()
-        if len(valid_klines) < 2:
-            return
-        current = valid_klines[-1]
-        previous = valid_klines[-2]
-        if current['high'] > previous['high']:
-            if not self.holding:
-                self.holding = True
-                self.entry_price = current['high']
-                self.trades.append({'date': current['date'], 'action': 'BUY', 'price': self.entry_price})
-        if self.holding and current['low'] < previous['low']:
-            exit_price = current['low']
-            profit = ((exit_price - self.entry_price) / self.entry_price) * 100
-            self.holding = False
-            self.trades.append({'date': current['date'], 'action': 'SELL', 'price': exit_price,
-                              'entry_price': self.entry_price, 'profit': profit})
-            self.entry_price = 0
+class TradingStrategy(BreakoutStrategy):
+    """交易策略类（K线处理、买卖规则与交易记录见 kline_processor.BreakoutStrategy）"""
     
     def get_statistics(self):
         if not self.trades:
             return {'total_trades': 0, 'win_trades': 0, 'loss_trades': 0, 'win_rate': 0,
                    'total_return': 0, 'avg_profit': 0, 'max_profit': 0, 'max_loss': 0,
-                   'valid_klines': len(self.processor.get_valid_klines()),
-                   'ignored_klines': len(self.processor.ignored_indices)}
+                   'valid_klines': self.processor.valid_count,
+                   'ignored_klines': self.processor.ignored_count}
         buy_trades = [t for t in self.trades if t['action'] == 'BUY']
         sell_trades = [t for t in self.trades if t['action'] == 'SELL']
         paired_trades = []
@@ -126,8 +55,8 @@ class TradingStrategy:
         if not paired_trades:
             return {'total_trades': 0, 'win_trades': 0, 'loss_trades': 0, 'win_rate': 0,
                    'total_return': 0, 'avg_profit': 0, 'max_profit': 0, 'max_loss': 0,
-                   'valid_klines': len(self.processor.get_valid_klines()),
-                   'ignored_klines': len(self.processor.ignored_indices)}
+                   'valid_klines': self.processor.valid_count,
+                   'ignored_klines': self.processor.ignored_count}
         profits = [t['profit'] for t in paired_trades]
         win_trades = [p for p in profits if p > 0]
         return {'total_trades': len(paired_trades), 'win_trades': len(win_trades),
@@ -135,17 +64,17 @@ class TradingStrategy:
                'win_rate': len(win_trades) / len(paired_trades) * 100 if paired_trades else 0,
                'total_return': sum(profits), 'avg_profit': np.mean(profits) if profits else 0,
                'max_profit': max(profits) if profits else 0, 'max_loss': min(profits) if profits else 0,
-               'valid_klines': len(self.processor.get_valid_klines()),
-               'ignored_klines': len(self.processor.ignored_indices), 'paired_trades': paired_trades}
+               'valid_klines': self.processor.valid_count,
+               'ignored_klines': self.processor.ignored_count, 'paired_trades': paired_trades}
 
 
 def fetch_hk_data_with_retry(symbol, max_retries=3):
-    """带重试的数据获取"""
+    """带重试的数据获取（完整历史，已在本地行情库中时不发起网络请求）"""
     for attempt in range(max_retries):
         try:
-            df = ak.stock_hk_hist(symbol=symbol, period="daily", start_date="20220101", adjust="qfq")
-            if df is not None and not df.empty:
-                return df
+            history = hk_history_store.load(symbol)
+            if history is not None and len(history):
+                return history
         except Exception as e:
             if attempt < max_retries - 1:
                 time.sleep(2)  # 等待2秒后重试
@@ -158,54 +87,35 @@ def backtest_stock_1year(stock_name, symbol):
     """回测单只股票过去一年"""
     print(f"\n正在回测: {stock_name} ({symbol})")
     
-    # 获取数据（带重试）
-    df = fetch_hk_data_with_retry(symbol)
-    
-    if df is None or df.empty:
-        print(f"  ❌ 无法获取数据")
+    bars = load_stock_1year(symbol)
+    if bars is None:
+        print(f"  ❌ 无法获取数据或筛选后无数据")
         return None
     
-    # 处理列名
-    if '日期' in df.columns:
-        df = df.rename(columns={'日期': 'date'})
-    if len(df.columns) >= 5:
-        df.columns = ['date', 'open', 'close', 'high', 'low'] + list(df.columns[5:])
-    
-    df['date'] = pd.to_datetime(df['date'])
-    for col in ['open', 'close', 'high', 'low']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    df = df.dropna(subset=['open', 'close', 'high', 'low']).sort_values('date')
-    
-    # 筛选过去一年：2023-12-01 至 2024-12-01
-    start_date = pd.to_datetime('2023-12-01')
-    end_date = pd.to_datetime('2024-12-01')
-    df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
-    
-    if df.empty:
-        print(f"  ❌ 筛选后无数据")
+    print(f"  ✓ 获取到 {len(bars)} 条数据，日期: {bars.period}")
+    return backtest_frame(stock_name, symbol, bars)
+
+
+def load_stock_1year(symbol):
+    """获取数据（带重试）并截取过去一年：2023-12-01 至 2024-12-01，无数据时返回None"""
+    history = fetch_hk_data_with_retry(symbol)
+    if history is None:
         return None
-    
-    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-    print(f"  ✓ 获取到 {len(df)} 条数据，日期: {df['date'].min()} 至 {df['date'].max()}")
-    
-    # 回测
+    bars = history.slice('2023-12-01', '2024-12-01')
+    return bars if len(bars) else None
+
+
+def backtest_frame(stock_name, symbol, bars):
+    """对已截取的K线数据回测（批量回测时在进程池中运行）"""
     strategy = TradingStrategy()
-    for _, row in df.iterrows():
-        strategy.add_kline(row['date'], row['high'], row['low'], row['open'], row['close'])
+    strategy.add_klines(bars.date, bars.high, bars.low, bars.open, bars.close)
     
     # 强制平仓
-    if strategy.holding:
-        last_kline = strategy.processor.get_valid_klines()[-1]
-        exit_price = last_kline['close']
-        profit = ((exit_price - strategy.entry_price) / strategy.entry_price) * 100
-        strategy.trades.append({'date': last_kline['date'], 'action': 'SELL', 'price': exit_price,
-                              'entry_price': strategy.entry_price, 'profit': profit})
-        strategy.holding = False
+    strategy.close_position()
     
     stats = strategy.get_statistics()
     stats.update({'stock_name': stock_name, 'symbol': symbol,
-                 'data_period': f"{df['date'].min()} 至 {df['date'].max()}", 'total_days': len(df)})
+                 'data_period': bars.period, 'total_days': len(bars)})
     return stats
 
 
@@ -214,12 +124,15 @@ def main():
     print("港股通股票批量回测 - 过去一年数据 (2023-12-01 至 2024-12-01)")
     print("="*80)
     
+    # 获取线程限速预取数据（行情库内部保证请求间隔），进程池并行回测
     results = []
-    for stock_name, symbol in HK_STOCKS.items():
-        stats = backtest_stock_1year(stock_name, symbol)
-        if stats:
-            results.append(stats)
-        time.sleep(1)  # 避免请求过快
+    for stock_name, symbol, stats, error in run_pipeline(
+            HK_STOCKS.items(), lambda stock_name, symbol: load_stock_1year(symbol), backtest_frame):
+        if error:
+            print(f"  ❌ {stock_name} ({symbol}): {error}")
+            continue
+        print(f"  ✓ {stock_name} ({symbol}): {stats['total_days']} 条数据，总收益率 {stats['total_return']:.2f}%")
+        results.append(stats)
     
     if not results:
         print("\n❌ 没有成功回测任何股票")
@@ -7,11 +7,14 @@
 
 import pandas as pd
 import numpy as np
-import akshare as ak
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+from kline_processor import BreakoutStrategy
+from hk_pipeline import run_pipeline
+from history_store import hk_history_store
+
 # 港股股票代码映射（港股代码格式：5位数字）
 HK_STOCKS = {
     '德林控股': '01709',  # 需要查找实际代码
@@ -37,111 +40,8 @@ HK_STOCKS_ALT = {
 }
 
 
-class KlineProcessor:
-    """K线包含处理类"""
-    
-    def __init__(self):
-        self.klines = []
-        self.ignored_indices = set()
-    
-    def add_kline(self, date, high, low, open_price, close):
-        kline = {
-            'date': date,
-            'high': float(high),
-            'low': float(low),
-            'open': float(open_price),
-            'close': float(close),
-            'ignored': False
-        }
-        self.klines.append(kline)
-        self.process_containment()
-    
-    def is_contained(self, k1, k2):
-        return (k1['high'] <= k2['high'] and k1['low'] >= k2['low']) or \
-               (k1['high'] >= k2['high'] and k1['low'] <= k2['low'])
-    
-    def find_prev_valid_kline(self, current_index):
-        for i in range(current_index - 1, -1, -1):
-            if i not in self.ignored_indices:
-                return i
-        return -1
-    
-    def process_containment(self):
-        if len(self.klines) < 2:
-            return
-        
-        processed = True
-        while processed:
-            processed = False
-            for i in range(1, len(self.klines)):
-                if i in self.ignored_indices:
-                    continue
-                
-                prev_index = self.find_prev_valid_kline(i)
-                if prev_index == -1:
-                    continue
-                
-                current = self.klines[i]
-                previous = self.klines[prev_index]
-                
-                if self.is_contained(current, previous):
-                    if current['high'] <= previous['high'] and current['low'] >= previous['low']:
-                        self.ignored_indices.add(i)
-                    else:
-                        self.ignored_indices.add(prev_index)
-                    processed = True
-                    break
-    
-    def get_valid_klines(self):
-        return [kline for i, kline in enumerate(self.klines) if i not in self.ignored_indices]
-
-
-class TradingStrategy:
-    """交易策略类"""
-    
-    def __init__(self):
-        self.processor = KlineProcessor()
-        self.holding = False
-        self.entry_price = 0
-        self.trades = []
-    
-    def add_kline(self, date, high, low, open_price, close):
-        self.processor.add_kline(date, high, low, open_price, close)
-        self.execute_strategy()
-    
-    def execute_strategy(self):
-        valid_klines = self.processor.get_valid_klines()
-        
-        if len(valid_klines) < 2:
-            return
-        
-        current = valid_klines[-1]
-        previous = valid_klines[-2]
-        
-        # 买入信号：高点突破
-        if current['high'] > previous['high']:
-            if not self.holding:
-                self.holding = True
-                self.entry_price = current['high']
-                self.trades.append({
-                    'date': current['date'],
-                    'action': 'BUY',
-                    'price': self.entry_price
-                })
-        
-        # 卖出信号：跌破前低
-        if self.holding and current['low'] < previous['low']:
-            exit_price = current['low']
-            profit = ((exit_price - self.entry_price) / self.entry_price) * 100
-            self.holding = False
-            self.trades.append({
-                'date': current['date'],
-                'action': 'SELL',
-                'price': exit_price,
-                'entry_price': self.entry_price,
-                'profit': profit
-            })
-            self.entry_price = 0
+class TradingStrategy(BreakoutStrategy):
+    """交易策略类（K线处理、买卖规则与交易记录见 kline_processor.BreakoutStrategy）"""
     
     def get_statistics(self):
         if not self.trades:
@@ -154,8 +54,8 @@ class TradingStrategy:
                 'avg_profit': 0,
                 'max_profit': 0,
                 'max_loss': 0,
-                'valid_klines': len(self.processor.get_valid_klines()),
-                'ignored_klines': len(self.processor.ignored_indices)
+                'valid_klines': self.processor.valid_count,
+                'ignored_klines': self.processor.ignored_count
             }
         
         buy_trades = [t for t in self.trades if t['action'] == 'BUY']
@@ -190,8 +90,8 @@ class TradingStrategy:
                 'avg_profit': 0,
                 'max_profit': 0,
                 'max_loss': 0,
-                'valid_klines': len(self.processor.get_valid_klines()),
-                'ignored_klines': len(self.processor.ignored_indices)
+                'valid_klines': self.processor.valid_count,
+                'ignored_klines': self.processor.ignored_count
             }
         
         profits = [t['profit'] for t in paired_trades]
@@ -207,82 +107,16 @@ class TradingStrategy:
             'avg_profit': np.mean(profits) if profits else 0,
             'max_profit': max(profits) if profits else 0,
             'max_loss': min(profits) if profits else 0,
-            'valid_klines': len(self.processor.get_valid_klines()),
-            'ignored_klines': len(self.processor.ignored_indices),
+            'valid_klines': self.processor.valid_count,
+            'ignored_klines': self.processor.ignored_count,
             'paired_trades': paired_trades
         }
 
 
 def fetch_hk_stock_data(symbol, start_date='20231201', end_date='20241201'):
-    """获取港股历史数据"""
+    """获取港股历史数据（从本地行情库二分查找截取区间，完整历史只下载一次）"""
     try:
-        # 尝试使用akshare获取港股数据
-        # 港股代码格式：5位数字
-        if len(symbol) == 5:
-            # 尝试不同的格式
-            df = None
-            try:
-                # 方法1：直接使用代码，不指定结束日期
-                df = ak.stock_hk_hist(symbol=symbol, period="daily", start_date=start_date, 
-                                     adjust="qfq")
-            except Exception as e1:
-                try:
-                    # 方法2：使用前复权
-                    df = ak.stock_hk_hist(symbol=symbol, period="daily", start_date=start_date, 
-                                        adjust="")
-                except Exception as e2:
-                    try:
-                        # 方法3：不指定复权
-                        df = ak.stock_hk_hist(symbol=symbol, period="daily", start_date=start_date)
-                    except Exception as e3:
-                        df = None
-        else:
-            df = None
-        
-        if df is None or df.empty:
-            return None
-        
-        # 筛选过去一年的数据
-        if 'date' in df.columns or len(df.columns) > 0:
-            if 'date' not in df.columns:
-                df.columns.values[0] = 'date'
-            df['date'] = pd.to_datetime(df['date'])
-            start_date_obj = pd.to_datetime(start_date)
-            end_date_obj = pd.to_datetime(end_date)
-            df = df[(df['date'] >= start_date_obj) & (df['date'] <= end_date_obj)]
-            if df.empty:
-                return None
-        
-        # 处理列名
-        if '日期' in df.columns:
-            df = df.rename(columns={'日期': 'date'})
-        elif 'Date' in df.columns:
-            df = df.rename(columns={'Date': 'date'})
-        
-        # 标准化列名
-        column_map = {
-            '开盘': 'open', '收盘': 'close', '最高': 'high', '最低': 'low',
-            'Open': 'open', 'Close': 'close', 'High': 'high', 'Low': 'low'
-        }
-        for old, new in column_map.items():
-            if old in df.columns:
-                df = df.rename(columns={old: new})
-        
-        # 确保有必要的列
-        if 'date' not in df.columns and len(df.columns) > 0:
-            df.columns.values[0] = 'date'
-        if len(df.columns) >= 5:
-            df.columns = ['date', 'open', 'close', 'high', 'low'] + list(df.columns[5:])
-        
-        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-        for col in ['open', 'close', 'high', 'low']:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        df = df.dropna(subset=['open', 'close', 'high', 'low'])
-        df = df.sort_values('date').reset_index(drop=True)
-        
-        return df
+        return hk_history_store.window(symbol, start_date, end_date)
     except Exception as e:
         print(f"    获取数据失败: {e}")
         return None
@@ -293,46 +127,32 @@ def backtest_stock(stock_name, symbol, start_date='20231201'):
     print(f"\n正在回测: {stock_name} ({symbol})")
     
     # 获取数据
-    df = fetch_hk_stock_data(symbol, start_date=start_date, end_date='20241201')
+    bars = fetch_hk_stock_data(symbol, start_date=start_date)
     
-    if df is None or df.empty:
+    if bars is None:
         print(f"  ❌ 无法获取 {stock_name} 的数据")
         return None
     
-    print(f"  ✓ 获取到 {len(df)} 条数据，日期范围: {df['date'].min()} 至 {df['date'].max()}")
+    print(f"  ✓ 获取到 {len(bars)} 条数据，日期范围: {bars.period}")
     
-    # 回测策略
+    return backtest_frame(stock_name, symbol, bars)
+
+
+def backtest_frame(stock_name, symbol, bars):
+    """对已获取的K线数据回测（批量回测时在进程池中运行）"""
     strategy = TradingStrategy()
     
-    for idx, row in df.iterrows():
-        strategy.add_kline(
-            date=row['date'],
-            high=row['high'],
-            low=row['low'],
-            open_price=row['open'],
-            close=row['close']
-        )
+    strategy.add_klines(bars.date, bars.high, bars.low, bars.open, bars.close)
     
     # 强制平仓
-    if strategy.holding:
-        last_kline = strategy.processor.get_valid_klines()[-1]
-        exit_price = last_kline['close']
-        profit = ((exit_price - strategy.entry_price) / strategy.entry_price) * 100
-        strategy.trades.append({
-            'date': last_kline['date'],
-            'action': 'SELL',
-            'price': exit_price,
-            'entry_price': strategy.entry_price,
-            'profit': profit
-        })
-        strategy.holding = False
+    strategy.close_position()
     
     # 获取统计信息
     stats = strategy.get_statistics()
     stats['stock_name'] = stock_name
     stats['symbol'] = symbol
-    stats['data_period'] = f"{df['date'].min()} 至 {df['date'].max()}"
-    stats['total_days'] = len(df)
+    stats['data_period'] = bars.period
+    stats['total_days'] = len(bars)
     
     return stats
 
@@ -351,11 +171,17 @@ def main():
     
     results = []
     
-    # 回测每只股票
-    for stock_name, symbol in HK_STOCKS.items():
-        stats = backtest_stock(stock_name, symbol, start_date=start_date_str)
-        if stats:
-            results.append(stats)
+    # 回测每只股票：获取线程限速预取数据，进程池并行回测，按完成顺序收集结果
+    def fetch(stock_name, symbol):
+        return fetch_hk_stock_data(symbol, start_date=start_date_str, end_date=end_date_str)
+    
+    for stock_name, symbol, stats, error in run_pipeline(HK_STOCKS.items(), fetch, backtest_frame):
+        if error:
+            print(f"  ❌ {stock_name} ({symbol}): {error}")
+            continue
+        print(f"  ✓ {stock_name} ({symbol}): {stats['total_days']} 条数据，{stats['data_period']}，"
+              f"交易 {stats['total_trades']} 次，总收益率 {stats['total_return']:.2f}%")
+        results.append(stats)
     
     if not results:
         print("\n❌ 没有成功回测任何股票")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分级事件记录（回测逐K线日志共用）
+
+- 低于 level 的事件直接丢弃，不做任何字符串格式化
+- 其余事件以 (级别, 模板, 参数) 的原始形式存入环形缓冲区，需要时再格式化查看
+- 只有 echo=True 时才在记录时格式化并输出（默认输出到 print）
+
+长历史回测时关闭输出即可省掉逐K线的格式化和终端I/O，同时保留最近的事件便于排查。
+"""
+
+from collections import deque
+
+
+DEBUG = 10    # 逐K线细节，如被忽略的K线
+INFO = 20     # 交易事件
+WARNING = 30
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING'}
+
+
+class EventLog:
+    """分级事件记录器"""
+
+    def __init__(self, level=INFO, capacity=10000, echo=False, sink=print):
+        """
+        Args:
+            level: 最低记录级别
+            capacity: 环形缓冲区容量（只保留最近的事件），为0时不保存
+            echo: 记录时是否格式化并输出
+            sink: 输出函数，接收格式化后的一行文本
+        """
+        self.level = level
+        self.echo = echo
+        self.sink = sink
+        self.buffer = deque(maxlen=capacity) if capacity else None
+
+    def enabled(self, level):
+        """该级别的事件是否会被记录（调用方可据此跳过准备参数的开销）"""
+        return level >= self.level and (self.echo or self.buffer is not None)
+
+    def record(self, level, message, *args):
+        """
+        记录事件
+
+        Args:
+            level: 事件级别
+            message: str.format 模板，如 "  [{}] 买入 @ {:.2f}"
+            args: 模板参数（原样保存，格式化推迟到输出时）
+        """
+        if level < self.level:
+            return
+        if self.buffer is not None:
+            self.buffer.append((level, message, args))
+        if self.echo:
+            self.sink(message.format(*args))
+
+    def events(self, level=None):
+        """缓冲区中的事件 (级别, 模板, 参数) 列表，可按最低级别过滤"""
+        if self.buffer is None:
+            return []
+        return [event for event in self.buffer if level is None or event[0] >= level]
+
+    def lines(self, level=None):
+        """缓冲区中的事件格式化为文本"""
+        return [message.format(*args) for _, message, args in self.events(level)]
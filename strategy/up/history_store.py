@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+港股历史行情库（各港股回测脚本共用）
+
+每只股票的完整复权日线只下载一次，按列保存为NumPy数组（日期datetime64[D]升序、OHLC float64），
+本地文件为 <store_dir>/<symbol>_<adjust>.npz。
+任意回测区间通过对日期数组二分查找（np.searchsorted）得到，返回的是原数组的切片视图，不复制数据。
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import akshare as ak
+
+from hk_pipeline import RateLimiter
+
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hk_history')
+
+FIELDS = ('date', 'open', 'close', 'high', 'low')
+
+# akshare 港股日线的列名
+COLUMN_MAP = {'日期': 'date', '开盘': 'open', '收盘': 'close', '最高': 'high', '最低': 'low'}
+
+
+def to_datetime64(value):
+    """'20231201'、'2023-12-01'、datetime 等转换为 datetime64[D]"""
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+class History:
+    """一只股票一段时间的日线（各字段均为NumPy数组，日期升序）"""
+
+    __slots__ = FIELDS
+
+    def __init__(self, date, open, close, high, low):
+        self.date = date
+        self.open = open
+        self.close = close
+        self.high = high
+        self.low = low
+
+    def __len__(self):
+        return len(self.date)
+
+    def slice(self, start=None, end=None):
+        """
+        二分查找截取 [start, end] 区间（含两端），返回切片视图
+
+        Args:
+            start, end: 开始、结束日期，为None时不限制
+        """
+        left = 0 if start is None else np.searchsorted(self.date, to_datetime64(start), side='left')
+        right = len(self.date) if end is None else np.searchsorted(self.date, to_datetime64(end), side='right')
+        return History(*(getattr(self, field)[left:right] for field in FIELDS))
+
+    @property
+    def period(self):
+        """数据期间，如 '2023-12-01 至 2024-11-29'"""
+        return f"{self.date[0]} 至 {self.date[-1]}" if len(self) else ''
+
+    def to_frame(self):
+        """转换为DataFrame（日期为datetime64）"""
+        return pd.DataFrame({field: getattr(self, field) for field in FIELDS})
+
+
+def normalize_history(df):
+    """akshare 返回的日线 -> History（去掉缺失值，按日期排序去重）"""
+    if '日期' in df.columns:
+        df = df.rename(columns=COLUMN_MAP)
+    else:
+        df = df.rename(columns=dict(zip(df.columns[:5], FIELDS)))
+
+    date = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]')
+    prices = [pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=np.float64) for field in FIELDS[1:]]
+    keep = ~np.isnan(np.vstack(prices)).any(axis=0)
+    date = date[keep]
+    prices = [p[keep] for p in prices]
+
+    order = np.argsort(date, kind='stable')
+    date = date[order]
+    # 同一日期出现多次时保留最后一条
+    last = np.append(date[1:] != date[:-1], True)
+    return History(date[last], *(p[order][last] for p in prices))
+
+
+class HKHistoryStore:
+    """港股完整历史行情库，内存 + 磁盘两级，每只股票只下载一次"""
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, adjust='qfq', max_age_hours=12, min_interval=1.0):
+        """
+        Args:
+            store_dir: 本地行情库目录，为None时只使用内存
+            adjust: 复权方式（'qfq' 前复权，'' 不复权）
+            max_age_hours: 本地文件有效期（小时），过期后重新下载完整历史
+            min_interval: 实际发起网络请求的最小间隔（秒）
+        """
+        self.store_dir = store_dir
+        self.adjust = adjust
+        self.max_age = max_age_hours * 3600
+        self.limiter = RateLimiter(min_interval)
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol):
+        if not self.store_dir:
+            return None
+        return os.path.join(self.store_dir, f"{symbol}_{self.adjust or 'none'}.npz")
+
+    def load(self, symbol):
+        """完整历史（命中内存或本地文件时不发起网络请求），获取失败时抛出原异常"""
+        with self._lock:
+            history = self._memory.get(symbol)
+        if history is not None:
+            return history
+
+        path = self._path(symbol)
+        if path and os.path.exists(path) and time.time() - os.path.getmtime(path) < self.max_age:
+            with np.load(path) as data:
+                history = History(*(data[field] for field in FIELDS))
+        else:
+            self.limiter.wait()
+            df = ak.stock_hk_hist(symbol=symbol, period="daily", start_date="19700101",
+                                  end_date="22220101", adjust=self.adjust)
+            if df is None or df.empty:
+                return None
+            history = normalize_history(df)
+            if path:
+                os.makedirs(self.store_dir, exist_ok=True)
+                np.savez(path, **{field: getattr(history, field) for field in FIELDS})
+
+        with self._lock:
+            self._memory[symbol] = history
+        return history
+
+    def window(self, symbol, start=None, end=None):
+        """[start, end] 区间的日线（切片视图），没有数据时返回None"""
+        history = self.load(symbol)
+        if history is None:
+            return None
+        bars = history.slice(start, end)
+        return bars if len(bars) else None
+
+
+# 同一进程内所有脚本共用的行情库
+hk_history_store = HKHistoryStore()
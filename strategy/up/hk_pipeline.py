@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+港股批量回测流水线（各批量回测脚本共用）
+
+- 获取阶段：单独的线程按限速依次获取行情，提前获取后面股票的数据放入有界队列
+- 回测阶段：进程池并行执行回测（CPU密集），结果按完成顺序返回
+这样网络等待和回测计算可以重叠，几百只港股通股票的批量回测也能在可接受的时间内完成。
+
+行情通过 history_store.py 的本地行情库获取，每只股票只下载一次，各脚本共用。
+"""
+
+import threading
+import time
+import queue
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+class RateLimiter:
+    """限速器：保证两次请求之间至少间隔 min_interval 秒（线程安全）"""
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last = 0.0
+
+    def wait(self):
+        with self._lock:
+            delay = self._last + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last = time.monotonic()
+
+
+_DONE = object()
+
+
+def _fetch_stage(stocks, fetch, out):
+    """获取阶段：依次获取每只股票的数据放入队列（队列满时等待回测阶段消费）"""
+    for stock_name, symbol in stocks:
+        try:
+            bars = fetch(stock_name, symbol)
+            error = None if bars is not None and len(bars) else '无法获取数据'
+        except Exception as e:
+            bars, error = None, f'获取数据失败: {e}'
+        out.put((stock_name, symbol, bars, error))
+    out.put(_DONE)
+
+
+def run_pipeline(stocks, fetch, backtest, workers=None, prefetch=8):
+    """
+    流水线批量回测
+
+    Args:
+        stocks: (股票名称, 代码) 序列，如 HK_STOCKS.items()
+        fetch: fetch(stock_name, symbol) -> K线数据（History或DataFrame）或None，在获取线程中运行
+        backtest: backtest(stock_name, symbol, bars) -> 统计字典，在进程池中运行，必须是模块级函数
+        workers: 回测进程数，默认为CPU核数
+        prefetch: 最多提前获取多少只股票的数据
+
+    Yields:
+        按完成顺序的 (stock_name, symbol, stats, error)，成功时error为None，失败时stats为None
+    """
+    fetched = queue.Queue(maxsize=prefetch)
+    fetcher = threading.Thread(target=_fetch_stage, args=(list(stocks), fetch, fetched), daemon=True)
+    fetcher.start()
+
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            item = fetched.get()
+            if item is _DONE:
+                break
+            stock_name, symbol, bars, error = item
+            if error:
+                yield stock_name, symbol, None, error
+            else:
+                pending[pool.submit(backtest, stock_name, symbol, bars)] = (stock_name, symbol)
+
+            # 返回已经完成的回测，不等待其他股票
+            for future in [f for f in pending if f.done()]:
+                yield _collect(future, *pending.pop(future))
+
+        for future in as_completed(list(pending)):
+            yield _collect(future, *pending.pop(future))
+
+    fetcher.join()
+
+
+def _collect(future, stock_name, symbol):
+    try:
+        return stock_name, symbol, future.result(), None
+    except Exception as e:
+        return stock_name, symbol, None, f'回测失败: {e}'
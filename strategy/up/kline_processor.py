@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线包含处理（各回测脚本共用）
+
+被包含的K线忽略，后续判断不考虑忽略的K线：
+- 当前K线被前一根有效K线包含：忽略当前K线
+- 前一根有效K线被当前K线包含：忽略前一根，并继续与更早的有效K线比较
+
+有效K线用一个栈维护（strategy/kline_engine.py 的增量内核，RESCAN模式），
+新K线只需与栈顶比较，每根K线最多入栈、出栈各一次，
+因此每根K线的处理是均摊O(1)的，忽略结果与逐根重新扫描全部K线的做法完全一致。
+
+回测时可以用 add_klines 一次加入整段K线，配合 trade_events 向量化计算买卖点，
+交易结果与逐根调用 add_kline 完全一致；BreakoutStrategy 封装了这两种方式和买卖记录，
+各回测脚本的 TradingStrategy 继承它。
+
+K线按列保存在预分配的NumPy数组中（日期datetime64[D]、OHLC float64、有效标记bool），
+容量不足时按倍数扩容，每根K线约占45字节（含有效K线索引栈）；
+需要按K线访问时返回轻量的只读视图对象。
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from kline_engine import RESCAN, ContainmentKernel, breakout_events
+from event_log import DEBUG, INFO, EventLog
+
+
+class Kline:
+    """单根K线的只读视图，支持 kline.high 和 kline['high'] 两种访问方式"""
+
+    __slots__ = ('_processor', '_index')
+
+    def __init__(self, processor, index):
+        self._processor = processor
+        self._index = index
+
+    @property
+    def index(self):
+        """在处理器中的位置（第几根加入的K线）"""
+        return self._index
+
+    @property
+    def date(self):
+        return str(self._processor._date[self._index])
+
+    @property
+    def high(self):
+        return float(self._processor._high[self._index])
+
+    @property
+    def low(self):
+        return float(self._processor._low[self._index])
+
+    @property
+    def open(self):
+        return float(self._processor._open[self._index])
+
+    @property
+    def close(self):
+        return float(self._processor._close[self._index])
+
+    @property
+    def ignored(self):
+        return not self._processor._valid[self._index]
+
+    def __getitem__(self, key):
+        if key not in ('date', 'high', 'low', 'open', 'close', 'ignored'):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self):
+        return (f"Kline(date={self.date}, high={self.high}, low={self.low}, "
+                f"open={self.open}, close={self.close})")
+
+
+class KlineProcessor:
+    """K线包含处理类"""
+
+    def __init__(self, verbose=False, capacity=256, log=None):
+        """
+        Args:
+            verbose: 是否逐根输出被忽略的K线（未指定log时生效）
+            capacity: 初始容量
+            log: EventLog，被忽略的K线以DEBUG级别记录；为None且不输出时不做任何记录
+        """
+        self.verbose = verbose
+        self.log = log if log is not None else (EventLog(DEBUG, echo=True) if verbose else None)
+        self._size = 0  # 已加入的K线数
+        self._processed = 0  # 已完成包含处理的K线数
+        # 有效K线索引栈（按时间顺序，栈顶为最后一根有效K线）
+        self._kernel = ContainmentKernel(RESCAN, capacity)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """分配（或扩容到）指定容量的数组"""
+        def grow(old, dtype):
+            new = np.empty(capacity, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+
+        self._date = grow(getattr(self, '_date', None), 'datetime64[D]')
+        self._high = grow(getattr(self, '_high', None), np.float64)
+        self._low = grow(getattr(self, '_low', None), np.float64)
+        self._open = grow(getattr(self, '_open', None), np.float64)
+        self._close = grow(getattr(self, '_close', None), np.float64)
+        self._valid = grow(getattr(self, '_valid', None), np.bool_)
+        self._capacity = capacity
+
+    def add_kline(self, date, high, low, open_price, close):
+        """添加K线数据"""
+        if self._size == self._capacity:
+            self._allocate(self._capacity * 2)
+
+        i = self._size
+        self._date[i] = np.datetime64(date, 'D')
+        self._high[i] = high
+        self._low[i] = low
+        self._open[i] = open_price
+        self._close[i] = close
+        self._valid[i] = True
+        self._size += 1
+        self.process_containment()
+
+    def add_klines(self, dates, highs, lows, opens, closes):
+        """
+        批量添加K线（回测用）
+
+        Returns:
+            (current_idx, previous_idx)：每根K线加入后最后两根有效K线的索引，不足两根时为-1。
+            之后的K线可能把更早的有效K线判为被包含，因此必须记录每根K线加入当时的状态
+        """
+        n = len(highs)
+        needed = self._size + n
+        if needed > self._capacity:
+            capacity = self._capacity
+            while capacity < needed:
+                capacity *= 2
+            self._allocate(capacity)
+
+        new = slice(self._size, needed)
+        self._date[new] = np.asarray(dates).astype('datetime64[D]')
+        self._high[new] = highs
+        self._low[new] = lows
+        self._open[new] = opens
+        self._close[new] = closes
+        self._valid[new] = True
+        self._size = needed
+        return self._process_containment(record=True)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return Kline(self, index)
+
+    @property
+    def klines(self):
+        """所有K线（视图对象列表）"""
+        return [Kline(self, i) for i in range(self._size)]
+
+    @property
+    def valid_indices(self):
+        """有效K线的索引数组（按时间顺序）"""
+        return self._kernel.indices
+
+    @property
+    def valid_count(self):
+        """有效K线数"""
+        return self._kernel.size
+
+    @property
+    def ignored_count(self):
+        """被忽略的K线数"""
+        return self._size - self._kernel.size
+
+    @property
+    def last_valid_index(self):
+        """最后一根有效K线的索引（没有时为-1）"""
+        return self._kernel.last(1)
+
+    @property
+    def prev_valid_index(self):
+        """倒数第二根有效K线的索引（没有时为-1）"""
+        return self._kernel.last(2)
+
+    def last_valid(self):
+        """最后一根有效K线（没有时为None）"""
+        index = self.last_valid_index
+        return Kline(self, index) if index >= 0 else None
+
+    def prev_valid(self):
+        """倒数第二根有效K线（没有时为None）"""
+        index = self.prev_valid_index
+        return Kline(self, index) if index >= 0 else None
+
+    @property
+    def ignored_indices(self):
+        """被忽略的K线索引"""
+        return set(np.flatnonzero(~self._valid[:self._size]).tolist())
+
+    def is_contained(self, k1, k2):
+        """判断K线是否包含关系
+        k1被k2包含：k1.high <= k2.high and k1.low >= k2.low
+        k2被k1包含：k1.high >= k2.high and k1.low <= k2.low
+        """
+        return (k1['high'] <= k2['high'] and k1['low'] >= k2['low']) or \
+               (k1['high'] >= k2['high'] and k1['low'] <= k2['low'])
+
+    def find_prev_valid_kline(self, current_index):
+        """找到前一根有效的（未被忽略的）K线"""
+        for i in range(current_index - 1, -1, -1):
+            if self._valid[i]:
+                return i
+        return -1
+
+    def process_containment(self):
+        """处理新加入K线的包含关系"""
+        self._process_containment()
+
+    def _process_containment(self, record=False):
+        """处理尚未处理的K线，record为True时返回每根K线处理后的最后两根有效K线索引"""
+        kernel = self._kernel
+        start = self._processed
+        # 日志级别在循环外判断一次，关闭时逐K线不做任何格式化
+        log = self.log if self.log is not None and self.log.enabled(DEBUG) else None
+        if record:
+            current_idx = np.full(self._size - start, -1, dtype=np.int64)
+            previous_idx = np.full(self._size - start, -1, dtype=np.int64)
+
+        while self._processed < self._size:
+            i = self._processed
+            self._processed += 1
+            included, removed = kernel.push(self._high, self._low, i)
+
+            for prev_index in removed:
+                # 前一根K线被当前K线包含，忽略前一根
+                self._valid[prev_index] = False
+                if log is not None:
+                    log.record(DEBUG, "  前一根K线 {} 被当前K线包含，已忽略", self._date[prev_index])
+            if not included:
+                # 当前K线被前一根包含，忽略当前K线
+                self._valid[i] = False
+                if log is not None:
+                    log.record(DEBUG, "  K线 {} 被前一根包含，已忽略", self._date[i])
+
+            if record and kernel.size >= 2:
+                current_idx[i - start] = kernel.stack[kernel.size - 1]
+                previous_idx[i - start] = kernel.stack[kernel.size - 2]
+
+        if record:
+            return current_idx, previous_idx
+
+    def get_valid_klines(self):
+        """获取所有有效的（未被忽略的）K线"""
+        return [Kline(self, i) for i in self._kernel.indices.tolist()]
+
+
+def trade_events(processor, current_idx, previous_idx, holding=False):
+    """
+    向量化计算"高点越来越高就持有、跌破前低就清仓"的买卖点
+
+    Args:
+        processor: KlineProcessor
+        current_idx, previous_idx: add_klines 返回的每根K线加入后最后两根有效K线索引
+        holding: 这批K线之前是否已持仓
+
+    Returns:
+        按时间顺序的 (action, current, previous) 列表，action为'BUY'或'SELL'，
+        current/previous为触发信号时的最后两根有效K线
+    """
+    bars, is_buy = breakout_events(processor._high, processor._low, current_idx, previous_idx, holding)
+
+    events = []
+    for t, buy in zip(bars.tolist(), is_buy.tolist()):
+        action = 'BUY' if buy else 'SELL'
+        events.append((action, Kline(processor, int(current_idx[t])), Kline(processor, int(previous_idx[t]))))
+    return events
+
+
+class BreakoutStrategy:
+    """
+    "高点越来越高就持有、跌破前低就清仓"策略的公共部分（各回测脚本的 TradingStrategy 继承）
+
+    逐根加入（add_kline）与批量加入（add_klines + trade_events）K线、买卖与强制平仓记录都在这里，
+    交易记录为字典：date、index（K线序号）、action、price、reason，卖出另有 entry_price、profit（%）。
+    各脚本只保留自己的统计与输出；指定 log 时每笔交易以INFO级别记入 log。
+    """
+
+    def __init__(self, log=None):
+        """
+        Args:
+            log: EventLog，同时用于K线包含处理事件；为None时不记录
+        """
+        self.log = log
+        self.processor = KlineProcessor(log=log)
+        self.holding = False  # 是否持仓
+        self.entry_price = 0  # 入场价格
+        self.trades = []  # 交易记录
+
+    def add_kline(self, date, high, low, open_price, close):
+        """添加K线并执行策略"""
+        self.processor.add_kline(date, high, low, open_price, close)
+        self.execute_strategy()
+
+    def add_klines(self, dates, highs, lows, opens, closes):
+        """批量添加K线并执行策略（回测用），交易记录与逐根调用add_kline一致"""
+        current_idx, previous_idx = self.processor.add_klines(dates, highs, lows, opens, closes)
+        for action, current, previous in trade_events(self.processor, current_idx, previous_idx, self.holding):
+            if action == 'BUY':
+                self.buy(current, previous)
+            else:
+                self.sell(current, previous)
+
+    def execute_strategy(self):
+        """用最后两根有效K线执行交易策略"""
+        if self.processor.valid_count < 2:
+            return
+
+        current = self.processor.last_valid()
+        previous = self.processor.prev_valid()
+
+        # 策略1：高点越来越高就持有
+        if current['high'] > previous['high'] and not self.holding:
+            self.buy(current, previous)
+
+        # 策略2：跌破前一根有效K线的低点就清仓
+        if self.holding and current['low'] < previous['low']:
+            self.sell(current, previous)
+
+    def buy(self, current, previous):
+        """以当前K线最高价买入"""
+        self.holding = True
+        self.entry_price = current['high']
+        self.trades.append({
+            'date': current['date'],
+            'index': current.index,
+            'action': 'BUY',
+            'price': self.entry_price,
+            'reason': f"高点突破: {current['high']:.2f} > {previous['high']:.2f}"
+        })
+        if self.log is not None:
+            self.log.record(INFO, "  [{}] 买入 @ {:.2f} - {}", current['date'], self.entry_price,
+                            self.trades[-1]['reason'])
+
+    def sell(self, current, previous, price=None, reason=None):
+        """
+        卖出
+
+        Args:
+            price: 成交价，默认为当前K线最低价（跌破前低）
+            reason: 卖出原因，默认为跌破前低
+        """
+        exit_price = current['low'] if price is None else price
+        profit = ((exit_price - self.entry_price) / self.entry_price) * 100
+        self.holding = False
+        self.trades.append({
+            'date': current['date'],
+            'index': current.index,
+            'action': 'SELL',
+            'price': exit_price,
+            'entry_price': self.entry_price,
+            'profit': profit,
+            'reason': reason or f"跌破前低: {current['low']:.2f} < {previous['low']:.2f}"
+        })
+        if self.log is not None:
+            self.log.record(INFO, "  [{}] 卖出 @ {:.2f} - 收益率: {:.2f}% - {}",
+                            current['date'], exit_price, profit, self.trades[-1]['reason'])
+        self.entry_price = 0
+
+    def close_position(self, reason='回测结束，强制平仓'):
+        """回测结束时仍持仓则以最后一根有效K线的收盘价平仓"""
+        if self.holding:
+            last_kline = self.processor.last_valid()
+            self.sell(last_kline, None, price=last_kline['close'], reason=reason)
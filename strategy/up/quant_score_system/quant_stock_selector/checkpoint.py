@@ -0,0 +1,98 @@
+"""
+断点续跑模块 - 逐只股票记录评分、回测结果（SQLite），中断或被限流后重新运行时跳过已完成的股票
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output', 'checkpoint.db')
+
+
+def _to_builtin(value):
+    """numpy 标量、时间等转换为可以写入JSON的类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+class CheckpointStore:
+    """
+    逐只股票的结果记录，键为 (运行ID, 阶段, 代码, 市场)
+
+    每只股票完成后立即写入并提交，进程中断、被限流退出后用相同的 run_id 重新运行，
+    已完成的股票直接读取记录，只处理剩下的股票。
+    """
+
+    def __init__(self, run_id: str, path: Optional[str] = DEFAULT_CHECKPOINT_PATH):
+        """
+        Args:
+            run_id: 运行ID，相同ID的运行共享记录（如 'hgt_manual_20241201'）
+            path: SQLite 数据库路径，为None时只保存在内存中（不能跨进程续跑）
+        """
+        self.run_id = run_id
+        self.path = path or ':memory:'
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                run_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                code TEXT NOT NULL,
+                market TEXT NOT NULL,
+                payload TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, stage, code, market)
+            )
+        """)
+        self._conn.commit()
+
+    @classmethod
+    def for_today(cls, name: str, path: Optional[str] = DEFAULT_CHECKPOINT_PATH) -> 'CheckpointStore':
+        """当天的运行记录（同一天内重新运行会续跑，第二天重新开始）"""
+        return cls(f"{name}_{datetime.now().strftime('%Y%m%d')}", path)
+
+    def completed(self, stage: str) -> Dict:
+        """
+        某个阶段已完成的股票
+
+        Returns:
+            {(代码, 市场): 结果字典}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT code, market, payload FROM results WHERE run_id = ? AND stage = ?",
+                (self.run_id, stage)).fetchall()
+        return {(code, market): json.loads(payload) for code, market, payload in rows}
+
+    def record(self, stage: str, code: str, market: str, payload: Dict):
+        """记录一只股票的结果（立即提交）"""
+        text = json.dumps(payload, ensure_ascii=False, default=_to_builtin)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (run_id, stage, code, market, payload, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.run_id, stage, str(code), str(market), text, datetime.now().isoformat(timespec='seconds')))
+            self._conn.commit()
+
+    def clear(self, stage: Optional[str] = None):
+        """清除本次运行（某个阶段）的记录"""
+        with self._lock:
+            if stage is None:
+                self._conn.execute("DELETE FROM results WHERE run_id = ?", (self.run_id,))
+            else:
+                self._conn.execute("DELETE FROM results WHERE run_id = ? AND stage = ?", (self.run_id, stage))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,65 @@
+"""
+港股通每日信号脚本 - 收盘后增量更新全部港股通股票的交易信号，只输出信号发生变化的股票
+
+第一次运行时获取历史K线建立每只股票的状态（保存在 output/signal_state.db），
+之后每天只请求一次港股行情快照，用当日K线更新状态，不再重新获取历史K线。
+使用 --rebuild 参数忽略已保存的状态，全部重新建立。
+"""
+import os
+import sys
+from datetime import datetime
+from data_fetcher import DataFetcher
+from trading_strategy import TradingStrategy
+from signal_state import IncrementalSignals
+
+
+def main(rebuild=False):
+    """港股通每日信号主函数"""
+    print("=" * 60)
+    print("港股通每日信号 - 上升趋势策略")
+    print("=" * 60)
+
+    data_fetcher = DataFetcher()
+    strategy = TradingStrategy()
+    signals = IncrementalSignals(data_fetcher, strategy)
+
+    # 获取港股通股票列表
+    print("\n1. 获取港股通股票列表...")
+    try:
+        hgt_stocks = data_fetcher.get_stock_list(market='HGT')
+        if hgt_stocks.empty:
+            print("   获取港股通列表失败，尝试获取所有港股...")
+            hgt_stocks = data_fetcher.get_stock_list(market='H')
+    except Exception as e:
+        print(f"   获取港股通列表出错: {e}")
+        print("   尝试获取所有港股...")
+        hgt_stocks = data_fetcher.get_stock_list(market='H')
+
+    if hgt_stocks.empty:
+        print("   无法获取港股列表，程序退出")
+        return
+
+    print(f"   找到 {len(hgt_stocks)} 只港股/港股通股票")
+
+    # 增量更新信号
+    print("\n2. 更新交易信号..." + ("（重建全部状态）" if rebuild else ""))
+    result_df = signals.update(hgt_stocks, rebuild=rebuild)
+    changed = result_df[result_df['changed']]
+
+    print(f"\n3. 信号变化的股票（{len(changed)} 只）：")
+    print("=" * 100)
+    for _, row in changed.iterrows():
+        print(f"{row['code']:<10}{str(row['name'])[:20]:<22}{row['previous_signal']} -> {row['signal']}"
+              f"  日期: {row['date']:%Y-%m-%d}  当前价: {row['price']:.2f}")
+
+    if not changed.empty:
+        output_dir = "output"
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(output_dir, f"hgt_signal_changes_{timestamp}.xlsx")
+        changed.to_excel(output_file, index=False)
+        print(f"\n结果已保存到: {output_file}")
+
+
+if __name__ == "__main__":
+    main(rebuild='--rebuild' in sys.argv[1:])
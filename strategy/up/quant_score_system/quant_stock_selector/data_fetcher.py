@@ -6,26 +6,449 @@ import numpy as np
 import akshare as ak
 import tushare as ts
 import yfinance as yf
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import warnings
 warnings.filterwarnings('ignore')
 
+from rate_limiter import AdaptiveRateLimiter
+
+
+def _find_column(columns, keywords, default=None):
+    """按关键字顺序查找第一个包含该关键字的列名"""
+    for keyword in keywords:
+        for col in columns:
+            if keyword in str(col):
+                return col
+    return default
+
+
+def _parse_number(series: pd.Series) -> np.ndarray:
+    """数值列转换为float数组（去掉千分位逗号），无法解析的（如 '-'）为NaN"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=float)
+    text = series.astype(str).str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype=float)
+
+
+# 市值单位换算为亿元
+_CAP_UNITS = {'万亿': 1e4, '亿': 1.0, '万': 1e-4}
+
+
+def _parse_market_cap(series: pd.Series) -> np.ndarray:
+    """市值列转换为亿元：'1234.5亿'、'1.2万亿' 等按单位换算，不带单位的数字视为元"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=float) / 1e8
+    text = series.astype(str).str.replace(',', '', regex=False)
+    parts = text.str.extract(r'^\s*(-?[\d.]+)\s*(万亿|亿|万)?')
+    value = pd.to_numeric(parts[0], errors='coerce')
+    scale = parts[1].map(_CAP_UNITS).fillna(1e-8)
+    return (value * scale).to_numpy(dtype=float)
+
+
+class SpotSnapshot:
+    """
+    全市场实时行情快照（港股 ak.stock_hk_spot_em、A股 ak.stock_zh_a_spot_em）
+    
+    整张行情表在有效期内只下载一次，市值、PE、PB、成交额等列一次性向量化解析，
+    并建立 代码 -> 行 的字典，逐只股票查询时直接命中字典，不再每只股票下载并扫描整张表；
+    整张表也用于选股第一阶段的批量初筛（见 screener.py）。
+    """
+    
+    def __init__(self, fetch, name: str = '', ttl: float = 1800, retry_interval: float = 60):
+        """
+        Args:
+            fetch: 下载整张行情表的函数，如 ak.stock_hk_spot_em
+            name: 市场名称（用于错误信息），如 '港股'
+            ttl: 快照有效期（秒），过期后下次查询时重新下载
+            retry_interval: 下载失败后多久内不再重试（秒），避免每只股票都重新请求一次
+        """
+        self.fetch = fetch
+        self.name = name
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.frame = None  # 解析后的行情表：code, name, price, high, low, prev_close, amount, market_cap, pe_ratio, pb_ratio
+        self._rows = {}
+        self._fetched_at = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+    
+    def refresh(self, force: bool = False) -> pd.DataFrame:
+        """
+        获取有效期内的快照，过期或 force=True 时重新下载
+        
+        Returns:
+            解析后的行情表；下载失败且没有旧快照时抛出异常
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force:
+                if self.frame is not None and now - self._fetched_at < self.ttl:
+                    return self.frame
+                if self._failed_at is not None and now - self._failed_at < self.retry_interval:
+                    if self.frame is not None:
+                        return self.frame
+                    raise RuntimeError(f"{self.name}行情快照暂不可用（最近一次下载失败）")
+            
+            try:
+                raw = self.fetch()
+                if raw is None or raw.empty:
+                    raise ValueError(f"{self.name}行情为空")
+            except Exception:
+                self._failed_at = now
+                if self.frame is not None and not force:
+                    return self.frame  # 下载失败时继续使用旧快照
+                raise
+            
+            self.frame = self._parse(raw)
+            self._rows = dict(zip(self.frame['code'], self.frame.to_dict('records')))
+            self._fetched_at = now
+            self._failed_at = None
+            return self.frame
+    
+    @staticmethod
+    def _parse(raw: pd.DataFrame) -> pd.DataFrame:
+        """原始行情表 -> 标准列（一次性向量化解析）"""
+        columns = list(raw.columns)
+        code_col = _find_column(columns, ['代码', 'code'], columns[0])
+        name_col = _find_column(columns, ['名称', 'name'], columns[1])
+        
+        def number(keywords):
+            col = _find_column(columns, keywords)
+            return _parse_number(raw[col]) if col is not None else np.full(len(raw), np.nan)
+        
+        cap_col = _find_column(columns, ['总市值', '市值'])
+        return pd.DataFrame({
+            'code': raw[code_col].astype(str).str.strip().to_numpy(),
+            'name': raw[name_col].to_numpy(),
+            'price': number(['最新价']),
+            'high': number(['最高']),
+            'low': number(['最低']),
+            'prev_close': number(['昨收']),
+            'amount': number(['成交额']),
+            'market_cap': _parse_market_cap(raw[cap_col]) if cap_col is not None else np.full(len(raw), np.nan),
+            'pe_ratio': number(['市盈率']),
+            'pb_ratio': number(['市净率']),
+        })
+    
+    def lookup(self, code: str) -> Optional[Dict]:
+        """
+        查询单只股票的快照行
+        
+        Returns:
+            行字典（缺失值为NaN），快照中没有该股票时返回None
+        """
+        self.refresh()
+        return self._rows.get(str(code))
+
+
+DEFAULT_KLINE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kline_cache')
+
+
+class KlineCache:
+    """
+    K线缓存，内存 + 磁盘两级，键为 (代码, 市场, 开始日期, 结束日期, 周期, 复权方式)
+    
+    同一次运行中评分、回测、当前信号三个阶段对同一只股票的请求只发起一次；
+    磁盘文件在运行之间共用，按天失效：当天获取的数据当天有效；
+    不复权且结束日期早于获取日期的区间数据不会再变化，一直有效。
+    前复权（qfq）数据在每次除权除息后整段重算，只在获取当天有效。
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_KLINE_CACHE_DIR):
+        """
+        Args:
+            cache_dir: 缓存目录，为None时只使用内存
+        """
+        self.cache_dir = cache_dir
+        self._memory = {}
+        self._lock = threading.Lock()
+    
+    def _path(self, key) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        code, market, start_date, end_date, period, adjust = key
+        return os.path.join(self.cache_dir,
+                            f"{market}_{code}_{start_date}_{end_date}_{period}_{adjust or 'none'}.pkl")
+    
+    @staticmethod
+    def _is_fresh(key, fetched_on: str) -> bool:
+        """fetched_on 当天获取的数据今天是否仍然有效"""
+        end_date, adjust = key[3], key[5]
+        if fetched_on == datetime.now().strftime('%Y%m%d'):
+            return True
+        return not adjust and end_date < fetched_on
+    
+    def get(self, key) -> Optional[pd.DataFrame]:
+        """命中有效缓存时返回K线数据，否则返回None"""
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None and self._is_fresh(key, entry[0]):
+            return entry[1]
+        
+        path = self._path(key)
+        if path and os.path.exists(path):
+            fetched_on = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y%m%d')
+            if self._is_fresh(key, fetched_on):
+                try:
+                    df = pd.read_pickle(path)
+                except Exception:
+                    return None
+                with self._lock:
+                    self._memory[key] = (fetched_on, df)
+                return df
+        return None
+    
+    def put(self, key, df: pd.DataFrame):
+        """保存K线数据（写入磁盘失败时只保留在内存中）"""
+        with self._lock:
+            self._memory[key] = (datetime.now().strftime('%Y%m%d'), df)
+        path = self._path(key)
+        if path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                df.to_pickle(tmp_path)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"   写入K线缓存失败: {e}")
+
+
+DEFAULT_FINANCIALS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'financials_cache')
+
+
+# 各报告期的法定披露截止日（月日）：一季报4月30日、半年报8月31日、三季报10月31日、年报次年4月30日
+_REPORT_DEADLINES = {'0331': '0430', '0630': '0831', '0930': '1031', '1231': '0430'}
+
+
+def report_deadline(report_date: str) -> str:
+    """报告期 'YYYYMMDD' 的披露截止日 'YYYYMMDD'"""
+    year, month_day = int(report_date[:4]), report_date[4:]
+    if month_day == '1231':
+        year += 1
+    return f"{year}{_REPORT_DEADLINES[month_day]}"
+
+
+def recent_report_dates(today: Optional[str] = None, count: int = 4) -> List[str]:
+    """
+    最近 count 个已经结束的报告期，从新到旧，如 ['20240930', '20240630', '20240331', '20231231']
+    
+    Args:
+        today: 当前日期 'YYYYMMDD'，默认为今天
+    """
+    today = today or datetime.now().strftime('%Y%m%d')
+    year = int(today[:4])
+    dates = [f"{y}{md}" for y in range(year, year - count // 4 - 2, -1)
+             for md in ('1231', '0930', '0630', '0331')]
+    return [date for date in dates if date < today][:count]
+
+
+class ReportFinancials:
+    """
+    A股按报告期的成长性指标（业绩报表 ak.stock_yjbb_em，一次请求返回一个报告期的全部股票）
+    
+    每个报告期的整张表在磁盘上保存一个文件：披露截止日之后获取的表不会再变化，一直有效；
+    披露期内获取的表（还有公司未披露）当天有效，第二天再更新一次。
+    从最新的报告期往前加载，直到一个已过披露截止日的报告期为止，每只股票取已披露的最新报告期，
+    所以只有出现新的报告期（或新报告期仍在披露中）时才会发起请求。
+    """
+    
+    def __init__(self, fetch, cache_dir: Optional[str] = DEFAULT_FINANCIALS_CACHE_DIR,
+                 retry_interval: float = 60):
+        """
+        Args:
+            fetch: 获取一个报告期整张业绩报表的函数，参数为报告期 'YYYYMMDD'
+            cache_dir: 缓存目录，为None时只缓存在内存中
+            retry_interval: 获取失败后多久内不再重试（秒）
+        """
+        self.fetch = fetch
+        self.cache_dir = cache_dir
+        self.retry_interval = retry_interval
+        self._table = None  # 每只股票最新报告期的指标：code, report_date, revenue_growth, profit_growth
+        self._rows = {}
+        self._built_on = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+    
+    def _path(self, report_date: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"yjbb_{report_date}.pkl")
+    
+    COLUMNS = ['code', 'report_date', 'revenue_growth', 'profit_growth']
+    
+    @staticmethod
+    def _parse(raw: pd.DataFrame, report_date: str) -> pd.DataFrame:
+        """原始业绩报表 -> 标准列（同比增长率，单位%）"""
+        if raw is None or raw.empty:
+            return pd.DataFrame(columns=ReportFinancials.COLUMNS)
+        columns = list(raw.columns)
+        code_col = _find_column(columns, ['股票代码', '代码'], columns[0])
+        
+        def number(keywords):
+            col = _find_column(columns, keywords)
+            return _parse_number(raw[col]) if col is not None else np.full(len(raw), np.nan)
+        
+        return pd.DataFrame({
+            'code': raw[code_col].astype(str).str.strip().str.zfill(6).to_numpy(),
+            'report_date': report_date,
+            'revenue_growth': number(['营业总收入-同比增长', '营业收入-同比增长']),
+            'profit_growth': number(['净利润-同比增长']),
+        })
+    
+    def period(self, report_date: str) -> pd.DataFrame:
+        """
+        一个报告期的整张表（优先读取有效的磁盘缓存）
+        
+        Returns:
+            code, report_date, revenue_growth, profit_growth；获取失败时抛出异常
+        """
+        today = datetime.now().strftime('%Y%m%d')
+        path = self._path(report_date)
+        if path and os.path.exists(path):
+            fetched_on = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y%m%d')
+            if fetched_on == today or fetched_on > report_deadline(report_date):
+                try:
+                    return pd.read_pickle(path)
+                except Exception:
+                    pass
+        
+        df = self._parse(self.fetch(report_date), report_date)
+        if path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                df.to_pickle(tmp_path)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"   写入财务数据缓存失败: {e}")
+        return df
+    
+    def table(self) -> pd.DataFrame:
+        """
+        每只股票已披露的最新报告期的指标（当天只组装一次）
+        
+        Returns:
+            code, report_date, revenue_growth, profit_growth；全部报告期获取失败时为空表
+        """
+        with self._lock:
+            today = datetime.now().strftime('%Y%m%d')
+            if self._table is not None and self._built_on == today:
+                return self._table
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                return self._table if self._table is not None else pd.DataFrame(columns=self.COLUMNS)
+            
+            frames = []
+            failed = False
+            for report_date in recent_report_dates(today):
+                try:
+                    frames.append(self.period(report_date))
+                except Exception as e:
+                    failed = True
+                    print(f"   获取 {report_date} 业绩报表失败: {e}")
+                if report_deadline(report_date) < today:
+                    break  # 更早的报告期每只股票都有更新的数据
+            
+            if frames:
+                table = pd.concat(frames, ignore_index=True).drop_duplicates('code', keep='first')
+            else:
+                table = pd.DataFrame(columns=self.COLUMNS)
+            if failed:
+                self._failed_at = time.monotonic()
+                if self._table is not None and len(self._table) > len(table):
+                    return self._table  # 获取失败时继续使用之前的表
+            else:
+                self._built_on = today
+                self._failed_at = None
+            self._table = table
+            self._rows = dict(zip(table['code'], table.to_dict('records')))
+            return table
+    
+    def lookup(self, code: str) -> Optional[Dict]:
+        """
+        查询单只股票最新报告期的指标
+        
+        Returns:
+            行字典（缺失值为None），没有该股票时返回None
+        """
+        self.table()
+        row = self._rows.get(str(code))
+        if row is None:
+            return None
+        return {key: (None if isinstance(value, float) and np.isnan(value) else value) for key, value in row.items()}
+
+
+def _yahoo_symbol(code: str) -> str:
+    """港股代码转换为yfinance代码：00700 -> 0700.HK"""
+    if len(code) == 5 and code.startswith('0'):
+        return code[1:] + '.HK'
+    return code + '.HK'
+
+
+def _standardize_yahoo(df: pd.DataFrame) -> pd.DataFrame:
+    """yfinance 历史行情（日期为索引，列为 Open/High/...）-> 标准K线列"""
+    df = df.dropna(how='all')
+    if df.empty:
+        return pd.DataFrame()
+    df = df.reset_index()
+    df.columns = [str(col).lower() if col != 'Date' else 'date' for col in df.columns]
+    df['date'] = pd.to_datetime(df['date'])
+    if df['date'].dt.tz is not None:
+        df['date'] = df['date'].dt.tz_localize(None)
+    df = df[['date', 'open', 'high', 'low', 'close', 'volume']]
+    return df.sort_values('date').reset_index(drop=True)
+
 
 class DataFetcher:
     """数据获取类，支持A股和港股"""
     
-    def __init__(self, tushare_token: Optional[str] = None):
+    def __init__(self, tushare_token: Optional[str] = None,
+                 kline_cache_dir: Optional[str] = DEFAULT_KLINE_CACHE_DIR,
+                 financials_cache_dir: Optional[str] = DEFAULT_FINANCIALS_CACHE_DIR):
         """
         初始化数据获取器
         
         Args:
             tushare_token: Tushare API token（可选，用于获取更详细的基本面数据）
+            kline_cache_dir: K线缓存目录，为None时只缓存在内存中
+            financials_cache_dir: 按报告期保存的业绩报表缓存目录，为None时只缓存在内存中
         """
         self.tushare_token = tushare_token
         if tushare_token:
             ts.set_token(tushare_token)
             self.pro = ts.pro_api()
+        # 全市场行情快照（股票列表、港股基本信息、选股初筛共用）
+        self.hk_spot = SpotSnapshot(ak.stock_hk_spot_em, '港股')
+        self.a_spot = SpotSnapshot(ak.stock_zh_a_spot_em, 'A股')
+        # K线缓存（评分、回测、当前信号共用，同一参数当天只请求一次）
+        self.kline_cache = KlineCache(kline_cache_dir)
+        # A股成长性指标（按报告期批量获取，只有出现新报告期时才请求）
+        self.financials = ReportFinancials(
+            lambda report_date: self._call('akshare', ak.stock_yjbb_em, date=report_date), financials_cache_dir)
+        # 批量获取的yfinance港股基本信息（akshare不可用时的备用数据，见 prefetch_hk）
+        self._yahoo_info = {}
+        # 每个数据源一个自适应限速器（多线程并发获取时共用），被限流时自动放慢并重试
+        self.limiters = {
+            'akshare': AdaptiveRateLimiter('akshare', min_interval=0.2, initial_interval=0.5),
+            'yfinance': AdaptiveRateLimiter('yfinance', min_interval=0.5, initial_interval=2.0),
+        }
+    
+    def _call(self, source: str, func, *args, **kwargs):
+        """
+        通过数据源的限速器发起请求
+        
+        Args:
+            source: 数据源名称，'akshare' 或 'yfinance'
+            func: 发起请求的函数
+            
+        Returns:
+            func 的返回值，失败时抛出异常
+        """
+        return self.limiters[source].call(func, *args, **kwargs)
     
     def get_stock_list(self, market: str = 'A') -> pd.DataFrame:
         """
@@ -53,21 +476,11 @@ class DataFetcher:
             max_retries = 3
             for retry in range(max_retries):
                 try:
-                    # 使用港股实时行情获取列表
-                    stock_list = ak.stock_hk_spot_em()
-                    if not stock_list.empty:
-                        # 提取代码和名称列
-                        if '代码' in stock_list.columns:
-                            stock_list = stock_list[['代码', '名称']].copy()
-                            stock_list.columns = ['code', 'name']
-                        elif 'code' in stock_list.columns:
-                            stock_list = stock_list[['code', 'name']].copy()
-                        else:
-                            # 尝试使用第一列和第二列
-                            stock_list = stock_list.iloc[:, [0, 1]].copy()
-                            stock_list.columns = ['code', 'name']
-                        stock_list['market'] = 'H'
-                        return stock_list
+                    # 使用港股实时行情快照获取列表（与港股基本信息共用同一次下载）
+                    snapshot = self.hk_spot.refresh(force=retry > 0)
+                    stock_list = snapshot[['code', 'name']].copy()
+                    stock_list['market'] = 'H'
+                    return stock_list
                 except Exception as e:
                     if retry < max_retries - 1:
                         print(f"   获取港股列表失败（重试 {retry+1}/{max_retries}）: {e}")
@@ -117,11 +530,28 @@ class DataFetcher:
         else:
             return pd.DataFrame()
     
+    def get_spot_snapshot(self, market: str = 'A') -> pd.DataFrame:
+        """
+        获取全市场行情快照（一次请求），用于批量初筛和每日增量更新信号
+        
+        Args:
+            market: 'A' 表示A股，'H' 表示港股
+            
+        Returns:
+            每只股票一行：code, name, price, high, low, prev_close（昨收）, amount（成交额）, market_cap（亿元）,
+            pe_ratio, pb_ratio, market；
+            缺失值为NaN，获取失败时抛出异常
+        """
+        snapshot = self.a_spot if market == 'A' else self.hk_spot
+        frame = snapshot.refresh().copy()
+        frame['market'] = 'A' if market == 'A' else 'H'
+        return frame
+    
     def get_stock_kline(self, code: str, market: str = 'A', 
                        start_date: str = None, end_date: str = None,
-                       period: str = 'daily') -> pd.DataFrame:
+                       period: str = 'daily', adjust: str = 'qfq') -> pd.DataFrame:
         """
-        获取股票K线数据
+        获取股票K线数据（同一参数当天只请求一次，见 KlineCache）
         
         Args:
             code: 股票代码
@@ -129,22 +559,181 @@ class DataFetcher:
             start_date: 开始日期，格式 'YYYYMMDD'
             end_date: 结束日期，格式 'YYYYMMDD'
             period: 周期，'daily' 表示日线
+            adjust: 复权方式，'qfq' 前复权，'' 不复权
             
         Returns:
             包含OHLCV数据的DataFrame
         """
+        key = self._kline_key(code, market, start_date, end_date, period, adjust)
+        df = self.kline_cache.get(key)
+        if df is None:
+            df = self._fetch_stock_kline(*key)
+            if not df.empty:
+                self.kline_cache.put(key, df)
+        return df.copy()
+    
+    @staticmethod
+    def _kline_key(code: str, market: str, start_date: Optional[str], end_date: Optional[str],
+                   period: str, adjust: str) -> tuple:
+        """K线缓存键 (代码, 市场, 开始日期, 结束日期, 周期, 复权方式)，默认区间为最近一年"""
         if end_date is None:
             end_date = datetime.now().strftime('%Y%m%d')
         if start_date is None:
             start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+        return (code, market, start_date.replace('-', ''), end_date.replace('-', ''), period, adjust)
+    
+    def prefetch_hk(self, codes: List[str], start_date: str = None, end_date: str = None,
+                    period: str = 'daily', adjust: str = 'qfq', workers: int = 4):
+        """
+        为一批港股预先获取K线和基本信息：akshare不可用时改用yfinance批量获取
+        
+        先用第一只没有缓存的股票请求一次akshare，可用时K线之后仍逐只获取；
+        不可用时所有待获取股票的K线用一次多线程 yf.download 下载并写入K线缓存。
+        行情快照中没有市值（或快照不可用）的股票的基本信息在线程池中通过yfinance限速器一次性获取，
+        之后 get_stock_kline / get_stock_basic_info 直接命中，不再逐只先请求akshare再回退。
+        
+        Args:
+            codes: 港股代码列表
+            start_date, end_date, period, adjust: 同 get_stock_kline（缓存键必须一致）
+            workers: 获取基本信息的线程数
+        """
+        keys = [self._kline_key(code, 'H', start_date, end_date, period, adjust) for code in codes]
+        pending = [key for key in keys if self.kline_cache.get(key) is None]
+        if pending and period == 'daily':
+            try:
+                df = self._fetch_hk_akshare(*pending[0])
+                if not df.empty:
+                    self.kline_cache.put(pending[0], df)
+            except Exception as e:
+                print(f"   akshare港股K线不可用（{e}），使用yfinance批量获取 {len(pending)} 只股票")
+                self._download_hk_yahoo(pending)
+        
+        need_info = []
+        for code in codes:
+            try:
+                row = self.hk_spot.lookup(code)
+            except Exception:
+                row = None
+            if (row is None or pd.isna(row['market_cap']) or not row['market_cap']) and code not in self._yahoo_info:
+                need_info.append(code)
+        if not need_info:
+            return
+        
+        print(f"   使用yfinance获取 {len(need_info)} 只港股的基本信息...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self._fetch_hk_info_yahoo, code): code for code in need_info}
+            for future in as_completed(futures):
+                try:
+                    self._yahoo_info[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"   yfinance获取 {futures[future]} 基本信息失败: {e}")
+    
+    def _download_hk_yahoo(self, keys: List[tuple]):
+        """一次多线程 yf.download 获取一批港股日线，按股票写入K线缓存（缓存键见 _kline_key）"""
+        symbols = {_yahoo_symbol(key[0]): key for key in keys}
+        start_date, end_date = keys[0][2], keys[0][3]
+        try:
+            data = self._call('yfinance', yf.download, list(symbols),
+                              start=pd.to_datetime(start_date).strftime('%Y-%m-%d'),
+                              end=pd.to_datetime(end_date).strftime('%Y-%m-%d'),
+                              group_by='ticker', threads=True, auto_adjust=True, progress=False)
+        except Exception as e:
+            print(f"   yfinance批量下载失败: {e}")
+            return
+        if data is None or data.empty:
+            return
+        
+        found = 0
+        for symbol, key in symbols.items():
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                df = _standardize_yahoo(data[symbol])
+            else:
+                df = _standardize_yahoo(data)  # 只有一只股票时为单层列
+            if not df.empty:
+                self.kline_cache.put(key, df)
+                found += 1
+        print(f"   yfinance批量下载完成: {found}/{len(symbols)} 只股票有K线数据")
+    
+    def _fetch_hk_akshare(self, code: str, market: str, start_date: str, end_date: str,
+                          period: str, adjust: str) -> pd.DataFrame:
+        """akshare获取港股日线（失败时抛出异常），参数含义同 get_stock_kline"""
+        df = self._call('akshare', ak.stock_hk_daily, symbol=code, adjust=adjust)
+        if df.empty:
+            return pd.DataFrame()
+        
+        # 标准化列名
+        if '日期' in df.columns:
+            df = df.rename(columns={'日期': 'date', '开盘': 'open', '收盘': 'close', 
+                                   '最高': 'high', '最低': 'low', '成交量': 'volume'})
+        elif 'date' in df.columns:
+            pass  # 已经是标准格式
+        else:
+            # 尝试使用前几列
+            df.columns = ['date', 'open', 'close', 'high', 'low', 'volume'] + list(df.columns[6:])
+        
+        df['date'] = pd.to_datetime(df['date'])
+        df = df[['date', 'open', 'high', 'low', 'close', 'volume']]
+        df = df.sort_values('date').reset_index(drop=True)
+        
+        # 筛选日期范围
+        if start_date:
+            start_dt = pd.to_datetime(start_date)
+            df = df[df['date'] >= start_dt]
+        if end_date:
+            end_dt = pd.to_datetime(end_date)
+            df = df[df['date'] <= end_dt]
+        
+        return df
+    
+    def _fetch_hk_info_yahoo(self, code: str) -> Dict:
+        """
+        yfinance获取单只港股的基本信息（市值、PE、PB、ROE、增长率）
+        
+        Returns:
+            只包含获取到的字段的字典，失败时抛出异常
+        """
+        stock = yf.Ticker(_yahoo_symbol(code))
+        info_dict = self._call('yfinance', lambda: stock.info)
+        
+        info = {}
+        if 'marketCap' in info_dict:
+            info['market_cap'] = info_dict['marketCap'] / 1e8  # 转换为亿元
+        if 'trailingPE' in info_dict:
+            info['pe_ratio'] = info_dict['trailingPE']
+        if 'priceToBook' in info_dict:
+            info['pb_ratio'] = info_dict['priceToBook']
+        if 'returnOnEquity' in info_dict:
+            info['roe'] = info_dict['returnOnEquity'] * 100
+        if info_dict.get('earningsGrowth') is not None:
+            info['profit_growth'] = info_dict['earningsGrowth'] * 100
         
+        # 营收增长率：info 中有同比增长时直接使用，没有时再请求一次财务报表
+        if info_dict.get('revenueGrowth') is not None:
+            info['revenue_growth'] = info_dict['revenueGrowth'] * 100
+        else:
+            try:
+                financials = self._call('yfinance', lambda: stock.financials)
+                if not financials.empty and 'Total Revenue' in financials.index:
+                    revenues = financials.loc['Total Revenue'].dropna()
+                    if len(revenues) >= 2:
+                        info['revenue_growth'] = ((revenues.iloc[0] - revenues.iloc[1]) / 
+                                                 abs(revenues.iloc[1])) * 100
+            except:
+                pass
+        return info
+    
+    def _fetch_stock_kline(self, code: str, market: str, start_date: str, end_date: str,
+                           period: str, adjust: str) -> pd.DataFrame:
+        """从数据源获取K线数据（不经过缓存），参数含义同 get_stock_kline"""
         try:
             if market == 'A':
                 # A股数据
-                df = ak.stock_zh_a_hist(symbol=code, period=period, 
-                                       start_date=start_date.replace('-', ''),
-                                       end_date=end_date.replace('-', ''),
-                                       adjust="qfq")
+                df = self._call('akshare', ak.stock_zh_a_hist, symbol=code, period=period, 
+                                start_date=start_date.replace('-', ''),
+                                end_date=end_date.replace('-', ''),
+                                adjust=adjust)
                 if df.empty:
                     return pd.DataFrame()
                 df.columns = ['date', 'open', 'close', 'high', 'low', 'volume', 
@@ -155,61 +744,15 @@ class DataFetcher:
                 df = df.sort_values('date').reset_index(drop=True)
                 return df
             elif market == 'H':
-                # 港股数据 - 优先使用akshare
+                # 港股数据 - 优先使用akshare（由限速器控制请求间隔）
                 try:
-                    # 使用akshare获取港股日线数据
-                    import time
-                    time.sleep(1)  # 添加延时避免速率限制
-                    
-                    # akshare港股代码格式：00700 -> 00700
-                    df = ak.stock_hk_daily(symbol=code, adjust="qfq")
-                    if df.empty:
-                        return pd.DataFrame()
-                    
-                    # 标准化列名
-                    if '日期' in df.columns:
-                        df = df.rename(columns={'日期': 'date', '开盘': 'open', '收盘': 'close', 
-                                               '最高': 'high', '最低': 'low', '成交量': 'volume'})
-                    elif 'date' in df.columns:
-                        pass  # 已经是标准格式
-                    else:
-                        # 尝试使用前几列
-                        df.columns = ['date', 'open', 'close', 'high', 'low', 'volume'] + list(df.columns[6:])
-                    
-                    df['date'] = pd.to_datetime(df['date'])
-                    df = df[['date', 'open', 'high', 'low', 'close', 'volume']]
-                    df = df.sort_values('date').reset_index(drop=True)
-                    
-                    # 筛选日期范围
-                    if start_date:
-                        start_dt = pd.to_datetime(start_date)
-                        df = df[df['date'] >= start_dt]
-                    if end_date:
-                        end_dt = pd.to_datetime(end_date)
-                        df = df[df['date'] <= end_dt]
-                    
-                    return df
+                    return self._fetch_hk_akshare(code, market, start_date, end_date, period, adjust)
                 except Exception as e1:
-                    # 如果akshare失败，尝试yfinance
+                    # 如果akshare失败，尝试yfinance（批量获取见 prefetch_hk）
                     try:
-                        if len(code) == 5 and code.startswith('0'):
-                            yf_code = code[1:] + '.HK'
-                        else:
-                            yf_code = code + '.HK'
-                        
-                        import time
-                        time.sleep(2)  # yfinance需要更长延时
-                        
-                        stock = yf.Ticker(yf_code)
-                        df = stock.history(start=start_date, end=end_date)
-                        if df.empty:
-                            return pd.DataFrame()
-                        df = df.reset_index()
-                        df.columns = [col.lower() if col != 'Date' else 'date' for col in df.columns]
-                        df['date'] = pd.to_datetime(df['date'])
-                        df = df[['date', 'open', 'high', 'low', 'close', 'volume']]
-                        df = df.sort_values('date').reset_index(drop=True)
-                        return df
+                        stock = yf.Ticker(_yahoo_symbol(code))
+                        df = self._call('yfinance', stock.history, start=start_date, end=end_date)
+                        return _standardize_yahoo(df)
                     except Exception as e2:
                         print(f"获取 {code} K线数据失败 (akshare: {e1}, yfinance: {e2})")
                         return pd.DataFrame()
@@ -242,7 +785,7 @@ class DataFetcher:
         try:
             if market == 'A':
                 # A股基本信息
-                stock_info = ak.stock_individual_info_em(symbol=code)
+                stock_info = self._call('akshare', ak.stock_individual_info_em, symbol=code)
                 if not stock_info.empty:
                     info_dict = dict(zip(stock_info['item'], stock_info['value']))
                     
@@ -270,105 +813,33 @@ class DataFetcher:
                         except:
                             pass
                 
-                # 获取财务数据（成长性指标）
-                try:
-                    financial_data = ak.stock_financial_abstract_ths(symbol=code)
-                    if not financial_data.empty and len(financial_data) >= 2:
-                        # 计算营收增长率
-                        revenue_cols = [col for col in financial_data.columns if '营业收入' in str(col)]
-                        if revenue_cols:
-                            revenues = financial_data[revenue_cols[0]].dropna()
-                            if len(revenues) >= 2:
-                                info['revenue_growth'] = ((revenues.iloc[-1] - revenues.iloc[-2]) / 
-                                                         abs(revenues.iloc[-2])) * 100
-                        
-                        # 计算利润增长率
-                        profit_cols = [col for col in financial_data.columns if '净利润' in str(col)]
-                        if profit_cols:
-                            profits = financial_data[profit_cols[0]].dropna()
-                            if len(profits) >= 2:
-                                info['profit_growth'] = ((profits.iloc[-1] - profits.iloc[-2]) / 
-                                                        abs(profits.iloc[-2])) * 100
-                except:
-                    pass
+                # 成长性指标（营收、净利润同比增长）：本地按报告期保存的全市场业绩报表，不再逐只请求
+                growth = self.financials.lookup(code)
+                if growth is not None:
+                    info['revenue_growth'] = growth['revenue_growth']
+                    info['profit_growth'] = growth['profit_growth']
                     
             elif market == 'H':
-                # 港股基本信息 - 优先使用akshare
-                import time
+                # 港股基本信息 - 优先使用akshare行情快照（整张表每次运行只下载一次）
                 try:
-                    # 尝试使用akshare获取港股基本信息
-                    time.sleep(0.5)
-                    stock_info = ak.stock_hk_spot_em()
-                    if not stock_info.empty:
-                        # 查找对应股票
-                        code_col = None
-                        for col in stock_info.columns:
-                            if '代码' in str(col) or 'code' in str(col).lower():
-                                code_col = col
-                                break
-                        
-                        if code_col:
-                            stock_row = stock_info[stock_info[code_col] == code]
-                            if not stock_row.empty:
-                                # 提取市值等信息
-                                for col in stock_info.columns:
-                                    val = stock_row[col].iloc[0] if col in stock_row.columns else None
-                                    if pd.notna(val):
-                                        val_str = str(val)
-                                        # 市值
-                                        if '市值' in str(col) or 'market' in str(col).lower():
-                                            if '亿' in val_str:
-                                                try:
-                                                    info['market_cap'] = float(val_str.replace('亿', '').replace(',', ''))
-                                                except:
-                                                    pass
-                                        # PE
-                                        if '市盈率' in str(col) or 'pe' in str(col).lower():
-                                            try:
-                                                info['pe_ratio'] = float(val_str.replace(',', ''))
-                                            except:
-                                                pass
-                                        # PB
-                                        if '市净率' in str(col) or 'pb' in str(col).lower():
-                                            try:
-                                                info['pb_ratio'] = float(val_str.replace(',', ''))
-                                            except:
-                                                pass
+                    row = self.hk_spot.lookup(code)
+                    if row is not None:
+                        if pd.notna(row['market_cap']):
+                            info['market_cap'] = row['market_cap']
+                        if pd.notna(row['pe_ratio']):
+                            info['pe_ratio'] = row['pe_ratio']
+                        if pd.notna(row['pb_ratio']):
+                            info['pb_ratio'] = row['pb_ratio']
                 except Exception as e1:
                     pass
                 
-                # 如果akshare失败，尝试yfinance（但需要更长延时）
+                # 如果akshare失败，使用yfinance（优先使用 prefetch_hk 批量获取的结果）
                 if info['market_cap'] == 0:
                     try:
-                        if len(code) == 5 and code.startswith('0'):
-                            yf_code = code[1:] + '.HK'
-                        else:
-                            yf_code = code + '.HK'
-                        
-                        time.sleep(2)  # yfinance需要更长延时
-                        
-                        stock = yf.Ticker(yf_code)
-                        info_dict = stock.info
-                        
-                        if 'marketCap' in info_dict:
-                            info['market_cap'] = info_dict['marketCap'] / 1e8  # 转换为亿元
-                        if 'trailingPE' in info_dict:
-                            info['pe_ratio'] = info_dict['trailingPE']
-                        if 'priceToBook' in info_dict:
-                            info['pb_ratio'] = info_dict['priceToBook']
-                        if 'returnOnEquity' in info_dict:
-                            info['roe'] = info_dict['returnOnEquity'] * 100
-                        
-                        # 获取财务数据计算增长率
-                        try:
-                            financials = stock.financials
-                            if not financials.empty and 'Total Revenue' in financials.index:
-                                revenues = financials.loc['Total Revenue'].dropna()
-                                if len(revenues) >= 2:
-                                    info['revenue_growth'] = ((revenues.iloc[0] - revenues.iloc[1]) / 
-                                                             abs(revenues.iloc[1])) * 100
-                        except:
-                            pass
+                        yahoo_info = self._yahoo_info.get(code)
+                        if yahoo_info is None:
+                            yahoo_info = self._fetch_hk_info_yahoo(code)
+                        info.update(yahoo_info)
                     except Exception as e2:
                         # 如果都失败，至少尝试从K线数据估算市值
                         pass
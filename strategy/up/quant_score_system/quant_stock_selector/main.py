@@ -6,6 +6,7 @@ import os
 from datetime import datetime
 from data_fetcher import DataFetcher
 from score_system import ScoreSystem
+from screener import StagedScreener
 from trading_strategy import TradingStrategy
 
 
@@ -42,13 +43,6 @@ def main():
     all_stocks = pd.concat([a_stocks, h_stocks], ignore_index=True)
     print(f"\n   总计 {len(all_stocks)} 只股票")
     
-    # 如果股票太多，可以随机采样一部分进行测试
-    # 实际使用时建议分批处理或使用多进程
-    if len(all_stocks) > 100:
-        print("\n   股票数量较多，建议分批处理或使用多进程")
-        print("   这里先采样前100只进行演示...")
-        all_stocks = all_stocks.head(100)
-    
     # 评分选股
     print("\n5. 开始评分选股...")
     print("   评分标准：")
@@ -57,7 +51,9 @@ def main():
     print("   - 波动率（20%）：适合趋势策略的波动率范围")
     print("   - 市值（20%）：市值大于50亿")
     
-    scored_stocks = score_system.score_stocks(all_stocks, top_n=20)
+    # 两阶段选股：先用全市场行情快照批量初筛，只对通过初筛的股票逐只获取数据评分
+    screener = StagedScreener(data_fetcher, score_system)
+    scored_stocks = screener.screen(all_stocks, top_n=20)
     
     if scored_stocks.empty:
         print("\n   未找到符合条件的股票")
@@ -0,0 +1,154 @@
+"""
+自适应限速模块 - 每个数据源一个限速器，多线程并发获取数据时共用
+"""
+import threading
+import time
+from typing import Optional
+
+
+# 被数据源限流时常见的错误信息（小写）
+RATE_LIMIT_KEYWORDS = (
+    '429',
+    'too many requests',
+    'rate limit',
+    'ratelimit',
+    'remote end closed connection',
+    'connection aborted',
+    '频繁',
+    '限流',
+)
+
+
+def is_rate_limit_error(error: Optional[BaseException]) -> bool:
+    """判断异常是否是被数据源限流"""
+    if error is None:
+        return False
+    message = f"{type(error).__name__}: {error}".lower()
+    return any(keyword in message for keyword in RATE_LIMIT_KEYWORDS)
+
+
+class AdaptiveRateLimiter:
+    """
+    自适应限速器（线程安全）
+
+    - 每次请求前调用 wait()，保证相邻两次请求的间隔不小于当前间隔
+    - 被限流时间隔乘以 backoff（不超过 max_interval），并暂停所有线程一个间隔；
+      放慢之前已经发出的并发请求随后再被限流时不重复放慢
+    - 连续 success_window 次成功后间隔乘以 speedup，逐步恢复到 min_interval
+    """
+
+    def __init__(self, name: str, min_interval: float = 0.2, max_interval: float = 30.0,
+                 initial_interval: Optional[float] = None, backoff: float = 2.0,
+                 speedup: float = 0.8, success_window: int = 10):
+        """
+        Args:
+            name: 数据源名称（用于输出）
+            min_interval: 最小请求间隔（秒）
+            max_interval: 最大请求间隔（秒）
+            initial_interval: 初始请求间隔，默认为 min_interval
+            backoff: 被限流时间隔的放大倍数
+            speedup: 连续成功后间隔的缩小倍数
+            success_window: 连续成功多少次后缩小一次间隔
+        """
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = initial_interval if initial_interval is not None else min_interval
+        self.backoff = backoff
+        self.speedup = speedup
+        self.success_window = success_window
+
+        self.requests = 0  # 发出的请求数
+        self.rate_limited = 0  # 被限流的次数
+
+        self._streak = 0
+        self._next = 0.0  # 下一个请求最早可以发出的时间
+        self._backoff_at = 0.0  # 最近一次放慢的时间
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """预约下一个请求时间点，返回 (预约时间, 发出时间)"""
+        with self._lock:
+            reserved = time.monotonic()
+            start = max(reserved, self._next)
+            self._next = start + self.interval
+        return reserved, start
+
+    def wait(self) -> float:
+        """
+        等待到可以发出下一个请求（先预约时间点再睡眠，等待期间不占用锁）；
+        等待期间如果因为限流放慢过，按新的间隔重新预约一次（只重新预约一次，避免持续限流时一直排不上）
+
+        Returns:
+            预约的时间（time.monotonic），用于 failure() 判断是否需要放慢
+        """
+        reserved, start = self._reserve()
+        for retry in range(2):
+            delay = start - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                slowed = self._backoff_at > reserved
+            if retry or not slowed:
+                break
+            reserved, start = self._reserve()
+        with self._lock:
+            self.requests += 1
+        return reserved
+
+    def success(self):
+        """记录一次成功请求，数据源健康时逐步加速"""
+        with self._lock:
+            self._streak += 1
+            if self._streak >= self.success_window:
+                self._streak = 0
+                self.interval = max(self.min_interval, self.interval * self.speedup)
+
+    def failure(self, error: Optional[BaseException], issued_at: Optional[float] = None) -> bool:
+        """
+        记录一次失败请求
+
+        Args:
+            error: 请求抛出的异常
+            issued_at: 请求预约的时间（wait() 的返回值），早于最近一次放慢的请求不再重复放慢
+
+        Returns:
+            是否是限流错误（是则已放慢请求速度，调用方可以重试）
+        """
+        if not is_rate_limit_error(error):
+            return False
+        with self._lock:
+            self._streak = 0
+            self.rate_limited += 1
+            now = time.monotonic()
+            if issued_at is None or issued_at >= self._backoff_at:
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+                self._backoff_at = now
+            self._next = max(self._next, now + self.interval)
+        return True
+
+    def call(self, func, *args, retries: int = 3, **kwargs):
+        """
+        限速调用 func(*args, **kwargs)，被限流时放慢速度后重试
+
+        Args:
+            func: 发起请求的函数
+            retries: 被限流时最多重试的次数（其他错误不重试）
+
+        Returns:
+            func 的返回值，失败时抛出最后一次的异常
+        """
+        for attempt in range(retries + 1):
+            issued_at = self.wait()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if self.failure(e, issued_at) and attempt < retries:
+                    continue
+                raise
+            self.success()
+            return result
+
+    def __str__(self):
+        return (f"{self.name}: 请求 {self.requests} 次，限流 {self.rate_limited} 次，"
+                f"当前间隔 {self.interval:.2f} 秒")
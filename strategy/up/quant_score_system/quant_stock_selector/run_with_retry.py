@@ -1,20 +1,23 @@
 """
 带重试机制的港股通选股脚本
-如果遇到API限制，会自动等待后重试
+如果遇到API限制，会自动等待后重试；每只股票的评分、回测结果都记录在断点中，
+重试时跳过已完成的股票，只处理剩下的部分
 """
 import time
 import sys
+from checkpoint import CheckpointStore
 from select_hgt_stocks_manual import main as run_selection
 
 def main_with_retry(max_retries=3, wait_time=60):
     """带重试的主函数"""
+    checkpoint = CheckpointStore.for_today('hgt_manual')
     for attempt in range(max_retries):
         print(f"\n{'='*60}")
         print(f"尝试运行选股系统 (第 {attempt+1}/{max_retries} 次)")
         print(f"{'='*60}\n")
         
         try:
-            run_selection()
+            run_selection(checkpoint)
             print("\n选股完成！")
             return
         except KeyboardInterrupt:
@@ -23,7 +26,7 @@ def main_with_retry(max_retries=3, wait_time=60):
         except Exception as e:
             print(f"\n运行出错: {e}")
             if attempt < max_retries - 1:
-                print(f"\n等待 {wait_time} 秒后重试...")
+                print(f"\n等待 {wait_time} 秒后重试（已完成的股票不会重新处理）...")
                 time.sleep(wait_time)
             else:
                 print("\n已达到最大重试次数，请稍后再试")
@@ -1,10 +1,13 @@
 """
 评分系统模块 - 基于基本面、成长性、波动率等指标进行评分
 """
+import time
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
 from data_fetcher import DataFetcher
+from checkpoint import CheckpointStore
 
 
 class ScoreSystem:
@@ -29,6 +32,9 @@ class ScoreSystem:
         
         # 市值最小阈值（亿元）
         self.min_market_cap = 50.0
+        
+        # 最近一次 score_stocks 获取的评分数据（用于 rescore）
+        self.fundamentals = None
     
     def calculate_fundamental_score(self, info: Dict) -> float:
         """
@@ -210,79 +216,241 @@ class ScoreSystem:
         
         return round(total_score, 2)
     
-    def score_stocks(self, stock_list: pd.DataFrame, top_n: int = 50) -> pd.DataFrame:
+    # ---------- 向量化评分：对整个股票池一次性计算，规则与上面逐只评分的函数一致 ----------
+    
+    def score_frame(self, fundamentals: pd.DataFrame, top_n: Optional[int] = None) -> pd.DataFrame:
+        """
+        向量化计算整个股票池的各项得分和总分
+        
+        Args:
+            fundamentals: 每行一只股票，需包含 market_cap、pe_ratio、pb_ratio、roe、
+                          revenue_growth、profit_growth、volatility 列（缺失值为NaN/None）
+            top_n: 只返回总分前N只，为None时返回全部通过筛选的股票
+            
+        Returns:
+            原有列加上 total_score 及各项得分，只保留通过市值筛选的股票，按总分从高到低排序
+        """
+        if fundamentals.empty:
+            return pd.DataFrame()
+        
+        def column(name):
+            return pd.to_numeric(fundamentals[name], errors='coerce').to_numpy(dtype=float)
+        
+        market_cap = column('market_cap')
+        volatility = column('volatility')
+        
+        fundamental_score = self.fundamental_scores(column('pe_ratio'), column('pb_ratio'), column('roe'))
+        growth_score = self.growth_scores(column('revenue_growth'), column('profit_growth'))
+        volatility_score = self.volatility_scores(volatility)
+        market_cap_score = self.market_cap_scores(market_cap)
+        
+        # 加权平均（与 calculate_total_score 的计算顺序一致），市值不足的直接为0
+        total_score = (
+            fundamental_score * self.weights['fundamental'] +
+            growth_score * self.weights['growth'] +
+            volatility_score * self.weights['volatility'] +
+            market_cap_score * self.weights['market_cap']
+        )
+        total_score = np.where(market_cap < self.min_market_cap, 0.0, np.round(total_score, 2))
+        
+        # 只保留通过筛选的股票，再取前N只（部分排序，同分按原顺序）
+        selected = np.flatnonzero(total_score > 0)
+        if top_n is not None and len(selected) > top_n:
+            kth = np.partition(total_score[selected], len(selected) - top_n)[len(selected) - top_n]
+            selected = selected[total_score[selected] >= kth]
+        order = selected[np.lexsort((selected, -total_score[selected]))]
+        if top_n is not None:
+            order = order[:top_n]
+        
+        result = fundamentals.iloc[order].reset_index(drop=True)
+        result['total_score'] = total_score[order]
+        result['fundamental_score'] = fundamental_score[order]
+        result['growth_score'] = growth_score[order]
+        result['volatility_score'] = volatility_score[order]
+        result['market_cap_score'] = market_cap_score[order]
+        return result
+    
+    @staticmethod
+    def fundamental_scores(pe: np.ndarray, pb: np.ndarray, roe: np.ndarray) -> np.ndarray:
+        """基本面得分数组，规则同 calculate_fundamental_score（NaN表示缺失，不加减分）"""
+        with np.errstate(invalid='ignore'):
+            pe_points = np.select([(pe > 0) & (pe < 15), (pe >= 15) & (pe < 30), (pe >= 30) & (pe < 50), pe >= 50],
+                                  [20, 10, 5, -10], 0)
+            pb_points = np.select([(pb > 0) & (pb < 2), (pb >= 2) & (pb < 4), pb >= 4], [15, 8, -5], 0)
+            roe_points = np.select([roe > 20, roe > 15, roe > 10, roe < 5], [15, 10, 5, -10], 0)
+        return np.clip(50.0 + pe_points + pb_points + roe_points, 0, 100)
+    
+    @staticmethod
+    def growth_scores(revenue_growth: np.ndarray, profit_growth: np.ndarray) -> np.ndarray:
+        """成长性得分数组，规则同 calculate_growth_score（NaN表示缺失，不加减分）"""
+        def points(growth):
+            with np.errstate(invalid='ignore'):
+                return np.select([growth > 30, growth > 20, growth > 10, growth > 0, growth < -10, growth < 0],
+                                 [25, 15, 8, 3, -15, -5], 0)
+        return np.clip(50.0 + points(revenue_growth) + points(profit_growth), 0, 100)
+    
+    @staticmethod
+    def volatility_scores(volatility: np.ndarray) -> np.ndarray:
+        """波动率得分数组，规则同 calculate_volatility_score"""
+        v = volatility
+        with np.errstate(invalid='ignore'):
+            return np.select(
+                [v == 0, (v >= 15) & (v <= 30), (v >= 10) & (v < 15), (v > 30) & (v <= 40),
+                 (v >= 5) & (v < 10), (v > 40) & (v <= 50), v < 5],
+                [0, 100, 80, 70, 60, 50, 40], 20).astype(float)
+    
+    def market_cap_scores(self, market_cap: np.ndarray) -> np.ndarray:
+        """市值得分数组，规则同 calculate_market_cap_score"""
+        # 区间 [50, 200) [200, 500) [500, 1000) [1000, 3000) 之外（含NaN）为60
+        points = np.array([60, 100, 90, 80, 70, 60], dtype=float)[np.digitize(market_cap, [50, 200, 500, 1000, 3000])]
+        with np.errstate(invalid='ignore'):
+            return np.where(market_cap < self.min_market_cap, 0.0, points)
+    
+    def rescore(self, top_n: int = 50) -> pd.DataFrame:
+        """
+        用最近一次 score_stocks 获取的数据重新评分（如调整权重或市值阈值后），不重新获取数据
+        
+        Args:
+            top_n: 返回前N只股票
+        """
+        if self.fundamentals is None:
+            return pd.DataFrame()
+        return self.score_frame(self.fundamentals, top_n)
+    
+    def _fetch_stock_data(self, code: str, market: str, retries: int = 0, backoff: float = 5.0):
+        """
+        获取单只股票评分所需的数据（在线程池中运行，请求间隔由数据源的限速器控制）
+        
+        Args:
+            retries: 获取失败时的重试次数：抛出异常，或获取期间数据源被限流且没有K线数据时重试；
+                     没有被限流时没有K线数据（停牌、退市、没有历史数据）直接返回，不重试
+            backoff: 第n次重试前等待 backoff × 2^n 秒
+            
+        Returns:
+            (基本信息字典, K线数据)
+        """
+        limiters = self.data_fetcher.limiters.values()
+        for attempt in range(retries + 1):
+            try:
+                rate_limited = sum(limiter.rate_limited for limiter in limiters)
+                info = self.data_fetcher.get_stock_basic_info(code, market)
+                kline_df = self.data_fetcher.get_stock_kline(code, market, period='daily')
+                # 限速器重试用完后的限流错误被K线接口吞掉，返回空数据
+                throttled = sum(limiter.rate_limited for limiter in limiters) > rate_limited
+                if not kline_df.empty or not throttled or attempt == retries:
+                    return info, kline_df
+            except Exception:
+                if attempt == retries:
+                    raise
+            time.sleep(backoff * 2 ** attempt)
+    
+    def _fundamental_row(self, code: str, name: str, market: str,
+                         info: Dict, kline_df: pd.DataFrame) -> Optional[Dict]:
+        """
+        已获取数据的单只股票 -> 评分所需的一行数据（计算波动率）
+        
+        Returns:
+            数据行，没有K线数据时返回None
+        """
+        if kline_df.empty:
+            return None
+        
+        return {
+            'code': code,
+            'name': name,
+            'market': market,
+            'market_cap': info.get('market_cap', 0),
+            'pe_ratio': info.get('pe_ratio'),
+            'pb_ratio': info.get('pb_ratio'),
+            'roe': info.get('roe'),
+            'revenue_growth': info.get('revenue_growth'),
+            'profit_growth': info.get('profit_growth'),
+            'volatility': self.data_fetcher.calculate_volatility(kline_df),
+        }
+    
+    def score_stocks(self, stock_list: pd.DataFrame, top_n: int = 50, workers: int = 8,
+                     checkpoint: Optional[CheckpointStore] = None, retries: int = 2) -> pd.DataFrame:
         """
         对股票列表进行评分和筛选
         
+        数据获取（I/O）在线程池中并发进行，请求速度由数据获取器中各数据源的自适应限速器控制；
+        每只股票的数据一到就在主线程中计算波动率，不等待其他股票；全部获取后用 score_frame 一次性向量化评分。
+        获取的数据保存在 self.fundamentals 中，调整权重后可用 rescore() 重新评分。
+        指定 checkpoint 时每只股票获取完成后立即记录，重新运行时跳过已记录的股票。
+        
         Args:
             stock_list: 股票列表DataFrame，包含code和market列
             top_n: 返回前N只股票
+            workers: 并发获取数据的线程数
+            checkpoint: 断点记录（阶段 'score'），为None时不记录
+            retries: 单只股票获取失败时的重试次数（按指数退避），不影响其他股票
             
         Returns:
             包含评分结果的DataFrame
         """
-        results = []
+        stocks = [(row['code'], row.get('name', row['code']), row['market'])
+                  for _, row in stock_list.iterrows()]
+        rows = {}
         
-        print(f"开始评分 {len(stock_list)} 只股票...")
+        # 断点续跑：已记录的股票直接使用记录的数据
+        recorded = checkpoint.completed('score') if checkpoint is not None else {}
+        pending = []
+        for position, (code, name, market) in enumerate(stocks):
+            row = recorded.get((str(code), str(market)))
+            if row is not None:
+                rows[position] = row
+            else:
+                pending.append((position, code, name, market))
+        if rows:
+            print(f"断点续跑：{len(rows)} 只股票已有评分数据，跳过")
+        total = len(pending)
         
-        import time
+        print(f"开始评分 {total} 只股票（{workers} 个线程并发获取数据）...")
         
-        for idx, row in stock_list.iterrows():
-            code = row['code']
-            market = row['market']
-            name = row.get('name', code)
-            
-            if idx % 10 == 0:
-                print(f"进度: {idx+1}/{len(stock_list)} - 当前处理: {code}")
-            
-            # 添加延时避免API速率限制
-            if idx > 0:
-                time.sleep(2)  # 每次请求间隔2秒，避免速率限制
-            
+        start_time = time.time()
+        
+        # 港股先批量预取：akshare不可用时用一次 yf.download 获取全部K线，不再逐只先请求akshare再回退
+        hk_codes = [code for _, code, _, market in pending if market == 'H']
+        if hk_codes:
             try:
-                # 获取基本信息
-                info = self.data_fetcher.get_stock_basic_info(code, market)
-                
-                # 获取K线数据计算波动率
-                kline_df = self.data_fetcher.get_stock_kline(code, market, 
-                                                            period='daily')
-                if kline_df.empty:
-                    continue
-                
-                volatility = self.data_fetcher.calculate_volatility(kline_df)
-                
-                # 计算总分
-                total_score = self.calculate_total_score(info, volatility)
-                
-                if total_score > 0:  # 只保留通过筛选的股票
-                    results.append({
-                        'code': code,
-                        'name': name,
-                        'market': market,
-                        'market_cap': info.get('market_cap', 0),
-                        'pe_ratio': info.get('pe_ratio'),
-                        'pb_ratio': info.get('pb_ratio'),
-                        'roe': info.get('roe'),
-                        'revenue_growth': info.get('revenue_growth'),
-                        'profit_growth': info.get('profit_growth'),
-                        'volatility': volatility,
-                        'total_score': total_score,
-                        'fundamental_score': self.calculate_fundamental_score(info),
-                        'growth_score': self.calculate_growth_score(info),
-                        'volatility_score': self.calculate_volatility_score(volatility),
-                        'market_cap_score': self.calculate_market_cap_score(info.get('market_cap', 0)),
-                    })
+                self.data_fetcher.prefetch_hk(hk_codes)
             except Exception as e:
-                print(f"评分 {code} 失败: {e}")
-                continue
+                print(f"港股批量预取失败，逐只获取: {e}")
         
-        if not results:
-            return pd.DataFrame()
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(self._fetch_stock_data, code, market, retries): (position, code, name, market)
+                for position, code, name, market in pending
+            }
+            for future in as_completed(futures):
+                position, code, name, market = futures[future]
+                done += 1
+                try:
+                    info, kline_df = future.result()
+                    row = self._fundamental_row(code, name, market, info, kline_df)
+                    if row is not None:
+                        rows[position] = row
+                        if checkpoint is not None:
+                            checkpoint.record('score', code, market, row)
+                except Exception as e:
+                    print(f"评分 {code} 失败: {e}")
+                
+                if done % 10 == 0 or done == total:
+                    elapsed = time.time() - start_time
+                    rate = done / elapsed if elapsed > 0 else 0.0
+                    remaining = (total - done) / rate if rate > 0 else 0.0
+                    print(f"进度: {done}/{total} - 最近完成: {code}，"
+                          f"{rate:.2f} 只/秒，预计剩余 {remaining:.0f} 秒")
+        
+        # 按输入顺序组成数据表，一次性评分（同分时按输入顺序排列）
+        self.fundamentals = pd.DataFrame([rows[position] for position in sorted(rows)])
+        result_df = self.score_frame(self.fundamentals, top_n)
         
-        # 转换为DataFrame并排序
-        result_df = pd.DataFrame(results)
-        result_df = result_df.sort_values('total_score', ascending=False)
-        result_df = result_df.head(top_n).reset_index(drop=True)
+        elapsed = time.time() - start_time
+        print(f"评分完成: {total} 只股票，用时 {elapsed:.1f} 秒，共有数据 {len(rows)} 只")
+        for limiter in getattr(self.data_fetcher, 'limiters', {}).values():
+            print(f"   {limiter}")
         
         return result_df
 
@@ -0,0 +1,125 @@
+"""
+两阶段选股模块 - 先用全市场行情快照批量初筛，再只对通过初筛的股票逐只获取数据评分
+"""
+import pandas as pd
+import numpy as np
+from typing import Optional, Tuple
+from checkpoint import CheckpointStore
+from data_fetcher import DataFetcher
+from score_system import ScoreSystem
+
+
+class StagedScreener:
+    """
+    两阶段选股
+
+    第一阶段：每个市场只请求一次全市场行情快照，对整个股票池批量过滤
+              （市值 >= 评分系统的 min_market_cap、成交额、PE/PB 区间），
+              快照中缺失的指标视为未知、不据此过滤，最后每个市场按成交额保留最多 max_candidates 只；
+    第二阶段：只对通过初筛的股票并发获取K线、基本面数据并评分（ScoreSystem.score_stocks），
+              逐只请求的数量不超过 市场数 × max_candidates。
+    """
+
+    def __init__(self, data_fetcher: DataFetcher, score_system: ScoreSystem,
+                 min_amount: float = 5e7,
+                 pe_range: Optional[Tuple[float, float]] = (0, 100),
+                 pb_range: Optional[Tuple[float, float]] = (0, 10),
+                 max_candidates: int = 300):
+        """
+        Args:
+            data_fetcher: 数据获取器实例
+            score_system: 评分系统实例（市值阈值取自 score_system.min_market_cap）
+            min_amount: 最小成交额（元），过滤流动性差的股票
+            pe_range: PE 区间 (下限, 上限]，为None时不按PE过滤
+            pb_range: PB 区间 (下限, 上限]，为None时不按PB过滤
+            max_candidates: 每个市场进入第二阶段的最多股票数（各市场成交额币种不同，分别排序）
+        """
+        self.data_fetcher = data_fetcher
+        self.score_system = score_system
+        self.min_amount = min_amount
+        self.pe_range = pe_range
+        self.pb_range = pb_range
+        self.max_candidates = max_candidates
+
+    def load_snapshot(self, stock_list: pd.DataFrame) -> pd.DataFrame:
+        """
+        为股票列表附加全市场行情快照中的指标（每个市场一次请求）
+
+        Args:
+            stock_list: 股票列表DataFrame，包含code和market列
+
+        Returns:
+            stock_list 加上 price, amount, market_cap, pe_ratio, pb_ratio 列（快照中没有的股票为NaN）
+        """
+        metrics = ['price', 'amount', 'market_cap', 'pe_ratio', 'pb_ratio']
+        frames = []
+        for market in stock_list['market'].unique():
+            try:
+                frames.append(self.data_fetcher.get_spot_snapshot(market)[['code', 'market'] + metrics])
+            except Exception as e:
+                print(f"   获取{market}行情快照失败，该市场不做初筛: {e}")
+
+        stocks = stock_list.drop(columns=[col for col in metrics if col in stock_list.columns])
+        if not frames:
+            return stocks.assign(**{col: np.nan for col in metrics})
+        snapshot = pd.concat(frames, ignore_index=True).drop_duplicates(['code', 'market'])
+        return stocks.merge(snapshot, on=['code', 'market'], how='left')
+
+    def prefilter(self, stock_list: pd.DataFrame) -> pd.DataFrame:
+        """
+        第一阶段：批量初筛
+
+        Args:
+            stock_list: 股票列表DataFrame，包含code和market列（可以是全市场）
+
+        Returns:
+            通过初筛的股票（附带快照指标），按成交额从高到低排列，每个市场最多 max_candidates 只
+        """
+        stocks = self.load_snapshot(stock_list)
+        if stocks.empty:
+            return stocks
+
+        amount = stocks['amount'].to_numpy(dtype=float)
+        market_cap = stocks['market_cap'].to_numpy(dtype=float)
+        pe = stocks['pe_ratio'].to_numpy(dtype=float)
+        pb = stocks['pb_ratio'].to_numpy(dtype=float)
+
+        # 缺失的指标不据此过滤（如港股快照没有市值时由第二阶段评分判断）
+        with np.errstate(invalid='ignore'):
+            keep = ~(market_cap < self.score_system.min_market_cap)
+            keep &= ~(amount < self.min_amount)
+            if self.pe_range is not None:
+                keep &= ~((pe <= self.pe_range[0]) | (pe > self.pe_range[1]))
+            if self.pb_range is not None:
+                keep &= ~((pb <= self.pb_range[0]) | (pb > self.pb_range[1]))
+
+        survivors = stocks[keep]
+        survivors = survivors.sort_values('amount', ascending=False, na_position='last', kind='stable')
+        return survivors.groupby('market', sort=False).head(self.max_candidates).reset_index(drop=True)
+
+    def screen(self, stock_list: pd.DataFrame, top_n: int = 20, workers: int = 8,
+               checkpoint: Optional[CheckpointStore] = None) -> pd.DataFrame:
+        """
+        两阶段选股
+
+        Args:
+            stock_list: 股票列表DataFrame，包含code、name和market列
+            top_n: 返回前N只股票
+            workers: 第二阶段并发获取数据的线程数
+            checkpoint: 第二阶段的断点记录（见 ScoreSystem.score_stocks）
+
+        Returns:
+            评分结果DataFrame（同 ScoreSystem.score_stocks）
+        """
+        print(f"   第一阶段：全市场批量初筛 {len(stock_list)} 只股票...")
+        candidates = self.prefilter(stock_list)
+        print(f"   通过初筛 {len(candidates)} 只（市值 >= {self.score_system.min_market_cap}亿，"
+              f"成交额 >= {self.min_amount / 1e8:.2f}亿，PE {self.pe_range}，PB {self.pb_range}，"
+              f"每个市场最多 {self.max_candidates} 只）")
+        if candidates.empty:
+            return pd.DataFrame()
+
+        print(f"   第二阶段：对 {len(candidates)} 只股票获取数据并评分...")
+        columns = [col for col in ('code', 'name', 'market') if col in candidates.columns]
+        return self.score_system.score_stocks(candidates[columns], top_n=top_n, workers=workers,
+                                              checkpoint=checkpoint)
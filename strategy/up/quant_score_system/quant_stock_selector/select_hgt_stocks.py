@@ -6,6 +6,7 @@ import os
 from datetime import datetime
 from data_fetcher import DataFetcher
 from score_system import ScoreSystem
+from screener import StagedScreener
 from trading_strategy import TradingStrategy
 
 
@@ -43,21 +44,6 @@ def main():
     
     print(f"   找到 {len(hgt_stocks)} 只港股/港股通股票")
     
-    # 如果股票太多，先筛选一部分（优先处理代码较短的主要股票）
-    if len(hgt_stocks) > 200:
-        print(f"\n   股票数量较多，先处理前200只进行评分...")
-        # 优先处理5位代码的股票（通常是主要股票）
-        hgt_stocks_5 = hgt_stocks[hgt_stocks['code'].str.len() == 5]
-        hgt_stocks_other = hgt_stocks[hgt_stocks['code'].str.len() != 5]
-        
-        if len(hgt_stocks_5) > 0:
-            if len(hgt_stocks_5) <= 200:
-                hgt_stocks = pd.concat([hgt_stocks_5, hgt_stocks_other.head(200 - len(hgt_stocks_5))])
-            else:
-                hgt_stocks = hgt_stocks_5.head(200)
-        else:
-            hgt_stocks = hgt_stocks.head(200)
-    
     # 评分选股
     print("\n5. 开始评分选股...")
     print("   评分标准：")
@@ -65,9 +51,10 @@ def main():
     print("   - 成长性（30%）：营收增长率、利润增长率")
     print("   - 波动率（20%）：适合趋势策略的波动率范围")
     print("   - 市值（20%）：市值大于50亿")
-    print(f"\n   正在对 {len(hgt_stocks)} 只股票进行评分，请耐心等待...")
     
-    scored_stocks = score_system.score_stocks(hgt_stocks, top_n=10)
+    # 两阶段选股：先用港股行情快照对全部港股通股票批量初筛，只对通过初筛的股票逐只获取数据评分
+    screener = StagedScreener(data_fetcher, score_system)
+    scored_stocks = screener.screen(hgt_stocks, top_n=10)
     
     if scored_stocks.empty:
         print("\n   未找到符合条件的股票")
@@ -4,6 +4,8 @@
 import pandas as pd
 import os
 from datetime import datetime
+from typing import Optional
+from checkpoint import CheckpointStore
 from data_fetcher import DataFetcher
 from score_system import ScoreSystem
 from trading_strategy import TradingStrategy
@@ -44,12 +46,24 @@ COMMON_HGT_STOCKS = [
 ]
 
 
-def main():
-    """港股通选股主函数"""
+# 回测结果中记录到断点的字段
+BACKTEST_FIELDS = ['total_return', 'win_rate', 'total_trades', 'avg_profit', 'max_profit', 'max_loss']
+
+
+def main(checkpoint: Optional[CheckpointStore] = None):
+    """
+    港股通选股主函数
+    
+    Args:
+        checkpoint: 断点记录，默认为当天的记录（同一天内中断后重新运行会跳过已完成的股票）
+    """
     print("=" * 60)
     print("港股通选股系统 - 上升趋势策略")
     print("=" * 60)
     
+    if checkpoint is None:
+        checkpoint = CheckpointStore.for_today('hgt_manual')
+    
     # 初始化组件
     print("\n1. 初始化数据获取器...")
     data_fetcher = DataFetcher()
@@ -80,7 +94,7 @@ def main():
     print(f"\n   正在对 {len(hgt_stocks)} 只股票进行评分，请耐心等待...")
     print("   注意：数据获取可能需要较长时间，请耐心等待...")
     
-    scored_stocks = score_system.score_stocks(hgt_stocks, top_n=10)
+    scored_stocks = score_system.score_stocks(hgt_stocks, top_n=10, checkpoint=checkpoint)
     
     if scored_stocks.empty:
         print("\n   未找到符合条件的股票")
@@ -122,23 +136,30 @@ def main():
     print("=" * 140)
     
     backtest_results = []
+    recorded = checkpoint.completed('backtest')
     
     for idx, row in scored_stocks.iterrows():
         code = row['code']
         market = row['market']
         name = row['name']
         
-        print(f"\n回测 {code} ({name})...")
-        
-        # 获取K线数据
-        kline_df = data_fetcher.get_stock_kline(code, market, period='daily')
-        
-        if kline_df.empty or len(kline_df) < 60:  # 至少需要60个交易日
-            print(f"  K线数据不足（仅{len(kline_df)}条），跳过")
-            continue
-        
-        # 回测
-        result = strategy.backtest(kline_df, initial_capital=100000)
+        result = recorded.get((str(code), str(market)))
+        if result is not None:
+            print(f"\n回测 {code} ({name})...（使用断点记录）")
+        else:
+            print(f"\n回测 {code} ({name})...")
+            
+            # 获取K线数据
+            kline_df = data_fetcher.get_stock_kline(code, market, period='daily')
+            
+            if kline_df.empty or len(kline_df) < 60:  # 至少需要60个交易日
+                print(f"  K线数据不足（仅{len(kline_df)}条），跳过")
+                continue
+            
+            # 回测
+            result = strategy.backtest(kline_df, initial_capital=100000)
+            if result:
+                checkpoint.record('backtest', code, market, {field: result[field] for field in BACKTEST_FIELDS})
         
         if result:
             backtest_results.append({
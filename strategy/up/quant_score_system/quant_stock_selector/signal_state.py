@@ -0,0 +1,220 @@
+"""
+增量信号模块 - 持久化每只股票的策略状态（最后有效K线、持仓、最新信号），
+每天收盘后只用全市场行情快照中的当日K线更新状态，输出信号发生变化的股票
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_fetcher import DataFetcher
+from trading_strategy import TradingStrategy
+
+
+DEFAULT_SIGNAL_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output', 'signal_state.db')
+
+
+def _same_price(a: float, b: float) -> bool:
+    """两个价格是否相同（容忍不同接口的小数位差异）"""
+    return bool(np.isclose(a, b, rtol=1e-4, atol=1e-3))
+
+
+class SignalStateStore:
+    """
+    每只股票的策略状态（TradingStrategy.update_state 返回的字典），键为 (代码, 市场)
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_SIGNAL_STATE_PATH):
+        """
+        Args:
+            path: SQLite 数据库路径，为None时只保存在内存中
+        """
+        self.path = path or ':memory:'
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS signal_state (
+                code TEXT NOT NULL,
+                market TEXT NOT NULL,
+                last_date TEXT NOT NULL,
+                signal TEXT,
+                payload TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (code, market)
+            )
+        """)
+        self._conn.commit()
+
+    def load_all(self) -> Dict:
+        """
+        Returns:
+            {(代码, 市场): 状态字典}
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT code, market, payload FROM signal_state").fetchall()
+        return {(code, market): json.loads(payload) for code, market, payload in rows}
+
+    def save_all(self, states: Dict, signals: Optional[Dict] = None):
+        """
+        批量保存状态（一个事务）
+
+        Args:
+            states: {(代码, 市场): 状态字典}
+            signals: {(代码, 市场): 信号文字}，只用于直接查看数据库
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        signals = signals or {}
+        rows = [(str(code), str(market), state['last_date'], signals.get((code, market)),
+                 json.dumps(state, ensure_ascii=False), now)
+                for (code, market), state in states.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO signal_state (code, market, last_date, signal, payload, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def clear(self):
+        """清除全部状态（下次更新时全部用历史K线重建）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM signal_state")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class IncrementalSignals:
+    """
+    每日增量更新交易信号
+
+    - 已有状态的股票：每个市场只请求一次行情快照，把当日K线（最高、最低、最新价）应用到状态上，
+      不再获取历史K线、不再重新过滤整段K线
+    - 没有状态的股票，或快照中的昨收与状态中最后一根K线的收盘价不一致（除权导致前复权价格变化、
+      中间漏了交易日）的股票：获取历史K线重建状态
+    - 快照中的当日K线与状态中最后一根K线相同（非交易日运行）时不更新
+
+    当日K线以运行日期记录，应在收盘后运行；盘中运行会把未走完的K线当作当日K线。
+    """
+
+    def __init__(self, data_fetcher: DataFetcher, strategy: TradingStrategy,
+                 store: Optional[SignalStateStore] = None):
+        """
+        Args:
+            data_fetcher: 数据获取器实例
+            strategy: 交易策略实例
+            store: 状态存储，默认为 output/signal_state.db
+        """
+        self.data_fetcher = data_fetcher
+        self.strategy = strategy
+        self.store = store if store is not None else SignalStateStore()
+
+    def _snapshot_bars(self, markets) -> Dict:
+        """各市场行情快照中的当日K线 {(代码, 市场): 行字典}，获取失败的市场没有记录"""
+        bars = {}
+        for market in markets:
+            try:
+                frame = self.data_fetcher.get_spot_snapshot(market)
+            except Exception as e:
+                print(f"   获取{market}行情快照失败，该市场全部用历史K线重建: {e}")
+                continue
+            frame = frame.dropna(subset=['price', 'high', 'low'])
+            bars.update({(code, market): row for code, row in zip(frame['code'], frame.to_dict('records'))})
+        return bars
+
+    def _rebuild(self, code: str, market: str) -> Optional[dict]:
+        """获取历史K线重建状态"""
+        kline_df = self.data_fetcher.get_stock_kline(code, market, period='daily')
+        return self.strategy.update_state(None, kline_df)
+
+    def update(self, stock_list: pd.DataFrame, rebuild: bool = False, workers: int = 8) -> pd.DataFrame:
+        """
+        更新股票列表中所有股票的信号并保存状态
+
+        Args:
+            stock_list: 股票列表DataFrame，包含code和market列（name列可选）
+            rebuild: 是否忽略已保存的状态，全部用历史K线重建
+            workers: 重建状态时并发获取K线的线程数
+
+        Returns:
+            每只股票一行：code, name, market, date, signal, previous_signal, changed, position, price, high, low；
+            changed 表示信号与上次运行不同（新加入的股票没有上次的信号，changed 为 False）
+        """
+        start_time = time.time()
+        today = datetime.now().strftime('%Y-%m-%d')
+        saved = {} if rebuild else self.store.load_all()
+        bars = self._snapshot_bars(stock_list['market'].unique())
+
+        states = {}
+        pending = []
+        applied = 0
+        for code, market in zip(stock_list['code'].astype(str), stock_list['market']):
+            key = (code, market)
+            state = saved.get(key)
+            bar = bars.get(key)
+            if state is None or bar is None:
+                pending.append(key)
+                continue
+
+            high, low, close = state['last_bar']
+            if state['last_date'] >= today or (_same_price(bar['high'], high) and _same_price(bar['low'], low)
+                                               and _same_price(bar['price'], close)):
+                states[key] = state  # 今天已经更新过，或非交易日（快照仍是上一交易日的K线）
+            elif _same_price(bar['prev_close'], close):
+                states[key] = self.strategy.apply_bar(state, today, bar['high'], bar['low'], bar['price'])
+                applied += 1
+            else:
+                pending.append(key)  # 除权或漏了交易日，状态与最新的前复权K线不再衔接
+
+        if pending:
+            print(f"   用历史K线重建 {len(pending)} 只股票的状态...")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(self._rebuild, code, market): (code, market) for code, market in pending}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        state = future.result()
+                    except Exception as e:
+                        print(f"   重建 {key[0]} 状态失败: {e}")
+                        state = None
+                    if state is not None:
+                        states[key] = state
+
+        names = dict(zip(zip(stock_list['code'].astype(str), stock_list['market']),
+                         stock_list['name'] if 'name' in stock_list.columns else [None] * len(stock_list)))
+        rows = []
+        labels = {}
+        for key, state in states.items():
+            signal = self.strategy.state_signal(state)
+            labels[key] = signal['signal']
+            previous = self.strategy.state_signal(saved[key])['signal'] if key in saved else None
+            rows.append({
+                'code': key[0],
+                'name': names.get(key),
+                'market': key[1],
+                'date': signal.get('date'),
+                'signal': signal['signal'],
+                'previous_signal': previous,
+                'changed': previous is not None and previous != signal['signal'],
+                'position': signal['position'],
+                'price': signal.get('price'),
+                'high': signal.get('high'),
+                'low': signal.get('low'),
+            })
+        self.store.save_all(states, labels)
+
+        result_df = pd.DataFrame(rows, columns=['code', 'name', 'market', 'date', 'signal', 'previous_signal',
+                                                'changed', 'position', 'price', 'high', 'low'])
+        elapsed = time.time() - start_time
+        print(f"   信号更新完成: {len(states)} 只股票（快照增量更新 {applied} 只，重建 {len(pending)} 只），"
+              f"信号变化 {int(result_df['changed'].sum())} 只，用时 {elapsed:.1f} 秒")
+        return result_df
@@ -1,11 +1,16 @@
 """
 交易策略模块 - 实现上升趋势策略
 """
+import os
+import sys
 import pandas as pd
 import numpy as np
 from typing import List, Tuple, Optional
 from enum import Enum
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from kline_engine import SINGLE, effective_bars, position_states
+
 
 class Signal(Enum):
     """交易信号"""
@@ -14,6 +19,34 @@ class Signal(Enum):
     IGNORE = "忽略"  # 被包含或包含前一日
 
 
+# 计算时信号用int8编码，只在输出时映射为中文（SIGNAL_LABELS[编码]）
+IGNORE_CODE, HOLD_CODE, SELL_CODE = 0, 1, 2
+SIGNAL_LABELS = np.array([Signal.IGNORE.value, Signal.HOLD.value, Signal.SELL.value], dtype=object)
+
+
+def signal_codes(highs: np.ndarray, lows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    向量化生成信号编码和持仓状态（规则见 TradingStrategy.generate_signals）
+    
+    Args:
+        highs, lows: 过滤后K线的高点、低点数组
+        
+    Returns:
+        (signal_code int8数组, position 布尔数组)
+    """
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    # 第一根K线没有前一日，不产生买卖条件
+    up = np.concatenate([[False], highs[1:] > highs[:-1]])
+    down = np.concatenate([[False], lows[1:] < lows[:-1]])
+    
+    # 空仓时高点创新高则持有，持仓时跌破前一日低点则清仓
+    position = position_states(up, down, holding=False)
+    position_before = np.concatenate([[False], position[:-1]])
+    codes = np.where(position, HOLD_CODE, np.where(position_before, SELL_CODE, IGNORE_CODE)).astype(np.int8)
+    return codes, position
+
+
 class TradingStrategy:
     """上升趋势交易策略"""
     
@@ -41,32 +74,10 @@ class TradingStrategy:
         df = kline_df.copy()
         df = df.sort_values('date').reset_index(drop=True)
         
-        valid_indices = [0]  # 第一根K线总是有效
+        # 第一根K线总是有效；当日包住前一日时只移除前一日，不再与更早的K线比较
+        valid = effective_bars(df['high'].to_numpy(), df['low'].to_numpy(), SINGLE)['valid']
         
-        for i in range(1, len(df)):
-            prev_idx = valid_indices[-1]
-            prev_high = df.loc[prev_idx, 'high']
-            prev_low = df.loc[prev_idx, 'low']
-            
-            curr_high = df.loc[i, 'high']
-            curr_low = df.loc[i, 'low']
-            
-            # 情况1: 当日K线被前一日包含（当日高低点都在前一日范围内）
-            if curr_high <= prev_high and curr_low >= prev_low:
-                # 忽略当日K线，继续下一根
-                continue
-            
-            # 情况2: 当日K线包含前一日K线（当日高低点包住前一日）
-            elif curr_high >= prev_high and curr_low <= prev_low:
-                # 移除前一日K线，保留当日K线
-                valid_indices.pop()
-                valid_indices.append(i)
-            
-            # 情况3: 正常K线，都保留
-            else:
-                valid_indices.append(i)
-        
-        filtered_df = df.loc[valid_indices].reset_index(drop=True)
+        filtered_df = df.iloc[np.flatnonzero(valid)].reset_index(drop=True)
         return filtered_df
     
     def generate_signals(self, kline_df: pd.DataFrame) -> pd.DataFrame:
@@ -89,45 +100,9 @@ class TradingStrategy:
         df = kline_df.copy()
         df = df.sort_values('date').reset_index(drop=True)
         
-        signals = []
-        positions = []  # 持仓状态
-        
-        # 第一根K线，默认不持仓
-        signals.append(Signal.IGNORE.value)
-        positions.append(False)
-        
-        for i in range(1, len(df)):
-            prev_high = df.loc[i-1, 'high']
-            prev_low = df.loc[i-1, 'low']
-            curr_high = df.loc[i, 'high']
-            curr_low = df.loc[i, 'low']
-            
-            # 检查是否持仓
-            is_holding = positions[-1] if positions else False
-            
-            if is_holding:
-                # 如果持仓，检查是否跌破前一日低点
-                if curr_low < prev_low:
-                    signals.append(Signal.SELL.value)
-                    positions.append(False)
-                # 检查高点是否越来越高
-                elif curr_high > prev_high:
-                    signals.append(Signal.HOLD.value)
-                    positions.append(True)
-                else:
-                    # 高点没有创新高，但也没跌破，继续持有
-                    signals.append(Signal.HOLD.value)
-                    positions.append(True)
-            else:
-                # 如果未持仓，检查是否高点越来越高（买入信号）
-                if curr_high > prev_high:
-                    signals.append(Signal.HOLD.value)
-                    positions.append(True)
-                else:
-                    signals.append(Signal.IGNORE.value)
-                    positions.append(False)
-        
-        df['signal'] = signals
+        codes, positions = signal_codes(df['high'].to_numpy(), df['low'].to_numpy())
+        df['signal_code'] = codes
+        df['signal'] = SIGNAL_LABELS[codes]
         df['position'] = positions
         
         return df
@@ -158,18 +133,22 @@ class TradingStrategy:
         if signal_df.empty:
             return {}
         
-        # 执行回测
+        # 执行回测：持仓状态变化的K线就是买卖点（空仓时第一个持有信号买入，清仓信号卖出）
+        codes = signal_df['signal_code'].to_numpy()
+        closes = signal_df['close'].to_numpy()
+        events = np.flatnonzero(codes != np.concatenate([[IGNORE_CODE], codes[:-1]]))
+        events = events[(codes[events] == SELL_CODE) | (codes[events] == HOLD_CODE)]
+        
         capital = initial_capital
         position = 0  # 持仓数量
         entry_price = 0  # 入场价格
         trades = []  # 交易记录
         
-        for i in range(len(signal_df)):
-            signal = signal_df.loc[i, 'signal']
-            price = signal_df.loc[i, 'close']
-            date = signal_df.loc[i, 'date']
+        for i in events:
+            price = closes[i]
+            date = signal_df['date'].iloc[i]
             
-            if signal == Signal.HOLD.value and position == 0:
+            if codes[i] == HOLD_CODE and position == 0:
                 # 买入
                 position = capital / price
                 entry_price = price
@@ -180,7 +159,7 @@ class TradingStrategy:
                     'price': price,
                     'shares': position
                 })
-            elif signal == Signal.SELL.value and position > 0:
+            elif codes[i] == SELL_CODE and position > 0:
                 # 卖出
                 capital = position * price
                 profit = (price - entry_price) * position
@@ -199,7 +178,7 @@ class TradingStrategy:
         # 计算最终收益
         if position > 0:
             # 如果最后还持仓，按最后价格计算
-            final_price = signal_df.iloc[-1]['close']
+            final_price = closes[-1]
             final_capital = position * final_price
         else:
             final_capital = capital
@@ -241,6 +220,137 @@ class TradingStrategy:
             'signal_df': signal_df
         }
     
+    def update_state(self, state: Optional[dict], kline_df: pd.DataFrame) -> Optional[dict]:
+        """
+        增量更新策略状态：只处理 state['last_date'] 之后的K线，state为None时用整段K线建立状态
+        
+        状态只保存最后两根有效K线（当日包住前一日时只移除最后一根有效K线，再与倒数第二根比较，
+        更早的K线不再影响信号）、各自的持仓状态和最新信号，可以JSON序列化后持久化（见 signal_state.py）。
+        从同一段K线开始逐日更新的结果与对整段K线调用 get_current_signal 相同。
+        
+        Args:
+            state: 之前的状态，为None时重新建立
+            kline_df: K线数据（只需要包含 last_date 之后的新K线）
+            
+        Returns:
+            更新后的状态字典（没有K线时原样返回）
+        """
+        if kline_df.empty:
+            return state
+        df = kline_df.sort_values('date')
+        if state is None:
+            return self._build_state(df)
+        
+        df = df[df['date'] > pd.Timestamp(state['last_date'])]
+        for date, high, low, close in zip(df['date'], df['high'].to_numpy(dtype=float),
+                                          df['low'].to_numpy(dtype=float), df['close'].to_numpy(dtype=float)):
+            state = self.apply_bar(state, date, high, low, close)
+        return state
+    
+    def _build_state(self, df: pd.DataFrame) -> dict:
+        """用整段K线一次性建立状态（批量过滤K线、生成信号后取最后两根有效K线）"""
+        highs = df['high'].to_numpy(dtype=float)
+        lows = df['low'].to_numpy(dtype=float)
+        closes = df['close'].to_numpy(dtype=float)
+        dates = df['date'].to_numpy()
+        
+        valid = np.flatnonzero(effective_bars(highs, lows, SINGLE)['valid'])
+        codes, positions = signal_codes(highs[valid], lows[valid])
+        top = valid[-1]
+        state = {
+            'last_date': pd.Timestamp(dates[-1]).strftime('%Y-%m-%d'),
+            'last_bar': [float(highs[-1]), float(lows[-1]), float(closes[-1])],
+            'bars': len(valid),
+            'top': {
+                'date': pd.Timestamp(dates[top]).strftime('%Y-%m-%d'),
+                'high': float(highs[top]),
+                'low': float(lows[top]),
+                'close': float(closes[top]),
+                'position': bool(positions[-1]),
+                'signal_code': int(codes[-1]),
+            },
+            'prev': None,
+        }
+        if len(valid) >= 2:
+            prev = valid[-2]
+            state['prev'] = {'high': float(highs[prev]), 'low': float(lows[prev]), 'position': bool(positions[-2])}
+        return state
+    
+    def apply_bar(self, state: dict, date, high: float, low: float, close: float) -> dict:
+        """
+        把一根新K线应用到状态上（规则同 filter_kline 和 generate_signals）
+        
+        Args:
+            state: 当前状态（不会被修改）
+            date: 新K线日期
+            high, low, close: 新K线最高价、最低价、收盘价
+            
+        Returns:
+            新的状态字典
+        """
+        state = dict(state, last_date=pd.Timestamp(date).strftime('%Y-%m-%d'),
+                     last_bar=[float(high), float(low), float(close)])
+        top = state['top']
+        
+        # 被最后一根有效K线包含：忽略当日K线，信号不变
+        if high <= top['high'] and low >= top['low']:
+            return state
+        
+        if high >= top['high'] and low <= top['low']:
+            # 包住最后一根有效K线：移除它，当日K线与倒数第二根有效K线比较
+            base = state['prev']
+            bars = state['bars']
+        else:
+            base = {'high': top['high'], 'low': top['low'], 'position': top['position']}
+            bars = state['bars'] + 1
+        
+        if base is None:
+            position, code = False, IGNORE_CODE
+        else:
+            up = bool(high > base['high'])
+            down = bool(low < base['low'])
+            if up != down:
+                position = up
+            else:
+                # 同时创新高和跌破前一日低点时，持仓则清仓、空仓则买入
+                position = not base['position'] if up else base['position']
+            code = HOLD_CODE if position else (SELL_CODE if base['position'] else IGNORE_CODE)
+        
+        state['top'] = {
+            'date': state['last_date'],
+            'high': float(high),
+            'low': float(low),
+            'close': float(close),
+            'position': position,
+            'signal_code': code,
+        }
+        state['prev'] = base
+        state['bars'] = bars
+        return state
+    
+    def state_signal(self, state: Optional[dict]) -> dict:
+        """
+        状态对应的当前信号（格式同 get_current_signal）
+        
+        Args:
+            state: update_state 返回的状态
+            
+        Returns:
+            当前信号字典
+        """
+        if state is None or state['bars'] < 2:
+            return {'signal': '无数据', 'position': False}
+        
+        top = state['top']
+        return {
+            'signal': SIGNAL_LABELS[top['signal_code']],
+            'position': top['position'],
+            'date': pd.Timestamp(top['date']),
+            'price': top['close'],
+            'high': top['high'],
+            'low': top['low']
+        }
+    
     def get_current_signal(self, kline_df: pd.DataFrame) -> dict:
         """
         获取当前交易信号
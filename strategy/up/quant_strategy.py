@@ -8,6 +8,7 @@
 3. K线包含处理：被包含的K线忽略，后续判断不考虑忽略的K线
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import akshare as ak
@@ -15,136 +16,22 @@ from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
-
-class KlineProcessor:
-    """K线包含处理类"""
-    
-    def __init__(self):
-        self.klines = []
-        self.ignored_indices = set()  # 被忽略的K线索引
-    
-    def add_kline(self, date, high, low, open_price, close):
-        """添加K线数据"""
-        kline = {
-            'date': date,
-            'high': float(high),
-            'low': float(low),
-            'open': float(open_price),
-            'close': float(close),
-            'ignored': False
-        }
-        self.klines.append(kline)
-        self.process_containment()
-    
-    def is_contained(self, k1, k2):
-        """判断K线是否包含关系
-        k1被k2包含：k1.high <= k2.high and k1.low >= k2.low
-        k2被k1包含：k1.high >= k2.high and k1.low <= k2.low
-        """
-        return (k1['high'] <= k2['high'] and k1['low'] >= k2['low']) or \
-               (k1['high'] >= k2['high'] and k1['low'] <= k2['low'])
-    
-    def find_prev_valid_kline(self, current_index):
-        """找到前一根有效的（未被忽略的）K线"""
-        for i in range(current_index - 1, -1, -1):
-            if i not in self.ignored_indices:
-                return i
-        return -1
-    
-    def process_containment(self):
-        """处理K线包含关系"""
-        if len(self.klines) < 2:
-            return
-        
-        processed = True
-        while processed:
-            processed = False
-            for i in range(1, len(self.klines)):
-                if i in self.ignored_indices:
-                    continue
-                
-                prev_index = self.find_prev_valid_kline(i)
-                if prev_index == -1:
-                    continue
-                
-                current = self.klines[i]
-                previous = self.klines[prev_index]
-                
-                if self.is_contained(current, previous):
-                    # 判断谁包含谁
-                    if current['high'] <= previous['high'] and current['low'] >= previous['low']:
-                        # 当前K线被前一根包含，忽略当前K线
-                        self.ignored_indices.add(i)
-                        print(f"  K线 {current['date']} 被前一根包含，已忽略")
-                    else:
-                        # 前一根K线被当前K线包含，忽略前一根
-                        self.ignored_indices.add(prev_index)
-                        print(f"  前一根K线 {previous['date']} 被当前K线包含，已忽略")
-                    processed = True
-                    break
-    
-    def get_valid_klines(self):
-        """获取所有有效的（未被忽略的）K线"""
-        return [kline for i, kline in enumerate(self.klines) if i not in self.ignored_indices]
+from kline_processor import BreakoutStrategy
+from event_log import DEBUG, INFO, EventLog
 
 
-class TradingStrategy:
-    """交易策略类"""
+class TradingStrategy(BreakoutStrategy):
+    """交易策略类（K线处理、买卖规则与交易记录见 kline_processor.BreakoutStrategy）"""
     
-    def __init__(self):
-        self.processor = KlineProcessor()
-        self.holding = False  # 是否持仓
-        self.entry_price = 0  # 入场价格
-        self.trades = []  # 交易记录
+    def __init__(self, verbose=True, log=None):
+        """
+        Args:
+            verbose: 是否逐根输出被忽略的K线和每笔交易（未指定log时生效）
+            log: EventLog；不输出时交易事件仍记录在 log 的环形缓冲区中，只在查看时格式化
+        """
+        super().__init__(log if log is not None else EventLog(DEBUG if verbose else INFO, echo=verbose))
         self.equity_curve = []  # 权益曲线
     
-    def add_kline(self, date, high, low, open_price, close):
-        """添加K线并执行策略"""
-        self.processor.add_kline(date, high, low, open_price, close)
-        self.execute_strategy()
-    
-    def execute_strategy(self):
-        """执行交易策略"""
-        valid_klines = self.processor.get_valid_klines()
-        
-        if len(valid_klines) < 2:
-            return
-        
-        # 获取最后两根有效K线
-        current = valid_klines[-1]
-        previous = valid_klines[-2]
-        
-        # 策略1：如果高点越来越高就持有
-        if current['high'] > previous['high']:
-            if not self.holding:
-                # 买入
-                self.holding = True
-                self.entry_price = current['high']
-                self.trades.append({
-                    'date': current['date'],
-                    'action': 'BUY',
-                    'price': self.entry_price,
-                    'reason': f"高点突破: {current['high']:.2f} > {previous['high']:.2f}"
-                })
-                print(f"  [{current['date']}] 买入 @ {self.entry_price:.2f} - {self.trades[-1]['reason']}")
-        
-        # 策略2：如果跌破前一日低点就清仓
-        if self.holding and current['low'] < previous['low']:
-            # 卖出
-            exit_price = current['low']
-            profit = ((exit_price - self.entry_price) / self.entry_price) * 100
-            self.holding = False
-            self.trades.append({
-                'date': current['date'],
-                'action': 'SELL',
-                'price': exit_price,
-                'entry_price': self.entry_price,
-                'profit': profit,
-                'reason': f"跌破前低: {current['low']:.2f} < {previous['low']:.2f}"
-            })
-            print(f"  [{current['date']}] 卖出 @ {exit_price:.2f} - 收益率: {profit:.2f}% - {self.trades[-1]['reason']}")
-            self.entry_price = 0
-    
     def get_statistics(self):
         """获取策略统计信息"""
         if not self.trades:
@@ -315,39 +202,20 @@ def generate_mock_data():
     return df
 
 
-def backtest_strategy(df):
-    """回测策略"""
+def backtest_strategy(df, verbose=True):
+    """回测策略（verbose为False时不输出逐K线日志）"""
     print("\n" + "="*60)
     print("开始回测策略...")
     print("="*60)
     
-    strategy = TradingStrategy()
+    strategy = TradingStrategy(verbose=verbose)
     
-    # 逐日处理K线
-    for idx, row in df.iterrows():
-        strategy.add_kline(
-            date=row['date'],
-            high=row['high'],
-            low=row['low'],
-            open_price=row['open'],
-            close=row['close']
-        )
+    # 整段K线一次处理（逐根实盘使用add_kline，结果一致）
+    strategy.add_klines(df['date'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+                        df['open'].to_numpy(), df['close'].to_numpy())
     
     # 如果最后还持仓，以最后收盘价卖出
-    if strategy.holding:
-        last_kline = strategy.processor.get_valid_klines()[-1]
-        exit_price = last_kline['close']
-        profit = ((exit_price - strategy.entry_price) / strategy.entry_price) * 100
-        strategy.trades.append({
-            'date': last_kline['date'],
-            'action': 'SELL',
-            'price': exit_price,
-            'entry_price': strategy.entry_price,
-            'profit': profit,
-            'reason': '回测结束，强制平仓'
-        })
-        print(f"\n  [{last_kline['date']}] 回测结束，强制平仓 @ {exit_price:.2f} - 收益率: {profit:.2f}%")
-        strategy.holding = False
+    strategy.close_position()
     
     return strategy
 
@@ -361,8 +229,8 @@ def print_results(strategy, df):
     print("="*60)
     print(f"回测期间: {df['date'].min()} 至 {df['date'].max()}")
     print(f"总交易日: {len(df)} 天")
-    print(f"有效K线数: {len(strategy.processor.get_valid_klines())} 根")
-    print(f"忽略K线数: {len(strategy.processor.ignored_indices)} 根")
+    print(f"有效K线数: {strategy.processor.valid_count} 根")
+    print(f"忽略K线数: {strategy.processor.ignored_count} 根")
     print(f"\n交易统计:")
     print(f"  总交易次数: {stats['total_trades']} 次")
     print(f"  盈利次数: {stats['win_trades']} 次")
@@ -390,6 +258,10 @@ def print_results(strategy, df):
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='中国平安量化策略回测系统')
+    parser.add_argument('--quiet', action='store_true', help='不输出逐K线和逐笔交易日志')
+    args = parser.parse_args()
+    
     print("="*60)
     print("中国平安量化策略回测系统")
     print("="*60)
@@ -402,7 +274,7 @@ def main():
         return
     
     # 回测策略
-    strategy = backtest_strategy(df)
+    strategy = backtest_strategy(df, verbose=not args.quiet)
     
     # 打印结果
     print_results(strategy, df)
@@ -15,6 +15,9 @@ from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+from kline_processor import BreakoutStrategy
+from event_log import INFO, EventLog
+
 # 尝试导入matplotlib用于可视化（可选）
 try:
     import matplotlib.pyplot as plt
@@ -25,129 +28,16 @@ except ImportError:
     print("提示: 安装 matplotlib 可以查看可视化图表: pip install matplotlib")
 
 
-class KlineProcessor:
-    """K线包含处理类"""
-    
-    def __init__(self):
-        self.klines = []
-        self.ignored_indices = set()
-    
-    def add_kline(self, date, high, low, open_price, close):
-        """添加K线数据"""
-        kline = {
-            'date': date,
-            'high': float(high),
-            'low': float(low),
-            'open': float(open_price),
-            'close': float(close),
-            'ignored': False
-        }
-        self.klines.append(kline)
-        self.process_containment()
-    
-    def is_contained(self, k1, k2):
-        """判断K线是否包含关系"""
-        return (k1['high'] <= k2['high'] and k1['low'] >= k2['low']) or \
-               (k1['high'] >= k2['high'] and k1['low'] <= k2['low'])
+class TradingStrategy(BreakoutStrategy):
+    """交易策略类（K线处理、买卖规则与交易记录见 kline_processor.BreakoutStrategy）"""
     
-    def find_prev_valid_kline(self, current_index):
-        """找到前一根有效的K线"""
-        for i in range(current_index - 1, -1, -1):
-            if i not in self.ignored_indices:
-                return i
-        return -1
-    
-    def process_containment(self, verbose=False):
-        """处理K线包含关系"""
-        if len(self.klines) < 2:
-            return
-        
-        processed = True
-        while processed:
-            processed = False
-            for i in range(1, len(self.klines)):
-                if i in self.ignored_indices:
-                    continue
-                
-                prev_index = self.find_prev_valid_kline(i)
-                if prev_index == -1:
-                    continue
-                
-                current = self.klines[i]
-                previous = self.klines[prev_index]
-                
-                if self.is_contained(current, previous):
-                    if current['high'] <= previous['high'] and current['low'] >= previous['low']:
-                        self.ignored_indices.add(i)
-                        if verbose:
-                            print(f"  K线 {current['date']} 被前一根包含，已忽略")
-                    else:
-                        self.ignored_indices.add(prev_index)
-                        if verbose:
-                            print(f"  前一根K线 {previous['date']} 被当前K线包含，已忽略")
-                    processed = True
-                    break
-    
-    def get_valid_klines(self):
-        """获取所有有效的K线"""
-        return [kline for i, kline in enumerate(self.klines) if i not in self.ignored_indices]
-
-
-class TradingStrategy:
-    """交易策略类"""
-    
-    def __init__(self, verbose=True):
-        self.processor = KlineProcessor()
-        self.holding = False
-        self.entry_price = 0
-        self.trades = []
-        self.verbose = verbose
-    
-    def add_kline(self, date, high, low, open_price, close):
-        """添加K线并执行策略"""
-        self.processor.add_kline(date, high, low, open_price, close)
-        self.execute_strategy()
-    
-    def execute_strategy(self):
-        """执行交易策略"""
-        valid_klines = self.processor.get_valid_klines()
-        
-        if len(valid_klines) < 2:
-            return
-        
-        current = valid_klines[-1]
-        previous = valid_klines[-2]
-        
-        # 策略1：高点越来越高就持有
-        if current['high'] > previous['high']:
-            if not self.holding:
-                self.holding = True
-                self.entry_price = current['high']
-                self.trades.append({
-                    'date': current['date'],
-                    'action': 'BUY',
-                    'price': self.entry_price,
-                    'reason': f"高点突破: {current['high']:.2f} > {previous['high']:.2f}"
-                })
-                if self.verbose:
-                    print(f"  [{current['date']}] 买入 @ {self.entry_price:.2f} - {self.trades[-1]['reason']}")
-        
-        # 策略2：跌破前一日低点就清仓
-        if self.holding and current['low'] < previous['low']:
-            exit_price = current['low']
-            profit = ((exit_price - self.entry_price) / self.entry_price) * 100
-            self.holding = False
-            self.trades.append({
-                'date': current['date'],
-                'action': 'SELL',
-                'price': exit_price,
-                'entry_price': self.entry_price,
-                'profit': profit,
-                'reason': f"跌破前低: {current['low']:.2f} < {previous['low']:.2f}"
-            })
-            if self.verbose:
-                print(f"  [{current['date']}] 卖出 @ {exit_price:.2f} - 收益率: {profit:.2f}% - {self.trades[-1]['reason']}")
-            self.entry_price = 0
+    def __init__(self, verbose=True, log=None):
+        """
+        Args:
+            verbose: 是否输出每笔交易（未指定log时生效），K线包含处理事件不输出也不记录
+            log: EventLog；不输出时交易事件仍记录在 log 的环形缓冲区中，只在查看时格式化
+        """
+        super().__init__(log if log is not None else EventLog(INFO, echo=verbose))
     
     def get_statistics(self):
         """获取策略统计信息"""
@@ -300,31 +190,11 @@ def backtest_strategy(df, verbose=True):
     
     strategy = TradingStrategy(verbose=verbose)
     
-    for idx, row in df.iterrows():
-        strategy.add_kline(
-            date=row['date'],
-            high=row['high'],
-            low=row['low'],
-            open_price=row['open'],
-            close=row['close']
-        )
+    strategy.add_klines(df['date'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+                        df['open'].to_numpy(), df['close'].to_numpy())
     
     # 强制平仓
-    if strategy.holding:
-        last_kline = strategy.processor.get_valid_klines()[-1]
-        exit_price = last_kline['close']
-        profit = ((exit_price - strategy.entry_price) / strategy.entry_price) * 100
-        strategy.trades.append({
-            'date': last_kline['date'],
-            'action': 'SELL',
-            'price': exit_price,
-            'entry_price': strategy.entry_price,
-            'profit': profit,
-            'reason': '回测结束，强制平仓'
-        })
-        if verbose:
-            print(f"\n  [{last_kline['date']}] 回测结束，强制平仓 @ {exit_price:.2f} - 收益率: {profit:.2f}%")
-        strategy.holding = False
+    strategy.close_position()
     
     return strategy
 
@@ -338,8 +208,8 @@ def print_results(strategy, df):
     print("="*60)
     print(f"回测期间: {df['date'].min()} 至 {df['date'].max()}")
     print(f"总交易日: {len(df)} 天")
-    print(f"有效K线数: {len(strategy.processor.get_valid_klines())} 根")
-    print(f"忽略K线数: {len(strategy.processor.ignored_indices)} 根")
+    print(f"有效K线数: {strategy.processor.valid_count} 根")
+    print(f"忽略K线数: {strategy.processor.ignored_count} 根")
     print(f"\n交易统计:")
     print(f"  总交易次数: {stats['total_trades']} 次")
     print(f"  盈利次数: {stats['win_trades']} 次")
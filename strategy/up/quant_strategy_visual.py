@@ -11,10 +11,14 @@ from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from kline_processor import BreakoutStrategy
+from event_log import DEBUG, INFO, EventLog
+
 try:
+    import matplotlib
+    matplotlib.use('Agg')  # 只保存图片，不需要交互式窗口
     import matplotlib.pyplot as plt
     import matplotlib.dates as mdates
-    from matplotlib.patches import Rectangle
     plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'DejaVu Sans']
     plt.rcParams['axes.unicode_minus'] = False
     HAS_PLOT = True
@@ -23,133 +27,77 @@ except ImportError:
     print("请先安装matplotlib: pip install matplotlib")
 
 
-class KlineProcessor:
-    """K线包含处理类"""
-    
-    def __init__(self):
-        self.klines = []
-        self.ignored_indices = set()
-    
-    def add_kline(self, date, high, low, open_price, close):
-        kline = {
-            'date': date,
-            'high': float(high),
-            'low': float(low),
-            'open': float(open_price),
-            'close': float(close),
-            'ignored': False
-        }
-        self.klines.append(kline)
-        self.process_containment()
-    
-    def is_contained(self, k1, k2):
-        return (k1['high'] <= k2['high'] and k1['low'] >= k2['low']) or \
-               (k1['high'] >= k2['high'] and k1['low'] <= k2['low'])
-    
-    def find_prev_valid_kline(self, current_index):
-        for i in range(current_index - 1, -1, -1):
-            if i not in self.ignored_indices:
-                return i
-        return -1
-    
-    def process_containment(self):
-        if len(self.klines) < 2:
-            return
-        
-        processed = True
-        while processed:
-            processed = False
-            for i in range(1, len(self.klines)):
-                if i in self.ignored_indices:
-                    continue
-                
-                prev_index = self.find_prev_valid_kline(i)
-                if prev_index == -1:
-                    continue
-                
-                current = self.klines[i]
-                previous = self.klines[prev_index]
-                
-                if self.is_contained(current, previous):
-                    if current['high'] <= previous['high'] and current['low'] >= previous['low']:
-                        self.ignored_indices.add(i)
-                    else:
-                        self.ignored_indices.add(prev_index)
-                    processed = True
-                    break
-    
-    def get_valid_klines(self):
-        return [kline for i, kline in enumerate(self.klines) if i not in self.ignored_indices]
-
-
-class TradingStrategy:
-    """交易策略类"""
-    
-    def __init__(self, verbose=False):
-        self.processor = KlineProcessor()
-        self.holding = False
-        self.entry_price = 0
-        self.trades = []
-        self.verbose = verbose
-        self.equity_curve = [100]  # 初始资金100
+class TradingStrategy(BreakoutStrategy):
+    """交易策略类（K线处理、买卖规则与交易记录见 kline_processor.BreakoutStrategy），另外记录收盘价用于权益曲线"""
+    
+    def __init__(self, verbose=False, log=None):
+        """
+        Args:
+            verbose: 是否逐根输出被忽略的K线和每笔交易（未指定log时生效）
+            log: EventLog；不输出时交易事件仍记录在 log 的环形缓冲区中，只在查看时格式化
+        """
+        super().__init__(log if log is not None else EventLog(DEBUG if verbose else INFO, echo=verbose))
         self.dates = []
+        self.closes = []
+        self.equity_curve = np.array([100.0])  # 每根K线收盘后的权益（初始=100），由 update_equity 计算
+        self.position = np.array([], dtype=bool)  # 每根K线收盘后是否持仓
+        self._equity_key = None  # 计算权益曲线时的 (K线数, 交易数)，变化后需要重新计算
     
     def add_kline(self, date, high, low, open_price, close):
-        self.processor.add_kline(date, high, low, open_price, close)
-        self.execute_strategy(date, close)
-    
-    def execute_strategy(self, date, close):
-        # 先更新日期和权益曲线
-        if len(self.dates) == 0:
-            self.dates.append(date)
-            self.equity_curve.append(100)
-        else:
-            self.dates.append(date)
-            # 更新权益曲线
-            if self.holding:
-                current_return = ((close - self.entry_price) / self.entry_price) * 100
-                self.equity_curve.append(self.equity_curve[-1] * (1 + current_return / 100))
-            else:
-                self.equity_curve.append(self.equity_curve[-1])
+        self.dates.append(date)
+        self.closes.append(close)
+        super().add_kline(date, high, low, open_price, close)
+    
+    def add_klines(self, dates, highs, lows, opens, closes):
+        """批量加入K线（回测用），买卖点与逐根加入完全一致"""
+        self.dates.extend(dates)
+        self.closes.extend(closes)
+        super().add_klines(dates, highs, lows, opens, closes)
+    
+    def update_equity(self, initial=100.0):
+        """
+        根据成交位置向量化计算权益曲线和持仓序列
         
-        valid_klines = self.processor.get_valid_klines()
+        持仓期间权益 = 开仓时权益 × 收盘价 / 开仓价（买入当日即按收盘价计算），卖出当日按卖出价结算，
+        空仓期间权益不变；同一根K线上买入又卖出时当日收盘后不持仓
         
-        if len(valid_klines) < 2:
-            return
+        Returns:
+            (equity_curve, position)：每根K线收盘后的权益和是否持仓
+        """
+        closes = np.asarray(self.closes, dtype=float)
+        n = len(closes)
+        buys = [t for t in self.trades if t['action'] == 'BUY']
+        sells = [t for t in self.trades if t['action'] == 'SELL']
+        buy_idx = np.array([t['index'] for t in buys], dtype=np.int64)
+        buy_price = np.array([t['price'] for t in buys], dtype=float)
+        sell_idx = np.array([t['index'] for t in sells], dtype=np.int64)
+        sell_price = np.array([t['price'] for t in sells], dtype=float)
         
-        current = valid_klines[-1]
-        previous = valid_klines[-2]
+        # 第k笔交易前已实现的权益：initial × 前k笔交易的收益倍数连乘
+        realized = initial * np.concatenate([[1.0], np.cumprod(sell_price / buy_price[:len(sell_idx)])])
         
-        # 买入信号
-        if current['high'] > previous['high']:
-            if not self.holding:
-                self.holding = True
-                self.entry_price = current['high']
-                self.trades.append({
-                    'date': current['date'],
-                    'action': 'BUY',
-                    'price': self.entry_price,
-                    'reason': f"高点突破"
-                })
+        bars = np.arange(n)
+        trade = np.searchsorted(buy_idx, bars, side='right') - 1  # 当日及之前最近一次买入是第几笔
+        open_until = np.concatenate([sell_idx, np.full(len(buy_idx) - len(sell_idx), n)])
+        safe_trade = np.maximum(trade, 0)
+        position = (trade >= 0) & (bars < open_until[safe_trade]) if len(buy_idx) else np.zeros(n, dtype=bool)
+        
+        if len(buy_idx):
+            holding_equity = realized[safe_trade] * closes / buy_price[safe_trade]
+        else:
+            holding_equity = np.full(n, initial)
+        flat_equity = realized[np.searchsorted(sell_idx, bars, side='right')]
         
-        # 卖出信号
-        if self.holding and current['low'] < previous['low']:
-            exit_price = current['low']
-            profit_pct = ((exit_price - self.entry_price) / self.entry_price) * 100
-            # 更新权益曲线（使用卖出价格）
-            if len(self.equity_curve) > 0:
-                self.equity_curve[-1] = self.equity_curve[-1] * (1 + profit_pct / 100)
-            
-            self.holding = False
-            self.trades.append({
-                'date': current['date'],
-                'action': 'SELL',
-                'price': exit_price,
-                'entry_price': self.entry_price,
-                'profit': profit_pct,
-                'reason': f"跌破前低"
-            })
-            self.entry_price = 0
+        self.position = position
+        self.equity_curve = np.where(position, holding_equity, flat_equity)
+        self._equity_key = (n, len(self.trades))
+        return self.equity_curve, self.position
+    
+    def refresh_equity(self):
+        """K线或交易有变化时重新计算权益曲线（逐根加入K线后读取权益前调用）"""
+        if self._equity_key != (len(self.closes), len(self.trades)):
+            self.update_equity()
+        return self.equity_curve
     
     def get_statistics(self):
         if not self.trades:
@@ -193,7 +141,7 @@ class TradingStrategy:
             'max_profit': max(profits) if profits else 0,
             'max_loss': min(profits) if profits else 0,
             'paired_trades': paired_trades,
-            'final_equity': self.equity_curve[-1]
+            'final_equity': float(self.refresh_equity()[-1])
         }
 
 
@@ -253,47 +201,97 @@ def fetch_stock_data(symbol='601318', start_date='20230101'):
         return None
 
 
-def plot_strategy_results(df, strategy):
-    """绘制策略结果"""
+def lttb_indices(x, y, threshold):
+    """
+    LTTB（Largest-Triangle-Three-Buckets）降采样，保留曲线形状的同时减少绘图点数
+    
+    Args:
+        x, y: 数值数组（x递增）
+        threshold: 目标点数
+    
+    Returns:
+        保留的点的下标（包含首尾两点）
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # 除首尾两点外平均分成 threshold-2 个桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的平均点（最后一个桶用终点）
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # 选与上一个选中点、下一个桶平均点构成三角形面积最大的点
+        area = np.abs((x[prev] - next_x) * (y[start:end] - y[prev]) -
+                      (x[prev] - x[start:end]) * (next_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def plot_strategy_results(df, strategy, max_points=2000):
+    """
+    绘制策略结果
+    
+    Args:
+        df: 回测用的K线数据
+        strategy: 已完成回测的TradingStrategy
+        max_points: 每条曲线最多绘制的点数，超过时用LTTB降采样
+    """
     if not HAS_PLOT:
         print("无法绘图：matplotlib未安装")
         return
     
     fig = plt.figure(figsize=(16, 12))
     
-    # 准备数据
-    dates = pd.to_datetime(df['date'])
-    valid_klines = strategy.processor.get_valid_klines()
-    valid_dates = [pd.to_datetime(k['date']) for k in valid_klines]
-    valid_highs = [k['high'] for k in valid_klines]
-    valid_lows = [k['low'] for k in valid_klines]
-    valid_closes = [k['close'] for k in valid_klines]
+    # 准备数据（日期统一为datetime64数组）
+    dates = np.asarray(df['date'], dtype='datetime64[D]')
+    closes = df['close'].to_numpy(dtype=float)
+    highs = df['high'].to_numpy(dtype=float)
+    lows = df['low'].to_numpy(dtype=float)
+    day_numbers = dates.astype(np.int64)
+    
+    valid = strategy.processor.valid_indices
+    valid_sample = valid[lttb_indices(day_numbers[valid], closes[valid], max_points)]
+    raw_sample = lttb_indices(day_numbers, closes, max_points)
     
     # 获取交易信号
     buy_signals = [t for t in strategy.trades if t['action'] == 'BUY']
     sell_signals = [t for t in strategy.trades if t['action'] == 'SELL']
-    buy_dates = [pd.to_datetime(t['date']) for t in buy_signals]
+    buy_dates = dates[[t['index'] for t in buy_signals]]
     buy_prices = [t['price'] for t in buy_signals]
-    sell_dates = [pd.to_datetime(t['date']) for t in sell_signals]
+    sell_dates = dates[[t['index'] for t in sell_signals]]
     sell_prices = [t['price'] for t in sell_signals]
     
     # 子图1：K线图和交易信号
     ax1 = plt.subplot(3, 1, 1)
     
     # 绘制有效K线
-    ax1.plot(valid_dates, valid_closes, 'b-', linewidth=1.5, label='收盘价', alpha=0.7)
-    ax1.fill_between(valid_dates, valid_lows, valid_highs, alpha=0.2, color='blue', label='价格区间')
+    ax1.plot(dates[valid_sample], closes[valid_sample], 'b-', linewidth=1.5, label='收盘价', alpha=0.7)
+    ax1.fill_between(dates[valid_sample], lows[valid_sample], highs[valid_sample],
+                     alpha=0.2, color='blue', label='价格区间')
     
     # 绘制所有K线（灰色，被忽略的）
-    ax1.plot(dates, df['close'], 'gray', linewidth=0.5, alpha=0.3, label='原始K线（部分被忽略）')
+    ax1.plot(dates[raw_sample], closes[raw_sample], 'gray', linewidth=0.5, alpha=0.3, label='原始K线（部分被忽略）')
     
     # 买入信号
-    if buy_dates:
+    if len(buy_dates):
         ax1.scatter(buy_dates, buy_prices, color='green', marker='^', s=150, 
                    zorder=5, label='买入信号', edgecolors='darkgreen', linewidths=2)
     
     # 卖出信号
-    if sell_dates:
+    if len(sell_dates):
         ax1.scatter(sell_dates, sell_prices, color='red', marker='v', s=150, 
                    zorder=5, label='卖出信号', edgecolors='darkred', linewidths=2)
     
@@ -302,18 +300,17 @@ def plot_strategy_results(df, strategy):
     ax1.legend(loc='upper left', fontsize=10)
     ax1.grid(True, alpha=0.3)
     ax1.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
-    ax1.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
+    ax1.xaxis.set_major_locator(mdates.AutoDateLocator())
     
     # 子图2：权益曲线
     ax2 = plt.subplot(3, 1, 2)
-    # 确保日期和权益曲线长度一致
-    equity_dates = pd.to_datetime(strategy.dates[:len(strategy.equity_curve)])
-    equity_values = strategy.equity_curve[:len(equity_dates)]
-    ax2.plot(equity_dates, equity_values, 'g-', linewidth=2, label='策略权益曲线')
+    equity = strategy.refresh_equity()
+    equity_sample = lttb_indices(day_numbers, equity, max_points)
+    ax2.plot(dates[equity_sample], equity[equity_sample], 'g-', linewidth=2, label='策略权益曲线')
     ax2.axhline(y=100, color='gray', linestyle='--', linewidth=1, label='初始资金')
     
     # 标注最终收益
-    final_return = (strategy.equity_curve[-1] - 100) / 100 * 100
+    final_return = (equity[-1] - 100) / 100 * 100
     ax2.text(0.02, 0.98, f'最终收益率: {final_return:.2f}%', 
              transform=ax2.transAxes, fontsize=12, fontweight='bold',
              verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
@@ -323,7 +320,7 @@ def plot_strategy_results(df, strategy):
     ax2.legend(loc='upper left', fontsize=10)
     ax2.grid(True, alpha=0.3)
     ax2.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
-    ax2.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
+    ax2.xaxis.set_major_locator(mdates.AutoDateLocator())
     
     # 子图3：交易收益分布
     ax3 = plt.subplot(3, 1, 3)
@@ -352,9 +349,7 @@ def plot_strategy_results(df, strategy):
     output_file = '/Users/user/Downloads/strategy_visualization.png'
     plt.savefig(output_file, dpi=300, bbox_inches='tight')
     print(f"\n图表已保存到: {output_file}")
-    
-    # 显示图表
-    plt.show()
+    plt.close(fig)
 
 
 def main():
@@ -375,30 +370,13 @@ def main():
     # 回测策略
     print("\n开始回测策略...")
     strategy = TradingStrategy(verbose=False)
-    
-    for idx, row in df.iterrows():
-        strategy.add_kline(
-            date=row['date'],
-            high=row['high'],
-            low=row['low'],
-            open_price=row['open'],
-            close=row['close']
-        )
+    strategy.add_klines(df['date'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+                        df['open'].to_numpy(), df['close'].to_numpy())
     
     # 强制平仓
-    if strategy.holding:
-        last_kline = strategy.processor.get_valid_klines()[-1]
-        exit_price = last_kline['close']
-        profit = ((exit_price - strategy.entry_price) / strategy.entry_price) * 100
-        strategy.trades.append({
-            'date': last_kline['date'],
-            'action': 'SELL',
-            'price': exit_price,
-            'entry_price': strategy.entry_price,
-            'profit': profit,
-            'reason': '回测结束'
-        })
-        strategy.holding = False
+    strategy.close_position('回测结束')
+    
+    strategy.update_equity()
     
     # 打印统计
     stats = strategy.get_statistics()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+策略适配性画像：回测之前先对整个股票池计算"高点越来越高"策略的适配特征，只回测排名靠前的股票
+
+所有指标都在 日期 × 股票 的面板上一次性向量化计算：
+- 包含比例：当日与前一日互相包含（内包/外包）的K线比例，越高被忽略的K线越多
+- 震荡指数（Choppiness Index）：100 × log10(ΣTR / (N日最高 - N日最低)) / log10(N)，越高越震荡
+- 反复率：相邻非包含K线的方向（高点更高 / 低点更低）翻转的频率，近似每根K线的买卖次数
+- 平均波段长度：两次方向翻转之间平均持续的K线数
+- 趋势持续性：N日效率比 |C(t) - C(t-N)| / Σ|ΔC| 的均值，越高趋势越干净
+
+用法:
+    python3 suitability_profiler.py                       # 默认港股通股票池
+    python3 suitability_profiler.py --symbols 02018,01810 --top 5 --backtest
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+# 各指标对适配度的方向：1 越高越适合，-1 越低越适合
+SCORE_DIRECTIONS = {
+    'trend_persistence': 1,
+    'avg_swing_length': 1,
+    'choppiness': -1,
+    'whipsaw_rate': -1,
+    'containment_ratio': -1,
+}
+
+COLUMN_NAMES = {
+    'bars': 'K线数',
+    'containment_ratio': '包含比例',
+    'choppiness': '震荡指数',
+    'whipsaw_rate': '反复率',
+    'avg_swing_length': '平均波段长度',
+    'trend_persistence': '趋势持续性',
+    'volatility': '日波动率(%)',
+    'score': '适配得分',
+}
+
+
+def load_panel(symbols, start=None, end=None, store=None):
+    """
+    从港股历史行情库读取面板数据
+
+    Args:
+        symbols: 股票代码列表
+        start, end: 区间（含两端）
+        store: HKHistoryStore，默认为共用行情库
+
+    Returns:
+        (high, low, close) 三个 日期 × 股票 的DataFrame，缺失为NaN
+    """
+    if store is None:
+        from history_store import hk_history_store as store
+
+    fields = {'high': {}, 'low': {}, 'close': {}}
+    for symbol in symbols:
+        try:
+            bars = store.window(symbol, start, end)
+        except Exception as e:
+            print(f"  ❌ {symbol}: 获取数据失败: {e}")
+            continue
+        if bars is None:
+            print(f"  ❌ {symbol}: 无数据")
+            continue
+        for field, series in fields.items():
+            series[symbol] = pd.Series(getattr(bars, field), index=bars.date)
+
+    return tuple(pd.DataFrame(fields[field]).sort_index() for field in ('high', 'low', 'close'))
+
+
+def profile_panel(high, low, close, chop_window=14, trend_window=20):
+    """
+    向量化计算面板中每只股票的适配特征
+
+    Args:
+        high, low, close: 日期 × 股票 的DataFrame（列一致），停牌或未上市为NaN
+        chop_window: 震荡指数周期
+        trend_window: 效率比周期
+
+    Returns:
+        以股票代码为索引的特征DataFrame，按适配得分从高到低排序
+    """
+    h = high.to_numpy(dtype=float)
+    l = low.to_numpy(dtype=float)
+    c = close.to_numpy(dtype=float)
+
+    # 相邻两根K线的包含关系
+    cur_h, cur_l, prev_h, prev_l = h[1:], l[1:], h[:-1], l[:-1]
+    pair = ~(np.isnan(cur_h) | np.isnan(cur_l) | np.isnan(prev_h) | np.isnan(prev_l))
+    contained = pair & (((cur_h <= prev_h) & (cur_l >= prev_l)) | ((cur_h >= prev_h) & (cur_l <= prev_l)))
+    pairs = pair.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        containment_ratio = contained.sum(axis=0) / pairs
+
+    # 非包含的相邻K线要么高点更高（+1）要么低点更低（-1）；包含时沿用之前的方向
+    signal = np.where(pair & ~contained, np.where(cur_h > prev_h, 1, -1), 0)
+    last = np.where(signal != 0, np.arange(len(signal))[:, None], -1)
+    last = np.maximum.accumulate(last, axis=0)
+    state = np.where(last >= 0, np.take_along_axis(signal, np.maximum(last, 0), axis=0), 0)
+    flips = ((state[1:] != state[:-1]) & (state[:-1] != 0)).sum(axis=0)
+    directed = (state != 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        whipsaw_rate = flips / pairs
+        avg_swing_length = directed / (flips + 1)
+
+    # 震荡指数
+    prev_c = np.vstack([np.full((1, c.shape[1]), np.nan), c[:-1]])
+    true_range = pd.DataFrame(np.fmax(h - l, np.fmax(np.abs(h - prev_c), np.abs(l - prev_c))),
+                              index=close.index, columns=close.columns)
+    range_n = high.rolling(chop_window).max() - low.rolling(chop_window).min()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chop = 100 * np.log10(true_range.rolling(chop_window).sum() / range_n.where(range_n > 0)) / np.log10(chop_window)
+
+    # 趋势持续性（效率比）
+    path = close.diff().abs().rolling(trend_window).sum()
+    efficiency = (close - close.shift(trend_window)).abs() / path.where(path > 0)
+
+    result = pd.DataFrame({
+        'bars': (~np.isnan(c)).sum(axis=0),
+        'containment_ratio': containment_ratio,
+        'choppiness': chop.mean().to_numpy(),
+        'whipsaw_rate': whipsaw_rate,
+        'avg_swing_length': avg_swing_length,
+        'trend_persistence': efficiency.mean().to_numpy(),
+        'volatility': close.pct_change().std().to_numpy() * 100,
+    }, index=close.columns)
+
+    result['score'] = suitability_score(result)
+    return result.sort_values('score', ascending=False)
+
+
+def suitability_score(profile):
+    """各特征在股票池内的百分位排名按方向平均，0~1，越高越适合"""
+    ranks = [profile[column].rank(pct=True) if direction > 0 else 1 - profile[column].rank(pct=True)
+             for column, direction in SCORE_DIRECTIONS.items()]
+    return pd.concat(ranks, axis=1).mean(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='策略适配性画像：按适配得分预选股票')
+    parser.add_argument('--symbols', type=str, default=None, help='逗号分隔的股票代码，默认港股通股票池')
+    parser.add_argument('--start', type=str, default='20231201', help='开始日期')
+    parser.add_argument('--end', type=str, default='20241201', help='结束日期')
+    parser.add_argument('--top', type=int, default=10, help='回测排名前N只')
+    parser.add_argument('--backtest', action='store_true', help='只对排名前N只股票运行回测')
+    parser.add_argument('--output', type=str, default=None, help='画像结果保存的CSV路径')
+    args = parser.parse_args()
+
+    from batch_backtest_hk_stocks import HK_STOCKS
+    names = {symbol: name for name, symbol in HK_STOCKS.items()}
+    symbols = args.symbols.split(',') if args.symbols else list(names)
+
+    print("="*80)
+    print(f"策略适配性画像 - {len(symbols)} 只股票 ({args.start} 至 {args.end})")
+    print("="*80)
+
+    high, low, close = load_panel(symbols, args.start, args.end)
+    if close.empty:
+        print("\n❌ 没有获取到任何股票数据")
+        return
+
+    profile = profile_panel(high, low, close)
+    profile.insert(0, '股票名称', [names.get(symbol, '') for symbol in profile.index])
+    print("\n" + profile.rename(columns=COLUMN_NAMES).round(3).to_string())
+
+    if args.output:
+        profile.rename(columns=COLUMN_NAMES).to_csv(args.output, encoding='utf-8-sig')
+        print(f"\n✓ 结果已保存到: {args.output}")
+
+    if args.backtest:
+        from hk_pipeline import run_pipeline
+        from batch_backtest_hk_stocks import backtest_frame, fetch_hk_stock_data
+
+        top = [(names.get(symbol, symbol), symbol) for symbol in profile.index[:args.top]]
+        print(f"\n回测适配得分前 {len(top)} 只股票...")
+        for stock_name, symbol, stats, error in run_pipeline(
+                top, lambda stock_name, symbol: fetch_hk_stock_data(symbol, args.start, args.end), backtest_frame):
+            if error:
+                print(f"  ❌ {stock_name} ({symbol}): {error}")
+                continue
+            print(f"  ✓ {stock_name} ({symbol}): 交易 {stats['total_trades']} 次，"
+                  f"胜率 {stats['win_rate']:.2f}%，总收益率 {stats['total_return']:.2f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+KlineProcessor等价性测试
+将增量（栈）实现与原来逐根重新扫描的实现（strategy/benchmark_kline_engine.py 的 legacy_rescan）逐根对比，
+忽略的K线集合和有效K线序列必须完全一致
+
+运行: python3 test_kline_processor.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from benchmark_kline_engine import generate_bars, legacy_rescan, legacy_rescan_steps
+from kline_processor import KlineProcessor, trade_events
+from event_log import DEBUG, EventLog
+
+
+def generate_rows(n, seed, tick=0.05):
+    """benchmark_kline_engine.generate_bars 的随机K线，转为 add_kline 的参数 (日期, 最高, 最低, 开盘, 收盘)"""
+    high, low, close = generate_bars(n, seed, tick)
+    dates = np.datetime64('2000-01-01') + np.arange(n)
+    return [(str(dates[i]), high[i], low[i], close[i], close[i]) for i in range(n)]
+
+
+def check_equivalence(n=400, seeds=range(20)):
+    """逐根对比两种实现"""
+    for seed in seeds:
+        for tick in (0.05, 0.5, 1.0):
+            highs, lows, _ = generate_bars(n, seed, tick)
+            rows = generate_rows(n, seed, tick)
+            processor = KlineProcessor()
+            for i, ignored in enumerate(legacy_rescan_steps(highs, lows)):
+                processor.add_kline(*rows[i])
+                assert processor.ignored_indices == ignored, f"seed={seed} tick={tick} {rows[i][0]}: 忽略集合不一致"
+                legacy_valid = [j for j in range(i + 1) if j not in ignored]
+                assert [k['date'] for k in processor.get_valid_klines()] == \
+                    [rows[j][0] for j in legacy_valid], f"seed={seed} tick={tick} {rows[i][0]}: 有效K线不一致"
+                if len(legacy_valid) >= 2:
+                    assert processor.last_valid()['date'] == rows[legacy_valid[-1]][0]
+                    assert processor.prev_valid()['date'] == rows[legacy_valid[-2]][0]
+    print(f"✓ 等价性测试通过（{len(seeds)} 组随机数据 × 3 种价格精度，每组 {n} 根K线）")
+
+
+def streaming_trades(bars):
+    """逐根加入K线并按策略规则记录买卖点（与各回测脚本的execute_strategy一致）"""
+    processor = KlineProcessor()
+    holding = False
+    trades = []
+    for bar in bars:
+        processor.add_kline(*bar)
+        if processor.valid_count < 2:
+            continue
+        current, previous = processor.last_valid(), processor.prev_valid()
+        if current['high'] > previous['high'] and not holding:
+            holding = True
+            trades.append(('BUY', current['date'], current['high']))
+        if holding and current['low'] < previous['low']:
+            holding = False
+            trades.append(('SELL', current['date'], current['low']))
+    return trades
+
+
+def check_batch(n=400, seeds=range(20)):
+    """批量模式（分两段加入）的买卖点必须与逐根模式一致"""
+    for seed in seeds:
+        for tick in (0.05, 0.5, 1.0):
+            bars = generate_rows(n, seed, tick)
+            processor = KlineProcessor()
+            holding = False
+            trades = []
+            for part in (bars[:n // 3], bars[n // 3:]):
+                dates, highs, lows, opens, closes = (np.array(col) for col in zip(*part))
+                current_idx, previous_idx = processor.add_klines(dates, highs, lows, opens, closes)
+                for action, current, previous in trade_events(processor, current_idx, previous_idx, holding):
+                    holding = action == 'BUY'
+                    trades.append((action, current['date'], current['high' if holding else 'low']))
+            assert trades == streaming_trades(bars), f"seed={seed} tick={tick}: 批量模式交易不一致"
+    print(f"✓ 批量模式测试通过（{len(seeds)} 组随机数据 × 3 种价格精度）")
+
+
+def reference_equity(closes, trades, initial=100.0):
+    """逐根计算权益曲线和持仓（当日的成交先按顺序处理，持仓时再按收盘价计算权益）"""
+    equity = initial
+    base = entry = 0.0
+    holding = False
+    curve, position = [], []
+    for i, close in enumerate(closes):
+        for trade in trades:
+            if trade['index'] != i:
+                continue
+            if trade['action'] == 'BUY':
+                holding, base, entry = True, equity, trade['price']
+            else:
+                holding, equity = False, base * trade['price'] / entry
+        if holding:
+            equity = base * close / entry
+        curve.append(equity)
+        position.append(holding)
+    return np.array(curve), np.array(position)
+
+
+def check_equity(n=400, seeds=range(20)):
+    """可视化版策略的向量化权益曲线必须与逐根计算一致（买入当日计为持仓），逐根加入K线后统计自动刷新"""
+    from quant_strategy_visual import TradingStrategy
+
+    for seed in seeds:
+        for tick in (0.05, 0.5, 1.0):
+            bars = generate_rows(n, seed, tick)
+            strategy = TradingStrategy()
+            for bar in bars:
+                strategy.add_kline(*bar)
+            strategy.close_position('回测结束')
+            expected_curve, expected_position = reference_equity(strategy.closes, strategy.trades)
+            stats = strategy.get_statistics()
+            if stats:
+                assert np.isclose(stats['final_equity'], expected_curve[-1]), f"seed={seed} tick={tick}: 最终权益未刷新"
+            curve, position = strategy.update_equity()
+            assert np.array_equal(position, expected_position), f"seed={seed} tick={tick}: 持仓序列不一致"
+            assert np.allclose(curve, expected_curve), f"seed={seed} tick={tick}: 权益曲线不一致"
+            buy_bars = [t['index'] for t in strategy.trades if t['action'] == 'BUY']
+            sell_bars = {t['index'] for t in strategy.trades if t['action'] == 'SELL'}
+            assert all(position[i] for i in buy_bars if i not in sell_bars), f"seed={seed} tick={tick}: 买入当日未计为持仓"
+    print(f"✓ 权益曲线测试通过（{len(seeds)} 组随机数据 × 3 种价格精度）")
+
+
+def benchmark(n=1000):
+    """对比两种实现逐根加入n根K线的耗时"""
+    highs, lows, _ = generate_bars(n, seed=0)
+    start = time.perf_counter()
+    legacy_rescan(highs, lows)
+    print(f"  原实现: {n} 根K线耗时 {time.perf_counter() - start:.3f} 秒")
+
+    processor = KlineProcessor()
+    start = time.perf_counter()
+    for bar in generate_rows(n, seed=0):
+        processor.add_kline(*bar)
+    print(f"  增量实现: {n} 根K线耗时 {time.perf_counter() - start:.3f} 秒")
+
+
+def check_memory(n=100000):
+    """检查每根K线占用的内存"""
+    processor = KlineProcessor()
+    for bar in generate_rows(n, seed=1):
+        processor.add_kline(*bar)
+    arrays = [processor._date, processor._high, processor._low, processor._open,
+              processor._close, processor._valid, processor._kernel.stack]
+    per_bar = sum(a.itemsize for a in arrays)
+    assert per_bar <= 45, per_bar
+    kline = processor[-1]
+    assert kline.high == kline['high'] and kline.date == kline['date']
+    print(f"✓ 每根K线 {per_bar} 字节，{n} 根K线数组容量 {len(processor._high)}")
+
+
+def benchmark_logging(n=50000):
+    """对比逐根加入n根K线时 输出日志 / 只记入环形缓冲区 / 静默 三种模式的耗时"""
+    bars = generate_rows(n, seed=2)
+    with open(os.devnull, 'w') as devnull:
+        modes = (
+            ('输出日志', lambda: EventLog(DEBUG, echo=True, sink=lambda line: print(line, file=devnull))),
+            ('环形缓冲区', lambda: EventLog(DEBUG, capacity=1000)),
+            ('静默', lambda: None),
+        )
+        for name, make_log in modes:
+            log = make_log()
+            processor = KlineProcessor(log=log)
+            start = time.perf_counter()
+            for bar in bars:
+                processor.add_kline(*bar)
+            elapsed = time.perf_counter() - start
+            recorded = len(log.buffer) if log is not None and log.buffer is not None else 0
+            print(f"  {name}: {n} 根K线耗时 {elapsed:.3f} 秒（忽略 {processor.ignored_count} 根，缓冲区 {recorded} 条）")
+
+
+if __name__ == '__main__':
+    check_equivalence()
+    check_batch()
+    check_equity()
+    check_memory()
+    benchmark()
+    benchmark_logging()